@@ -1,19 +1,19 @@
-from pathlib import Path
-import duckdb
 import streamlit as st
 
+from delivery_market_analysis.queries import connect
+
 st.set_page_config(page_title="Delivery Market Analysis", layout="wide")
 
 st.title("Delivery Market Analysis (v0)")
 st.caption("SQLite → DuckDB semantic layer → Streamlit dashboard")
 
-db_path = Path("data/processed/analytics.duckdb")
-if not db_path.exists():
-    st.error("DuckDB ontbreekt. Run: python src/build_duckdb.py --dir data/raw")
+try:
+    # a cursor of the shared connection per run: sessions run on their own threads
+    con = connect().cursor()
+except FileNotFoundError:
+    st.error("DuckDB ontbreekt. Run: dma build")
     st.stop()
 
-con = duckdb.connect(db_path.as_posix(), read_only=True)
-
 restaurants = con.execute("SELECT COUNT(*) FROM stg_restaurants;").fetchone()[0]
 platforms = con.execute("SELECT COUNT(DISTINCT platform) FROM stg_restaurants;").fetchone()[0]
 items = con.execute("SELECT COUNT(*) FROM stg_menu_items;").fetchone()[0]
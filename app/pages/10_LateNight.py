@@ -1,117 +1,120 @@
 from __future__ import annotations
 
+import tempfile
 from pathlib import Path
 
-import duckdb
-import pandas as pd
 import streamlit as st
 
+from delivery_market_analysis.autocomplete import suggest
+from delivery_market_analysis.geo import aggregate_points, grid_deck
+from delivery_market_analysis.hours import DAY_NAMES, OPEN_ORDER, open_after_mask, open_at_mask, restaurants_open_query
+from delivery_market_analysis.queries import PAGE_SIZE, connect, export, has_tables, page, run_all
+
 st.set_page_config(page_title="Late night", layout="wide")
 
 st.title("Late night availability")
-st.caption("Open-late proxy using UberEats hours data (end_time stored as minutes since midnight).")
-
-db_path = Path("data/processed/analytics.duckdb")
-con = duckdb.connect(db_path.as_posix(), read_only=True)
-
-# Check if hours table exists
-exists = (
-    con.execute(
-        """
-        SELECT COUNT(*) FROM information_schema.tables
-        WHERE table_schema='ubereats' AND table_name='restaurant_hours_to_section_hours';
-        """
-    ).fetchone()[0]
-    > 0
-)
+st.caption("Opening hours from UberEats section hours, precomputed as a weekly quarter-hour bitmap.")
 
-if not exists:
-    st.info("Hours table not available in ubereats schema for this dataset.")
-    st.stop()
+con = connect().cursor()
 
-late_threshold = st.selectbox("Open-late threshold", ["21:00:00", "22:00:00", "23:00:00"], index=1)
-city_filter = st.text_input("City filter (optional)", value="").strip()
+if not has_tables(con, "hours_weekly"):
+    st.error("Opening hours not built. Run: python -m delivery_market_analysis.hours")
+    st.stop()
 
-params = {"city": city_filter, "threshold": late_threshold}
-
-# Hours CTE: end_time is integer minutes since midnight (e.g., 1320 -> 22:00)
-hours_cte = """
-WITH hours AS (
-  SELECT
-    CAST(restaurant_id AS VARCHAR) AS restaurant_key,
-    MAX(
-      COALESCE(
-        CASE
-          WHEN TRY_CAST(end_time AS INTEGER) IS NOT NULL THEN
-            MAKE_TIME(
-              FLOOR(TRY_CAST(end_time AS INTEGER) / 60)::INTEGER,
-              (TRY_CAST(end_time AS INTEGER) % 60)::INTEGER,
-              0
-            )
-          ELSE NULL
-        END
-      )
-    ) AS latest_end
-  FROM ubereats.restaurant_hours_to_section_hours
-  GROUP BY 1
+c1, c2, c3 = st.columns(3)
+day = c1.selectbox("Day", DAY_NAMES, index=4)
+clock = c2.select_slider(
+    "Time",
+    options=[f"{h:02d}:{m:02d}" for h in range(24) for m in (0, 15, 30, 45)],
+    value="22:00",
 )
-"""
-
-st.subheader("Restaurants and latest closing time (UberEats)")
-
-df = con.execute(
-    hours_cte
-    + """
-SELECT
-  r.restaurant_name,
-  COALESCE(NULLIF(r.city,''),'Unknown') AS city,
-  r.latitude,
-  r.longitude,
-  h.latest_end,
-  CASE WHEN h.latest_end >= CAST($threshold AS TIME) THEN 1 ELSE 0 END AS is_open_late
-FROM stg_restaurants r
-JOIN hours h
-  ON r.platform='ubereats' AND r.restaurant_key=h.restaurant_key
-WHERE ($city = '' OR LOWER(r.city) = LOWER($city))
-ORDER BY is_open_late DESC, latest_end DESC NULLS LAST
-LIMIT 2000;
-""",
-    params,
-).df()
-
-st.dataframe(df.head(200), use_container_width=True)
-
-st.divider()
-st.subheader("Open late counts by city")
-
-counts = con.execute(
-    hours_cte
-    + """
+mode = c3.radio("Show restaurants", ["open after", "open at"], horizontal=True)
+city_filter = st.text_input("City filter (optional)", value="").strip()
+if city_filter:
+    cities = dict(suggest(con, "city", city_filter, k=8))
+    if cities and city_filter not in cities:
+        city_filter = st.selectbox(
+            "Matching cities",
+            list(cities),
+            format_func=lambda c: f"{c} ({cities[c]:,} restaurants)",
+        )
+
+day_idx = DAY_NAMES.index(day)
+mask = open_after_mask(day_idx, clock) if mode == "open after" else open_at_mask(day_idx, clock)
+params = {"city": city_filter, "mask": mask}
+open_sql, open_params = restaurants_open_query(mask, city_filter)
+
+# Keyset pagination: keep the `after` key of every page visited so Previous /
+# Next fetch one page each; a new day/time/city starts again at page 1.
+nav = st.session_state.setdefault("late_night_pages", {"query": None, "keys": [None], "next": None})
+if nav["query"] != (mask, city_filter):
+    nav.update(query=(mask, city_filter), keys=[None], next=None)
+
+# The list, the city counts and the map are independent: run them concurrently.
+listing, counts, open_cells = run_all(
+    con,
+    [
+        (page, open_sql, OPEN_ORDER, open_params, nav["keys"][-1], PAGE_SIZE),
+        (
+            """
 SELECT
   COALESCE(NULLIF(r.city,''),'Unknown') AS city,
-  SUM(CASE WHEN h.latest_end >= CAST($threshold AS TIME) THEN 1 ELSE 0 END) AS open_late,
+  SUM(CASE WHEN bit_count(h.week_bits & CAST($mask AS BIT)) > 0 THEN 1 ELSE 0 END) AS open,
   COUNT(*) AS total
-FROM stg_restaurants r
-JOIN hours h
-  ON r.platform='ubereats' AND r.restaurant_key=h.restaurant_key
+FROM hours_weekly h
+JOIN stg_restaurants r
+  ON r.platform = h.platform AND r.restaurant_key = h.restaurant_key
 GROUP BY 1
-ORDER BY open_late DESC
+ORDER BY open DESC
 LIMIT 30;
 """,
-    {"threshold": late_threshold},
-).df()
+            {"mask": mask},
+        ),
+        # Map: every open restaurant, aggregated per grid cell (not just the fetched rows)
+        (
+            aggregate_points,
+            """
+SELECT r.latitude, r.longitude
+FROM hours_weekly h
+JOIN stg_restaurants r
+  ON r.platform = h.platform AND r.restaurant_key = h.restaurant_key
+WHERE bit_count(h.week_bits & CAST($mask AS BIT)) > 0
+  AND ($city = '' OR LOWER(r.city) = LOWER($city))
+""",
+            params,
+        ),
+    ],
+)
 
-st.dataframe(counts, use_container_width=True)
+st.subheader(f"Restaurants {mode} {clock} on {day} (UberEats)")
+nav["next"] = listing.after
+st.dataframe(listing.rows, use_container_width=True)
+
+first_row = (len(nav["keys"]) - 1) * PAGE_SIZE
+c1, c2, c3, c4 = st.columns([1, 1, 3, 2])
+c1.button("Previous", disabled=len(nav["keys"]) == 1, on_click=lambda: nav["keys"].pop())
+c2.button("Next", disabled=listing.after is None, on_click=lambda: nav["keys"].append(nav["next"]))
+c3.caption(f"Rows {first_row + 1:,}–{first_row + len(listing.rows):,}")
+
+
+def full_list() -> bytes:
+    # COPY streams the whole list to a file; no DataFrame of all rows is built
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "late_night.csv"
+        export(con, open_sql, path, open_params, order=OPEN_ORDER)
+        return path.read_bytes()
+
+
+c4.download_button("Download full list (CSV)", data=full_list, file_name="late_night.csv", mime="text/csv")
 
 st.divider()
+st.subheader("Open counts by city")
+st.dataframe(counts, use_container_width=True)
 
-open_late = df[df["is_open_late"] == 1].copy()
-open_late["latitude"] = pd.to_numeric(open_late["latitude"], errors="coerce")
-open_late["longitude"] = pd.to_numeric(open_late["longitude"], errors="coerce")
-open_late = open_late.dropna(subset=["latitude", "longitude"])
+st.divider()
 
-if open_late.empty:
-    st.info("No mappable open-late restaurants (missing coordinates or none match the threshold).")
+if open_cells.empty:
+    st.info("No mappable open restaurants (missing coordinates or none open at this time).")
 else:
-    st.subheader("Map (open late only)")
-    st.map(open_late.rename(columns={"latitude": "lat", "longitude": "lon"})[["lat", "lon"]])
+    st.subheader(f"Map ({mode} {clock} only)")
+    st.pydeck_chart(grid_deck(open_cells, tooltip="{restaurant_count} open restaurants"))
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import pandas as pd
+import pydeck as pdk
+import streamlit as st
+
+from delivery_market_analysis.queries import connect, has_tables
+from delivery_market_analysis.spatial import nearest_competitors, restaurant_index
+
+st.set_page_config(page_title="Competitors", layout="wide")
+st.title("Competitors")
+st.caption("Nearest competitors of a restaurant across all platforms (in-memory KD-tree over coordinates).")
+
+con = connect().cursor()
+
+if not has_tables(con, "stg_restaurants"):
+    st.error("Semantic layer not built. Run: dma build semantic")
+    st.stop()
+
+index, points = restaurant_index(con)
+if points.empty:
+    st.info("No restaurants with coordinates.")
+    st.stop()
+
+c1, c2 = st.columns(2)
+with c1:
+    platform = st.selectbox("Platform", sorted(points["platform"].unique()))
+with c2:
+    name = st.text_input("Restaurant name contains", value="")
+
+candidates = points[points["platform"] == platform]
+if name:
+    candidates = candidates[candidates["restaurant_name"].str.contains(name, case=False, na=False, regex=False)]
+candidates = candidates.head(500)
+if candidates.empty:
+    st.info("No restaurant matches that name.")
+    st.stop()
+
+labels = (candidates["restaurant_name"].fillna("?") + " (" + candidates["city"] + ")").tolist()
+pick = st.selectbox("Restaurant", range(len(labels)), format_func=lambda i: labels[i])
+me = candidates.iloc[pick]
+
+c1, c2, c3 = st.columns(3)
+with c1:
+    k = st.slider("Nearest competitors (k)", 1, 50, 10)
+with c2:
+    radius_km = st.slider("Radius (km)", 0.5, 10.0, 2.0, 0.5)
+with c3:
+    same_category = st.checkbox(
+        "Same category only",
+        value=False,
+        disabled=not has_tables(con, "stg_restaurant_categories"),
+    )
+
+nearest = nearest_competitors(con, platform, me["restaurant_key"], k=k, same_category=same_category)
+around = nearest_competitors(con, platform, me["restaurant_key"], radius_km=radius_km, same_category=same_category)
+
+cols = ["platform", "restaurant_name", "city", "distance_km"]
+
+st.subheader(f"{k} nearest competitors")
+st.dataframe(nearest[cols], use_container_width=True)
+
+st.subheader(f"Within {radius_km:g} km")
+st.metric("Competitors in radius", len(around))
+if not around.empty:
+    st.dataframe(around.groupby("platform").size().rename("restaurants").reset_index(), use_container_width=True)
+
+plot = pd.concat(
+    [
+        around.assign(fill=[[255, 140, 0, 160]] * len(around)),
+        me.to_frame().T.assign(distance_km=0.0, fill=[[200, 0, 0, 255]]),
+    ],
+    ignore_index=True,
+)
+plot["latitude"] = plot["latitude"].astype(float)
+plot["longitude"] = plot["longitude"].astype(float)
+layer = pdk.Layer(
+    "ScatterplotLayer",
+    plot,
+    get_position=["longitude", "latitude"],
+    get_fill_color="fill",
+    get_radius=60,
+    pickable=True,
+)
+st.pydeck_chart(
+    pdk.Deck(
+        layers=[layer],
+        initial_view_state=pdk.ViewState(latitude=float(me["latitude"]), longitude=float(me["longitude"]), zoom=13),
+        tooltip={"text": "{restaurant_name} ({platform})\n{distance_km} km"},
+        map_style=None,
+    )
+)
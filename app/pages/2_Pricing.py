@@ -1,21 +1,22 @@
 from __future__ import annotations
 
-from pathlib import Path
-
-import duckdb
-import pandas as pd
 import plotly.express as px
 import streamlit as st
 
-from delivery_market_analysis.queries import Filters, query_df
+from delivery_market_analysis.cube import price_stats
+from delivery_market_analysis.queries import Filters, connect, has_tables, price_bands
+from delivery_market_analysis.sampling import SAMPLE_RATES, approx_histogram, refine
 
 st.set_page_config(page_title="Pricing", layout="wide")
 
 st.title("Pricing")
 st.caption("Price distribution of menu items across platforms.")
 
-db_path = Path("data/processed/analytics.duckdb")
-con = duckdb.connect(db_path.as_posix(), read_only=True)
+con = connect().cursor()
+
+if not has_tables(con, "cube_menu_items", "cube_price_sketch"):
+    st.error("Rollup cube not built. Run: python -m delivery_market_analysis.cube")
+    st.stop()
 
 # Filters
 platforms = ["All"] + [r[0] for r in con.execute("SELECT DISTINCT platform FROM stg_menu_items ORDER BY 1;").fetchall()]
@@ -23,40 +24,52 @@ sel_platform = st.selectbox("Platform", platforms, index=0)
 
 filters = Filters(platform=None if sel_platform == "All" else sel_platform)
 
-# Basic cleaning: ignore null/zero/negative prices
-df = con.execute(
-    """
-    SELECT platform, price
-    FROM vw_menu_items_clean
-    WHERE ($platform IS NULL OR platform = $platform)
-    """,
-    {"platform": None if sel_platform == "All" else sel_platform},
-).df()
-
+# Headline metrics come from the rollup cube (median is a 1% sketch estimate)
+stats = price_stats(con, by=(), filters=filters).iloc[0]
 
-if df.empty:
+if not stats["price_n"]:
     st.warning("No price data available for the selected filters.")
     st.stop()
 
 c1, c2, c3 = st.columns(3)
-c1.metric("Items (filtered)", f"{len(df):,}".replace(",", " "))
-c2.metric("Median price", f"{df['price'].median():.2f}")
-c3.metric("Avg price", f"{df['price'].mean():.2f}")
+c1.metric("Items (filtered)", f"{int(stats['price_n']):,}".replace(",", " "))
+c2.metric("Median price", f"{stats['p50']:.2f}")
+c3.metric("Avg price", f"{stats['avg_price']:.2f}")
 
 st.divider()
 
-# Histogram
-fig = px.histogram(df, x="price", nbins=60, color="platform" if sel_platform == "All" else None)
-st.plotly_chart(fig, use_container_width=True)
+# Histogram: binned inside DuckDB, only the bins reach Python/the browser.
+# A stratified-sample estimate is drawn first and replaced by the exact counts.
+chart = st.empty()
+note = st.empty()
+for hist, exact in refine(
+    con,
+    approx_histogram,
+    "vw_menu_items_clean",
+    "price",
+    lo=float(stats["min_price"]),
+    hi=float(stats["max_price"]),
+    bins=60,
+    filters=filters,
+    by=("platform",),
+):
+    hist["price"] = (hist["bin_lo"] + hist["bin_hi"]) / 2
+    fig = px.bar(
+        hist,
+        x="price",
+        y="count",
+        error_y=None if exact else "count_err",
+        color="platform" if sel_platform == "All" else None,
+        hover_data={"bin_lo": ":.2f", "bin_hi": ":.2f"},
+    )
+    fig.update_layout(bargap=0)
+    chart.plotly_chart(fig, use_container_width=True)
+    if exact:
+        note.empty()
+    else:
+        note.caption(f"Estimated from a {SAMPLE_RATES[0]:.0%} stratified sample (95% error bars); exact counts loading…")
 
 # Price bands table
-bands = pd.cut(df["price"], bins=[0, 5, 10, 15, 20, 30, 50, 100, 500], right=True)
-band_df = (
-    df.assign(price_band=bands.astype(str))
-      .groupby(["platform", "price_band"], dropna=False)
-      .size()
-      .reset_index(name="count")
-      .sort_values(["platform", "count"], ascending=[True, False])
-)
+band_df = price_bands(con, filters=filters).sort_values(["platform", "count"], ascending=[True, False])
 st.subheader("Price bands")
 st.dataframe(band_df, use_container_width=True)
@@ -1,40 +1,34 @@
 from __future__ import annotations
 
-from pathlib import Path
-
-import duckdb
 import plotly.express as px
 import streamlit as st
 
-from delivery_market_analysis.queries import query_df
+from delivery_market_analysis.cube import restaurant_stats
+from delivery_market_analysis.geo import grid_cells, grid_deck, zoom_to_level
+from delivery_market_analysis.queries import Filters, connect, has_tables
 
 st.set_page_config(page_title="Locations", layout="wide")
 
 st.title("Locations")
 st.caption("Distribution of restaurants per city, and basic coverage mapping.")
 
-db_path = Path("data/processed/analytics.duckdb")
-con = duckdb.connect(db_path.as_posix(), read_only=True)
+con = connect().cursor()
+
+if not has_tables(con, "cube_restaurants"):
+    st.error("Rollup cube not built. Run: python -m delivery_market_analysis.cube")
+    st.stop()
+if not has_tables(con, "geo_grid_agg"):
+    st.error("Spatial grid not built. Run: python -m delivery_market_analysis.geo")
+    st.stop()
 
 platforms = ["All"] + [r[0] for r in con.execute("SELECT DISTINCT platform FROM stg_restaurants ORDER BY 1;").fetchall()]
 sel_platform = st.selectbox("Platform", platforms, index=0)
 
 params = {"platform": None if sel_platform == "All" else sel_platform}
 
-# Restaurants per city
-city_counts = query_df(
-    con,
-    """
-    SELECT
-      COALESCE(NULLIF(city, ''), 'Unknown') AS city,
-      platform,
-      COUNT(*) AS restaurant_count
-    FROM stg_restaurants
-    WHERE ($platform IS NULL OR platform = $platform)
-    GROUP BY 1,2
-    """,
-    params,
-)
+# Restaurants per city (from the precomputed rollup cube)
+city_counts = restaurant_stats(con, by=("city", "platform"), filters=Filters(platform=params["platform"]))
+city_counts = city_counts[["city", "platform", "restaurant_count"]]
 
 top = city_counts.sort_values("restaurant_count", ascending=False).head(25)
 fig = px.bar(top, x="restaurant_count", y="city", color="platform" if sel_platform == "All" else None, orientation="h")
@@ -42,24 +36,19 @@ st.plotly_chart(fig, use_container_width=True)
 
 st.divider()
 
-# Map points (sampled to keep it fast)
-points = query_df(
-    con,
-    """
-    SELECT platform, restaurant_name, city, latitude, longitude
-    FROM stg_restaurants
-    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
-      AND ($platform IS NULL OR platform = $platform)
-    QUALIFY ROW_NUMBER() OVER (PARTITION BY platform ORDER BY restaurant_name) <= 2000
-    """,
-    params,
-)
+# Map: precomputed grid cells, level picked from the zoom so the payload stays bounded
+st.subheader("Restaurant density")
+zoom = st.slider("Map zoom", 6, 14, 8)
+cells = grid_cells(con, platform=params["platform"], max_level=zoom_to_level(zoom))
 
-st.subheader("Restaurant locations (sample)")
-if points.empty:
+if cells.empty:
     st.info("No lat/long available for the selected platform.")
 else:
-    st.map(points.rename(columns={"latitude": "lat", "longitude": "lon"}))
+    st.caption(
+        f"{len(cells):,} grid cells at level {int(cells['level'].iloc[0])} "
+        f"covering {int(cells['restaurant_count'].sum()):,} restaurants"
+    )
+    st.pydeck_chart(grid_deck(cells, tooltip="{restaurant_count} restaurants ({platforms})", zoom=zoom))
 
 # Dead zones (basic): cities with very low coverage
 st.subheader("Low coverage cities (proxy for dead zones)")
@@ -1,18 +1,16 @@
 from __future__ import annotations
 
-from pathlib import Path
-
-import duckdb
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+from delivery_market_analysis.queries import connect
+
 st.set_page_config(page_title="Value", layout="wide")
 st.title("Value")
 st.caption("Top pizza restaurants by rating and best price-to-rating ratio.")
 
-db_path = Path("data/processed/analytics.duckdb")
-con = duckdb.connect(db_path.as_posix(), read_only=True)
+con = connect().cursor()
 
 platforms = ["All"] + [r[0] for r in con.execute("SELECT DISTINCT platform FROM stg_restaurants ORDER BY 1;").fetchall()]
 sel_platform = st.selectbox("Platform", platforms, index=0)
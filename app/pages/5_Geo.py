@@ -1,27 +1,39 @@
 from __future__ import annotations
 
+import tempfile
 from pathlib import Path
 
-import duckdb
 import streamlit as st
 
+from delivery_market_analysis.autocomplete import suggest
+from delivery_market_analysis.coverage import coverage_summary, dead_zone_cells
+from delivery_market_analysis.geo import aggregate_points, grid_deck, zoom_to_level
+from delivery_market_analysis.queries import connect, export, has_tables, page
+
 st.set_page_config(page_title="Geo", layout="wide")
 st.title("Geo")
-st.caption("Kapsalon availability, average price mapping, and basic dead zone analysis.")
+st.caption("Kapsalon availability, average price mapping, and dead zone analysis.")
 
-db_path = Path("data/processed/analytics.duckdb")
-con = duckdb.connect(db_path.as_posix(), read_only=True)
+con = connect().cursor()
 
 platforms = ["All"] + [r[0] for r in con.execute("SELECT DISTINCT platform FROM stg_restaurants ORDER BY 1;").fetchall()]
 sel_platform = st.selectbox("Platform", platforms, index=0)
 
 dish = st.text_input("Dish keyword", value="kapsalon")
+suggestions = suggest(con, "item", dish, k=8)
+if suggestions:
+    counts = dict(suggestions)
+    options = [dish] + [label for label in counts if label != dish.lower()]
+    dish = st.selectbox(
+        "Suggestions",
+        options,
+        format_func=lambda o: f"{o} ({counts[o]:,} items)" if o in counts else f"{o} (as typed)",
+    )
 params = {"platform": None if sel_platform == "All" else sel_platform, "dish": f"%{dish.lower()}%"}
 
 st.subheader("Locations offering the dish and average price")
 
-kaps = con.execute(
-    """
+dish_sql = """
     WITH dish_items AS (
       SELECT platform, restaurant_key, price
       FROM vw_item_search
@@ -31,9 +43,18 @@ kaps = con.execute(
       SELECT platform, restaurant_key, AVG(price) AS avg_dish_price, COUNT(*) AS matched_items
       FROM dish_items
       GROUP BY 1,2
+    ),
+    -- one location per restaurant: the keys below are the paging tiebreaker
+    r AS (
+      SELECT *
+      FROM stg_restaurants
+      WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        AND ($platform IS NULL OR platform = $platform)
+      QUALIFY ROW_NUMBER() OVER (PARTITION BY platform, restaurant_key ORDER BY city, latitude, longitude) = 1
     )
     SELECT
       r.platform,
+      r.restaurant_key,
       r.restaurant_name,
       r.city,
       r.postal_code,
@@ -41,45 +62,81 @@ kaps = con.execute(
       r.longitude,
       a.avg_dish_price,
       a.matched_items
-    FROM stg_restaurants r
+    FROM r
     JOIN avg_price a
       ON a.platform = r.platform AND a.restaurant_key = r.restaurant_key
-    WHERE r.latitude IS NOT NULL AND r.longitude IS NOT NULL
-      AND ($platform IS NULL OR r.platform = $platform)
-    ORDER BY a.matched_items DESC, a.avg_dish_price ASC
-    LIMIT 2000;
-    """,
-    params,
-).df()
-
-if kaps.empty:
+"""
+
+dish_order = ("matched_items DESC", "avg_dish_price", "platform", "restaurant_key")
+
+# Keyset pagination: only the visible 50 rows are fetched; Previous / Next
+# seek from the stored sort keys, and a new keyword or platform resets to page 1.
+nav = st.session_state.setdefault("geo_dish_pages", {"query": None, "keys": [None], "next": None})
+if nav["query"] != (dish, sel_platform):
+    nav.update(query=(dish, sel_platform), keys=[None], next=None)
+
+listing = page(con, dish_sql, dish_order, params, after=nav["keys"][-1], size=50)
+nav["next"] = listing.after
+kaps = listing.rows
+
+if kaps.empty and len(nav["keys"]) == 1:
     st.info("No matches found. Try another keyword (e.g., 'hummus', 'falafel').")
     st.stop()
 
 kaps["avg_dish_price"] = kaps["avg_dish_price"].round(2)
-st.dataframe(kaps.head(50), use_container_width=True)
+st.dataframe(kaps, use_container_width=True)
+
+first_row = (len(nav["keys"]) - 1) * 50
+c1, c2, c3, c4 = st.columns([1, 1, 3, 2])
+c1.button("Previous", disabled=len(nav["keys"]) == 1, on_click=lambda: nav["keys"].pop())
+c2.button("Next", disabled=listing.after is None, on_click=lambda: nav["keys"].append(nav["next"]))
+c3.caption(f"Rows {first_row + 1:,}–{first_row + len(kaps):,}")
+
+
+def all_matches() -> bytes:
+    # COPY streams every match to a file; no DataFrame of all rows is built
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "dish_locations.parquet"
+        export(con, dish_sql, path, params, order=dish_order)
+        return path.read_bytes()
+
+
+c4.download_button(
+    "Download all matches (Parquet)",
+    data=all_matches,
+    file_name=f"{dish.lower().replace(' ', '_')}_locations.parquet",
+    mime="application/vnd.apache.parquet",
+)
 
 st.divider()
 
-st.subheader("Map (sample)")
-map_df = kaps.rename(columns={"latitude": "lat", "longitude": "lon"})
-st.map(map_df[["lat", "lon"]])
+st.subheader("Map (all matches, aggregated per grid cell)")
+zoom = st.slider("Map zoom", 6, 14, 8)
+cells = aggregate_points(con, dish_sql, params, value="avg_dish_price", max_level=zoom_to_level(zoom))
+if cells.empty:
+    st.info("None of the matching restaurants has coordinates.")
+else:
+    cells["avg_value"] = cells["avg_value"].round(2)
+    st.pydeck_chart(grid_deck(cells, tooltip="{restaurant_count} restaurants, avg price {avg_value}", zoom=zoom))
 
 st.divider()
 
-st.subheader("Dead zones (proxy)")
-st.caption("Proxy: cities with very low restaurant counts (based on available city field).")
-
-dead = con.execute(
-    """
-    SELECT COALESCE(NULLIF(city,''),'Unknown') AS city, COUNT(*) AS restaurant_count
-    FROM stg_restaurants
-    WHERE ($platform IS NULL OR platform = $platform)
-    GROUP BY 1
-    ORDER BY restaurant_count ASC
-    LIMIT 30;
-    """,
-    {"platform": params["platform"]},
-).df()
-
-st.dataframe(dead, use_container_width=True)
+st.subheader("Dead zones (coverage raster)")
+
+if not has_tables(con, "coverage_grid", "coverage_meta"):
+    st.info("Coverage raster not built. Run: python -m delivery_market_analysis.coverage")
+    st.stop()
+
+min_km = st.slider("Distance to nearest restaurant (km)", 1.0, 10.0, 3.0, 0.5)
+st.caption("Cells of the service region farther than this from any restaurant of the selected platform.")
+
+dead = dead_zone_cells(con, params["platform"], min_km=min_km)
+if dead.empty:
+    st.info("No dead zones at this threshold.")
+else:
+    dead["nearest_km"] = dead["nearest_km"].round(1)
+    st.pydeck_chart(grid_deck(dead, tooltip="Nearest restaurant: {nearest_km} km", value="nearest_km"))
+
+summary = coverage_summary(con, min_km=min_km)
+summary["dead_share"] = summary["dead_share"].round(3)
+st.dataframe(summary, use_container_width=True)
@@ -6,7 +6,7 @@
 -- Restaurants (unified)
 -- -------------------------
 
-CREATE OR REPLACE VIEW stg_restaurants AS
+CREATE OR REPLACE VIEW src_restaurants AS
 WITH takeaway_loc AS (
   SELECT
     ltr.restaurant_id,
@@ -76,7 +76,7 @@ FROM ubereats.restaurants
 -- Menu items (unified)
 -- -------------------------
 
-CREATE OR REPLACE VIEW stg_menu_items AS
+CREATE OR REPLACE VIEW src_menu_items AS
 -- Takeaway
 SELECT
   'takeaway' AS platform,
@@ -120,7 +120,7 @@ FROM ubereats.menu_items
 -- so we map restaurant_id -> primarySlug via takeaway.restaurants.
 -- -------------------------
 
-CREATE OR REPLACE VIEW stg_restaurant_categories AS
+CREATE OR REPLACE VIEW src_restaurant_categories AS
 -- UberEats: direct category strings
 SELECT
   'ubereats' AS platform,
@@ -149,6 +149,146 @@ JOIN takeaway.restaurants r
   ON cr.restaurant_id = r.restaurant_id
 ;
 
+-- -------------------------
+-- Star schema
+-- The src_* views above unify the raw platform tables; they are materialized
+-- once into dictionary-encoded dimensions and fact tables keyed by dense
+-- integer ids. stg_* views below rebuild the original column layout (plus
+-- restaurant_id) on top of them, so existing pages keep working unchanged.
+-- -------------------------
+
+-- Platforms from every feed, like dim_restaurant below: the facts inner-join
+-- both, so a platform with items but no restaurant rows must still get an id.
+CREATE OR REPLACE TABLE dim_platform AS
+SELECT CAST(ROW_NUMBER() OVER (ORDER BY platform) AS UTINYINT) AS platform_id, platform
+FROM (
+  SELECT platform FROM src_restaurants
+  UNION
+  SELECT platform FROM src_menu_items
+  UNION
+  SELECT platform FROM src_restaurant_categories
+)
+WHERE platform IS NOT NULL;
+
+CREATE OR REPLACE TABLE dim_city AS
+SELECT CAST(ROW_NUMBER() OVER (ORDER BY city) AS INTEGER) AS city_id, city
+FROM (SELECT DISTINCT city FROM src_restaurants WHERE city IS NOT NULL);
+
+CREATE OR REPLACE TABLE dim_category AS
+SELECT CAST(ROW_NUMBER() OVER (ORDER BY category_name) AS INTEGER) AS category_id, category_name
+FROM (
+  SELECT category_name FROM src_restaurant_categories
+  UNION
+  SELECT CAST(category_name AS VARCHAR) FROM src_menu_items
+)
+WHERE category_name IS NOT NULL;
+
+-- One dense id per (platform, restaurant_key) seen anywhere, so items and
+-- categories of restaurants missing from the restaurant feed keep their key.
+CREATE OR REPLACE TABLE dim_restaurant AS
+SELECT
+  CAST(ROW_NUMBER() OVER (ORDER BY p.platform_id, k.restaurant_key) AS INTEGER) AS restaurant_id,
+  p.platform_id,
+  k.restaurant_key
+FROM (
+  SELECT platform, restaurant_key FROM src_restaurants
+  UNION
+  SELECT platform, restaurant_key FROM src_menu_items
+  UNION
+  SELECT platform, restaurant_key FROM src_restaurant_categories
+) k
+JOIN dim_platform p ON p.platform = k.platform
+WHERE k.restaurant_key IS NOT NULL;
+
+CREATE OR REPLACE TABLE fact_restaurants AS
+SELECT
+  d.restaurant_id,
+  d.platform_id,
+  c.city_id,
+  r.restaurant_name,
+  r.address,
+  r.postal_code,
+  r.latitude,
+  r.longitude,
+  r.rating_value,
+  r.rating_count,
+  CAST(r.delivery_fee AS DOUBLE) AS delivery_fee,
+  CAST(r.min_order AS DOUBLE) AS min_order
+FROM src_restaurants r
+JOIN dim_platform p ON p.platform = r.platform
+JOIN dim_restaurant d ON d.platform_id = p.platform_id AND d.restaurant_key = r.restaurant_key
+LEFT JOIN dim_city c ON c.city = r.city
+ORDER BY d.restaurant_id;
+
+CREATE OR REPLACE TABLE fact_menu_items AS
+SELECT
+  d.restaurant_id,
+  d.platform_id,
+  c.category_id,
+  i.item_key,
+  i.item_name,
+  i.description,
+  i.price
+FROM src_menu_items i
+JOIN dim_platform p ON p.platform = i.platform
+JOIN dim_restaurant d ON d.platform_id = p.platform_id AND d.restaurant_key = i.restaurant_key
+LEFT JOIN dim_category c ON c.category_name = CAST(i.category_name AS VARCHAR)
+ORDER BY d.restaurant_id;
+
+CREATE OR REPLACE TABLE fact_restaurant_categories AS
+SELECT d.restaurant_id, d.platform_id, c.category_id
+FROM src_restaurant_categories rc
+JOIN dim_platform p ON p.platform = rc.platform
+JOIN dim_restaurant d ON d.platform_id = p.platform_id AND d.restaurant_key = rc.restaurant_key
+LEFT JOIN dim_category c ON c.category_name = rc.category_name
+ORDER BY d.restaurant_id;
+
+CREATE OR REPLACE VIEW stg_restaurants AS
+SELECT
+  p.platform,
+  d.restaurant_key,
+  f.restaurant_name,
+  f.address,
+  c.city,
+  f.postal_code,
+  f.latitude,
+  f.longitude,
+  f.rating_value,
+  f.rating_count,
+  f.delivery_fee,
+  f.min_order,
+  f.restaurant_id
+FROM fact_restaurants f
+JOIN dim_restaurant d ON d.restaurant_id = f.restaurant_id
+JOIN dim_platform p ON p.platform_id = f.platform_id
+LEFT JOIN dim_city c ON c.city_id = f.city_id;
+
+CREATE OR REPLACE VIEW stg_menu_items AS
+SELECT
+  p.platform,
+  d.restaurant_key,
+  f.item_key,
+  f.item_name,
+  f.description,
+  f.price,
+  c.category_name,
+  f.restaurant_id
+FROM fact_menu_items f
+JOIN dim_restaurant d ON d.restaurant_id = f.restaurant_id
+JOIN dim_platform p ON p.platform_id = f.platform_id
+LEFT JOIN dim_category c ON c.category_id = f.category_id;
+
+CREATE OR REPLACE VIEW stg_restaurant_categories AS
+SELECT
+  p.platform,
+  d.restaurant_key,
+  c.category_name,
+  f.restaurant_id
+FROM fact_restaurant_categories f
+JOIN dim_restaurant d ON d.restaurant_id = f.restaurant_id
+JOIN dim_platform p ON p.platform_id = f.platform_id
+LEFT JOIN dim_category c ON c.category_id = f.category_id;
+
 -- -------------------------
 -- Convenience view: pizza restaurants
 -- -------------------------
@@ -170,6 +310,17 @@ WHERE LOWER(c.category_name) LIKE '%pizza%'
 ;
 
 
+-- -------------------------
+-- Valid prices only (used for tables/metrics); defined before the views built on it
+-- -------------------------
+CREATE OR REPLACE VIEW vw_menu_items_clean AS
+SELECT *
+FROM stg_menu_items
+WHERE price IS NOT NULL
+  AND price > 0
+  AND price < 500;
+
+
 -- -------------------------
 -- Convenience view: item search (kapsalon/hummus/veg/vegan)
 -- -------------------------
@@ -212,21 +363,6 @@ WHERE
   OR LOWER(COALESCE(description,'')) LIKE '%veggie%';
 
 
-CREATE OR REPLACE VIEW vw_menu_items_clean AS
-SELECT *
-FROM stg_menu_items
-WHERE price IS NOT NULL
-  AND price > 0
-  AND price < 500;
-
--- Valid prices only (used for tables/metrics)
-CREATE OR REPLACE VIEW vw_menu_items_clean AS
-SELECT *
-FROM stg_menu_items
-WHERE price IS NOT NULL
-  AND price > 0
-  AND price < 500;
-
 -- Capped prices (used for charts to avoid outliers dominating)
 CREATE OR REPLACE VIEW vw_menu_items_capped AS
 SELECT
@@ -239,3 +375,37 @@ SELECT
   category_name
 FROM stg_menu_items
 WHERE price IS NOT NULL;
+
+
+-- -------------------------
+-- Spatial cell index
+-- Quadtree cell over lon [-180,180) x lat [-90,90) at level 24 (~2 m), Morton
+-- (Z-order) encoded so that the cell at a coarser level L is simply
+-- cell_id >> (2 * (24 - L)). Mirrors delivery_market_analysis.geo.cell_id.
+-- -------------------------
+CREATE OR REPLACE MACRO cell_spread16(v) AS (v | (v << 16)) & 281470681808895;
+CREATE OR REPLACE MACRO cell_spread8(v) AS (v | (v << 8)) & 71777214294589695;
+CREATE OR REPLACE MACRO cell_spread4(v) AS (v | (v << 4)) & 1085102592571150095;
+CREATE OR REPLACE MACRO cell_spread2(v) AS (v | (v << 2)) & 3689348814741910323;
+CREATE OR REPLACE MACRO cell_spread1(v) AS (v | (v << 1)) & 6148914691236517205;
+
+-- interleave the bits of a 24-bit integer with zeros
+CREATE OR REPLACE MACRO cell_spread(v) AS
+  cell_spread1(cell_spread2(cell_spread4(cell_spread8(cell_spread16(CAST(v AS BIGINT))))));
+
+CREATE OR REPLACE MACRO cell_id(lat, lon) AS
+  cell_spread(LEAST(GREATEST(FLOOR((lon + 180.0) / 360.0 * 16777216), 0), 16777215))
+  | (cell_spread(LEAST(GREATEST(FLOOR((lat + 90.0) / 180.0 * 16777216), 0), 16777215)) << 1);
+
+CREATE OR REPLACE MACRO cell_parent(cell, level) AS cell >> (2 * (24 - level));
+
+-- Restaurants with coordinates, physically ordered by cell so DuckDB zonemaps
+-- prune bounding-box / radius lookups to a few row groups.
+CREATE OR REPLACE TABLE stg_restaurants_geo AS
+SELECT
+  cell_id(latitude, longitude) AS cell_id,
+  *
+FROM stg_restaurants
+WHERE latitude BETWEEN -90 AND 90
+  AND longitude BETWEEN -180 AND 180
+ORDER BY cell_id;
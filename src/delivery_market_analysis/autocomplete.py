@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import argparse
+import re
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import duckdb
+import numpy as np
+
+from delivery_market_analysis.item_matching import NORMALIZE_SQL
+
+# Entries per term: the full key plus every later word start ("mini kapsalon"
+# is found by "kap"), capped so long descriptions-as-names stay cheap.
+MAX_WORD_STARTS = 6
+# Prefixes up to this length whose range is wider than SCAN_LIMIT entries get
+# their top suggestions precomputed; narrower ranges are ranked on the fly.
+CACHED_PREFIX_LEN = 3
+SCAN_LIMIT = 2048
+CACHED_TOP = 50
+
+_SOURCES: Dict[str, str] = {
+    "item": f"""
+        SELECT {NORMALIZE_SQL.format(col="item_name")} AS key, MODE(LOWER(item_name)) AS label, COUNT(*) AS freq
+        FROM vw_menu_items_clean
+        GROUP BY 1
+    """,
+    "restaurant": f"""
+        SELECT {NORMALIZE_SQL.format(col="restaurant_name")} AS key, MODE(restaurant_name) AS label, COUNT(*) AS freq
+        FROM stg_restaurants
+        GROUP BY 1
+    """,
+    "city": f"""
+        SELECT {NORMALIZE_SQL.format(col="city")} AS key, MODE(city) AS label, COUNT(*) AS freq
+        FROM stg_restaurants
+        GROUP BY 1
+    """,
+}
+KINDS = tuple(_SOURCES)
+
+_CACHE: Dict[Tuple[str, str], "PrefixIndex"] = {}
+
+
+def normalize(text: str) -> str:
+    """Python twin of NORMALIZE_SQL, applied to what the user types."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+class PrefixIndex:
+    """
+    Sorted array of normalized keys (one entry per word start of every term)
+    with the term frequency next to it. A prefix is a contiguous range found
+    with two binary searches; the most frequent distinct terms in that range
+    are the suggestions.
+    """
+
+    def __init__(self, keys: Sequence[str], labels: Sequence[str], freqs: Sequence[int]) -> None:
+        self.labels = list(labels)
+        self.freqs = np.asarray(freqs, dtype=np.int64)
+
+        keys_all: List[str] = []
+        terms_all: List[int] = []
+        for term, key in enumerate(keys):
+            starts = [0] + [m.end() for m in re.finditer(" ", key)][: MAX_WORD_STARTS - 1]
+            keys_all.extend(key[s:] for s in starts)
+            terms_all.extend([term] * len(starts))
+        order = sorted(range(len(keys_all)), key=keys_all.__getitem__)
+        self.keys = [keys_all[i] for i in order]
+        self.terms = np.asarray(terms_all, dtype=np.int64)[order] if order else np.zeros(0, dtype=np.int64)
+        self.entry_freqs = self.freqs[self.terms]
+
+        # walk the distinct prefixes of wide ranges only, jumping with bisect
+        self._top: Dict[str, List[int]] = {}
+        spans = [(0, len(self.keys))]
+        for n in range(1, CACHED_PREFIX_LEN + 1):
+            wide = []
+            for lo, end in spans:
+                while lo < end:
+                    head = self.keys[lo][:n]
+                    if len(head) < n:  # the key is the whole prefix: skip its duplicates
+                        lo = bisect_right(self.keys, head, lo, end)
+                        continue
+                    hi = bisect_left(self.keys, head + "\uffff", lo, end)
+                    if hi - lo > SCAN_LIMIT:
+                        self._top[head] = self._rank(lo, hi, CACHED_TOP)
+                        wide.append((lo, hi))
+                    lo = hi
+            spans = wide
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + "\uffff")
+
+    def _rank(self, lo: int, hi: int, k: int) -> List[int]:
+        f = self.entry_freqs[lo:hi]
+        take = min(len(f), 4 * k)
+        idx = np.argpartition(-f, take - 1)[:take] if take < len(f) else np.arange(len(f))
+        idx = idx[np.lexsort((self.terms[lo + idx], -f[idx]))]
+        out: List[int] = []
+        for t in self.terms[lo + idx]:
+            if t not in out:
+                out.append(int(t))
+                if len(out) == k:
+                    break
+        return out
+
+    def suggest(self, prefix: str, k: int = 10) -> List[Tuple[str, int]]:
+        """Top-k (label, frequency) whose key, or a word in it, starts with prefix."""
+        p = normalize(prefix)
+        if not p or k <= 0:
+            return []
+        cached = self._top.get(p)
+        if cached is not None and k <= len(cached):
+            terms = cached[:k]
+        else:
+            lo, hi = self._range(p)
+            terms = self._rank(lo, hi, k) if hi > lo else []
+        return [(self.labels[t], int(self.freqs[t])) for t in terms]
+
+
+def load_index(con: duckdb.DuckDBPyConnection, kind: str) -> PrefixIndex:
+    """PrefixIndex for `kind` (item, restaurant or city), built on first use and kept per process."""
+    if kind not in _SOURCES:
+        raise ValueError(f"Unknown kind {kind!r}; expected one of {KINDS}")
+    key = (con.execute("PRAGMA database_list").fetchone()[2], kind)
+    if key not in _CACHE:
+        rows = con.execute(
+            f"SELECT key, label, freq FROM ({_SOURCES[kind]}) WHERE key IS NOT NULL AND key <> ''"
+        ).fetchnumpy()
+        _CACHE[key] = PrefixIndex(rows["key"].tolist(), rows["label"].tolist(), rows["freq"])
+    return _CACHE[key]
+
+
+def suggest(con: duckdb.DuckDBPyConnection, kind: str, prefix: str, k: int = 10) -> List[Tuple[str, int]]:
+    return load_index(con, kind).suggest(prefix, k)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.autocomplete")
+    p.add_argument("kind", choices=KINDS)
+    p.add_argument("prefix")
+    p.add_argument("-k", type=int, default=10)
+    p.add_argument("--db", default="data/processed/analytics.duckdb")
+    args = p.parse_args()
+
+    db_path = Path(args.db)
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    con = duckdb.connect(db_path.as_posix(), read_only=True)
+
+    t = time.perf_counter()
+    index = load_index(con, args.kind)
+    load_s = time.perf_counter() - t
+    t = time.perf_counter()
+    hits = index.suggest(args.prefix, args.k)
+    lookup_ms = (time.perf_counter() - t) * 1000
+    con.close()
+
+    for label, freq in hits:
+        print(f"{freq:>8,}  {label}")
+    print(f"{len(index):,} {args.kind} terms, loaded in {load_s:.2f} s, lookup {lookup_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
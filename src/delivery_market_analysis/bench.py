@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import duckdb
+import pandas as pd
+
+from delivery_market_analysis import parquet_store, spatial
+from delivery_market_analysis.autocomplete import suggest
+from delivery_market_analysis.chains import chain_summary, top_chains
+from delivery_market_analysis.coverage import coverage_summary, dead_zone_cells
+from delivery_market_analysis.cube import price_stats, restaurant_stats
+from delivery_market_analysis.diet import diet_by_city
+from delivery_market_analysis.hours import open_after_mask, restaurants_open
+from delivery_market_analysis.ingest import ingest_raw
+from delivery_market_analysis.item_matching import price_gaps
+from delivery_market_analysis.matching import overlap_pairs, top_cross_platform
+from delivery_market_analysis.outliers import top_outliers
+from delivery_market_analysis.pipeline import BuildConfig, build
+from delivery_market_analysis.profiling import environment
+from delivery_market_analysis.queries import histogram, price_bands
+from delivery_market_analysis.semantic import SQL_PATH, apply_semantic
+from delivery_market_analysis.synthetic import write_raw
+
+SUITES = ("ingest", "scan", "stages", "queries", "parquet", "pages", "spatial")
+SCALE = 2_000
+REPEAT = 3
+THRESHOLD = 0.2
+# time differences below this are noise, never a regression
+MIN_DELTA_S = 0.005
+
+SCANNED_VIEWS = (
+    "stg_restaurants",
+    "stg_menu_items",
+    "stg_restaurant_categories",
+    "vw_menu_items_clean",
+    "vw_item_search",
+    "vw_veg_vegan_items",
+    "vw_pizza_restaurants",
+)
+# one aggregate per column, so every column of every row is read
+SCAN_SQL = "SELECT COUNT(*), MAX(LENGTH(CAST(COLUMNS(*) AS VARCHAR))) FROM {view}"
+
+# The package calls behind each dashboard page, with the pages' default widget values.
+PAGE_QUERIES: Dict[str, Callable[[duckdb.DuckDBPyConnection], Any]] = {
+    "pricing.price_stats": lambda con: price_stats(con, by=()),
+    "pricing.histogram": lambda con: histogram(con, "vw_menu_items_clean", "price", bins=60, by=("platform",)),
+    "pricing.price_bands": lambda con: price_bands(con),
+    "locations.restaurant_stats": lambda con: restaurant_stats(con, by=("platform", "city")),
+    "geo.coverage_summary": lambda con: coverage_summary(con, 3.0),
+    "geo.dead_zones": lambda con: dead_zone_cells(con, None, 3.0),
+    "geo.suggest": lambda con: suggest(con, "item", "kap", 8),
+    "vegvegan.diet_by_city": lambda con: diet_by_city(con),
+    "crossplatform.overlap_pairs": lambda con: overlap_pairs(con),
+    "crossplatform.top_cross_platform": lambda con: top_cross_platform(con, 50, 2),
+    "crossplatform.price_gaps": lambda con: price_gaps(con),
+    "outliers.top_outliers": lambda con: top_outliers(con, 3.0),
+    "chains.top_chains": lambda con: top_chains(con, 3),
+    "chains.chain_summary": lambda con: chain_summary(con, 3),
+    "latenight.restaurants_open": lambda con: restaurants_open(con, open_after_mask(4, "22:00"), "", 200),
+}
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of `repeat` calls after one warm-up call."""
+    fn()
+    times = []
+    for _ in range(max(1, repeat)):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return statistics.median(times)
+
+
+@contextlib.contextmanager
+def _cwd(path: Path) -> Iterator[None]:
+    old = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+def run_bench(
+    scale: int = SCALE,
+    repeat: int = REPEAT,
+    suites: Sequence[str] = SUITES,
+    workdir: Optional[Path] = None,
+    app_dir: Path = Path("app"),
+    sql_path: Path = SQL_PATH,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Generate `scale` synthetic restaurants, build the database and time the
+    selected suites. Returns {"meta": {...}, "metrics": {name: {"value", "unit"}}};
+    units ending in "/s" are throughputs (higher is better), "s" are times.
+    """
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise ValueError(f"Unknown suite(s) {sorted(unknown)}; suites: {list(SUITES)}")
+    metrics: Dict[str, Dict[str, Any]] = {}
+
+    def put(name: str, value: float, unit: str = "s") -> None:
+        metrics[name] = {"value": float(value), "unit": unit}
+
+    app_dir, sql_path = Path(app_dir).resolve(), Path(sql_path).resolve()
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="dma-bench-")))
+        workdir = Path(workdir).resolve()
+        raw_dir = workdir / "data" / "raw"
+        db_path = workdir / "data" / "processed" / "analytics.duckdb"
+        db_path.unlink(missing_ok=True)
+
+        t = time.perf_counter()
+        raw_rows = sum(write_raw(raw_dir, restaurants=scale, seed=seed).values())
+        put("generate.seconds", time.perf_counter() - t)
+
+        t = time.perf_counter()
+        ingest_raw(raw_dir, db_path)
+        ingest_s = time.perf_counter() - t
+        t = time.perf_counter()
+        apply_semantic(db_path, sql_path)
+        semantic_s = time.perf_counter() - t
+        if "ingest" in suites:
+            put("ingest.seconds", ingest_s)
+            put("ingest.rows_per_s", raw_rows / ingest_s, "rows/s")
+            put("semantic.seconds", semantic_s)
+
+        config = BuildConfig(db_path=db_path, raw_dir=raw_dir, sql_path=sql_path)
+        report = build(config, skip=["ingest", "semantic"], force=["all"], jobs=1)
+        failed = report[report["status"].isin(["failed", "blocked"])]
+        if not failed.empty:
+            raise RuntimeError(f"Build failed: {failed.to_dict('records')}")
+        if "stages" in suites:
+            for r in report[report["status"] == "built"].itertuples():
+                put(f"stage.{r.stage}", r.seconds)
+
+        con = duckdb.connect(db_path.as_posix(), read_only=True)
+        try:
+            if "scan" in suites:
+                for view in SCANNED_VIEWS:
+                    sql = SCAN_SQL.format(view=view)
+                    put(f"scan.{view}", _timed(lambda: con.execute(sql).fetchall(), repeat))
+                n_items = con.execute("SELECT COUNT(*) FROM stg_menu_items").fetchone()[0]
+                put("scan.stg_menu_items_rows_per_s", n_items / metrics["scan.stg_menu_items"]["value"], "rows/s")
+            if "queries" in suites:
+                for name, fn in PAGE_QUERIES.items():
+                    put(f"query.{name}", _timed(lambda: fn(con), repeat))
+        finally:
+            con.close()
+
+        if "parquet" in suites:
+            # the same scans and page queries against the Parquet export
+            t = time.perf_counter()
+            parquet_store.export_parquet(db_path, workdir / "parquet", sql_path)
+            put("parquet.export_seconds", time.perf_counter() - t)
+            sizes = {
+                "duckdb_mb": parquet_store.size_mb(db_path),
+                "parquet_mb": parquet_store.size_mb(workdir / "parquet"),
+            }
+            lake = parquet_store.connect(workdir / "parquet")
+            try:
+                for view in SCANNED_VIEWS:
+                    sql = SCAN_SQL.format(view=view)
+                    put(f"parquet.scan.{view}", _timed(lambda: lake.execute(sql).fetchall(), repeat))
+                if "queries" in suites:
+                    for name, fn in PAGE_QUERIES.items():
+                        put(f"parquet.query.{name}", _timed(lambda: fn(lake), repeat))
+            finally:
+                lake.close()
+
+        if "pages" in suites and app_dir.exists():
+            from streamlit.testing.v1 import AppTest
+
+            pages = sorted((app_dir / "pages").glob("*.py")) + [app_dir / "Home.py"]
+            with _cwd(workdir):
+                for path in pages:
+
+                    def render() -> None:
+                        at = AppTest.from_file(path.as_posix(), default_timeout=600).run()
+                        if at.exception:
+                            raise RuntimeError(f"{path.name}: {at.exception[0].value}")
+
+                    put(f"page.{path.stem}", _timed(render, repeat))
+
+    if "spatial" in suites:
+        res = spatial.benchmark(max(scale, 1_000), min(max(scale, 1_000), 10_000))
+        put("spatial.build_s", res["build_s"])
+        put("spatial.knn_qps", res["knn_qps"], "queries/s")
+        put("spatial.radius_qps", res["radius_qps"], "queries/s")
+
+    import streamlit
+
+    env = environment()
+    env["versions"]["streamlit"] = streamlit.__version__
+    meta = {**env, "scale": int(scale), "repeat": int(repeat), "seed": int(seed), "raw_rows": int(raw_rows)}
+    if "parquet" in suites:
+        meta.update(sizes)
+    return {"meta": meta, "metrics": metrics}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = THRESHOLD) -> pd.DataFrame:
+    """
+    Metrics present in both runs with `slowdown` (0.25 = 25% slower / lower
+    throughput) and a `regression` flag when it exceeds `threshold`.
+    """
+    rows: List[Dict[str, Any]] = []
+    for name, cur in current["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if base is None or not base["value"] or not cur["value"]:
+            continue
+        b, c = base["value"], cur["value"]
+        rate = cur["unit"].endswith("/s")
+        slowdown = b / c - 1 if rate else c / b - 1
+        regression = slowdown > threshold and (rate or c - b > MIN_DELTA_S)
+        rows.append(
+            {"metric": name, "unit": cur["unit"], "baseline": b, "current": c, "slowdown": slowdown, "regression": regression}
+        )
+    return pd.DataFrame(rows, columns=["metric", "unit", "baseline", "current", "slowdown", "regression"])
+
+
+def add_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--scale", type=int, default=SCALE, help="Synthetic restaurants to generate")
+    p.add_argument("--repeat", type=int, default=REPEAT, help="Timed runs per query (median is reported)")
+    p.add_argument("--suites", default=",".join(SUITES), help=f"Comma list of {', '.join(SUITES)}")
+    p.add_argument("--out", default="bench.json", help="Results JSON")
+    p.add_argument("--baseline", help="Earlier results JSON to compare against")
+    p.add_argument("--threshold", type=float, default=THRESHOLD, help="Slowdown flagged as a regression (0.2 = 20%%)")
+    p.add_argument("--results", help="Compare this results JSON to --baseline instead of running")
+    p.add_argument("--workdir", help="Keep generated data and database here (default: temporary)")
+    p.add_argument("--seed", type=int, default=0)
+
+
+def run_from_args(args: argparse.Namespace) -> int:
+    if args.results:
+        current = json.loads(Path(args.results).read_text())
+    else:
+        current = run_bench(
+            args.scale,
+            args.repeat,
+            [s.strip() for s in args.suites.split(",") if s.strip()],
+            Path(args.workdir) if args.workdir else None,
+            seed=args.seed,
+        )
+        Path(args.out).write_text(json.dumps(current, indent=2))
+        for name, m in current["metrics"].items():
+            print(f"{name:>42}: {m['value']:>14,.4f} {m['unit']}")
+        print(f"Results written to {args.out}")
+
+    if not args.baseline:
+        return 0
+    baseline = json.loads(Path(args.baseline).read_text())
+    for key in ("scale", "cpu_count", "python"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"warning: {key} differs from the baseline ({baseline['meta'].get(key)} vs {current['meta'].get(key)})")
+    diff = compare(baseline, current, args.threshold)
+    with pd.option_context("display.max_rows", None, "display.width", 160):
+        print(diff.to_string(index=False, float_format=lambda v: f"{v:,.4f}"))
+    regressions = diff[diff["regression"]]
+    print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+    return 1 if len(regressions) else 0
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.bench")
+    add_arguments(p)
+    raise SystemExit(run_from_args(p.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+from delivery_market_analysis.matching import normalize_text
+from delivery_market_analysis.queries import query_df
+
+
+def brand_key(name: object) -> str:
+    # normalize_text drops generic words ("restaurant", "snack", ...); fall back to
+    # the plain lowercase name when nothing else is left.
+    if not isinstance(name, str):
+        return ""
+    return normalize_text(name) or name.lower().strip()
+
+
+def build_chains(db_path: Path) -> None:
+    """
+    Materialize the chain index:
+
+    chain_restaurants  one normalized brand_key per restaurant row, with its
+                       rating and delivery fee
+    chain_brands       per brand: location/city/platform counts and additive
+                       rating/fee sums, so chain vs independent splits for any
+                       min_locations threshold are a GROUP BY over brands.
+    """
+    con = duckdb.connect(db_path.as_posix())
+
+    df = con.execute(
+        """
+        SELECT platform, restaurant_key, restaurant_name,
+               COALESCE(NULLIF(city,''),'Unknown') AS city,
+               rating_value, delivery_fee
+        FROM stg_restaurants
+        WHERE restaurant_name IS NOT NULL
+        """
+    ).df()
+
+    # names repeat a lot across locations: normalize each distinct name once
+    names = pd.Series(df["restaurant_name"].unique())
+    keys = dict(zip(names, names.map(brand_key)))
+    df["brand_key"] = df["restaurant_name"].map(keys)
+    chain_df = df[["platform", "restaurant_key", "brand_key", "restaurant_name", "city", "rating_value", "delivery_fee"]]
+
+    con.execute(
+        "CREATE OR REPLACE TABLE chain_restaurants AS SELECT * FROM chain_df ORDER BY brand_key;"
+    )
+    # (platform, restaurant_key) is not unique in stg_restaurants (a Takeaway
+    # restaurant has a row per location), so never join back to it on that key
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE chain_brands AS
+        SELECT
+          brand_key,
+          MODE(restaurant_name) AS display_name,
+          COUNT(*) AS rows_total,
+          COUNT(DISTINCT city) AS cities,
+          COUNT(DISTINCT platform) AS platforms,
+          COUNT(rating_value) AS rating_n,
+          SUM(rating_value) AS rating_sum,
+          COUNT(delivery_fee) AS fee_n,
+          SUM(delivery_fee) AS fee_sum,
+          AVG(rating_value) AS avg_rating,
+          AVG(delivery_fee) AS avg_delivery_fee
+        FROM chain_restaurants
+        GROUP BY 1
+        ORDER BY cities DESC, rows_total DESC;
+        """
+    )
+    con.close()
+
+
+def top_chains(con: duckdb.DuckDBPyConnection, min_locations: int, limit: int = 50) -> pd.DataFrame:
+    return query_df(
+        con,
+        f"""
+        SELECT brand_key, display_name, rows_total, cities, platforms, avg_rating, avg_delivery_fee
+        FROM chain_brands
+        WHERE cities >= $min_locations
+        ORDER BY cities DESC, rows_total DESC
+        LIMIT {int(limit)}
+        """,
+        {"min_locations": int(min_locations)},
+    )
+
+
+def chain_summary(con: duckdb.DuckDBPyConnection, min_locations: int) -> pd.DataFrame:
+    """Chain vs independent rows and rating/fee averages for a city threshold."""
+    return query_df(
+        con,
+        """
+        SELECT
+          CASE WHEN cities >= $min_locations THEN 'chain' ELSE 'independent' END AS group_tag,
+          CAST(SUM(rows_total) AS BIGINT) AS rows,
+          SUM(rating_sum) / NULLIF(SUM(rating_n), 0) AS avg_rating,
+          SUM(fee_sum) / NULLIF(SUM(fee_n), 0) AS avg_delivery_fee
+        FROM chain_brands
+        GROUP BY 1
+        ORDER BY 1
+        """,
+        {"min_locations": int(min_locations)},
+    )
+
+
+def main() -> None:
+    db_path = Path("data/processed/analytics.duckdb")
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    build_chains(db_path)
+    print("Chain index built: chain_restaurants + chain_brands")
+
+
+if __name__ == "__main__":
+    main()
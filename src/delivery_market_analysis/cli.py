@@ -3,20 +3,64 @@ from __future__ import annotations
 import argparse
 from pathlib import Path
 
-from delivery_market_analysis.demo import create_demo_db
+from delivery_market_analysis import bench, demo, parquet_store, pipeline, profiling, server, shards, snapshots
 
 
 def main() -> None:
     p = argparse.ArgumentParser(prog="dma")
     sub = p.add_subparsers(dest="cmd", required=True)
 
-    demo = sub.add_parser("demo", help="Create a tiny demo analytics.duckdb")
-    demo.add_argument("--out", default="data/processed/analytics.duckdb")
+    demo_p = sub.add_parser("demo", help="Create a demo analytics.duckdb (tiny, or --scale N synthetic restaurants)")
+    demo.add_arguments(demo_p)
+
+    build = sub.add_parser("build", help="Build the database: ingest -> semantic SQL -> materializations -> matching")
+    pipeline.add_arguments(build)
+
+    match = sub.add_parser("match", help="Build cross-platform restaurant and item matching (and their inputs)")
+    pipeline.add_arguments(match, targets=False)
+
+    serve = sub.add_parser("serve", help="Serve the analytics queries as a JSON / NDJSON / Arrow API")
+    serve.add_argument("--db", default="data/processed/analytics.duckdb")
+    serve.add_argument("--host", default=server.HOST)
+    serve.add_argument("--port", type=int, default=server.PORT)
+    serve.add_argument("--pool", type=int, default=server.POOL_SIZE, help="Concurrent queries (cursors)")
+    serve.add_argument("--cache-ttl", type=float, default=server.CACHE_TTL_S, help="Seconds; 0 disables caching")
+    profiling.add_argument(serve)
+
+    bench_p = sub.add_parser("bench", help="Benchmark ingest, views, matching and page queries on generated data")
+    bench.add_arguments(bench_p)
+
+    snap = sub.add_parser("snapshot", help="Versioned raw history: take a snapshot, list them, diff two")
+    snapshots.add_arguments(snap)
+
+    shard = sub.add_parser("shard", help="Split the stg_* relations into one DuckDB file per region")
+    shards.add_arguments(shard)
+
+    parquet = sub.add_parser("parquet", help="Export raw and stg_* tables as partitioned Parquet (DMA_BACKEND=parquet)")
+    parquet_store.add_arguments(parquet)
 
     args = p.parse_args()
 
     if args.cmd == "demo":
-        create_demo_db(Path(args.out))
+        demo.run_from_args(args)
+    elif args.cmd == "build":
+        raise SystemExit(pipeline.run_from_args(args))
+    elif args.cmd == "match":
+        raise SystemExit(pipeline.run_from_args(args, targets=["matching", "item_matching"]))
+    elif args.cmd == "serve":
+        db_path = Path(args.db)
+        if not db_path.exists():
+            raise FileNotFoundError(db_path)
+        profiling.enable_from_args(args)
+        server.serve(db_path, args.host, args.port, args.pool, args.cache_ttl)
+    elif args.cmd == "bench":
+        raise SystemExit(bench.run_from_args(args))
+    elif args.cmd == "snapshot":
+        snapshots.run_from_args(args)
+    elif args.cmd == "shard":
+        shards.run_from_args(args)
+    elif args.cmd == "parquet":
+        parquet_store.run_from_args(args)
 
 
 if __name__ == "__main__":
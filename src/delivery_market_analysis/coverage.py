@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from math import cos, radians
+from pathlib import Path
+from typing import Optional
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from delivery_market_analysis.queries import query_df
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON_EQUATOR = 111.320
+
+
+@dataclass(frozen=True)
+class Raster:
+    """Local equirectangular raster: cell (row, col) centre is origin + (i + 0.5) * res_km."""
+    lat0: float
+    lon0: float
+    min_lat: float
+    min_lon: float
+    res_km: float
+    rows: int
+    cols: int
+
+    @property
+    def km_per_deg_lon(self) -> float:
+        return KM_PER_DEG_LON_EQUATOR * cos(radians(self.lat0))
+
+    def to_km(self, lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return (lon - self.min_lon) * self.km_per_deg_lon, (lat - self.min_lat) * KM_PER_DEG_LAT
+
+    def cell_of(self, lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        x, y = self.to_km(lat, lon)
+        row = np.clip((y // self.res_km).astype(np.int64), 0, self.rows - 1)
+        col = np.clip((x // self.res_km).astype(np.int64), 0, self.cols - 1)
+        return row, col
+
+    @property
+    def dlat(self) -> float:
+        return self.res_km / KM_PER_DEG_LAT
+
+    @property
+    def dlon(self) -> float:
+        return self.res_km / self.km_per_deg_lon
+
+
+def make_raster(lat: np.ndarray, lon: np.ndarray, res_km: float, pad_km: float) -> Raster:
+    lat0 = float(np.mean(lat))
+    kx = KM_PER_DEG_LON_EQUATOR * cos(radians(lat0))
+    min_lat = float(lat.min()) - pad_km / KM_PER_DEG_LAT
+    min_lon = float(lon.min()) - pad_km / kx
+    height_km = (float(lat.max()) - min_lat) * KM_PER_DEG_LAT + pad_km
+    width_km = (float(lon.max()) - min_lon) * kx + pad_km
+    return Raster(
+        lat0=lat0,
+        lon0=float(np.mean(lon)),
+        min_lat=min_lat,
+        min_lon=min_lon,
+        res_km=res_km,
+        rows=int(np.ceil(height_km / res_km)),
+        cols=int(np.ceil(width_km / res_km)),
+    )
+
+
+def _shift(a: np.ndarray, dy: int, dx: int) -> np.ndarray:
+    """out[r, c] = a[r + dy, c + dx] (NaN outside the raster)."""
+    h, w = a.shape
+    out = np.full_like(a, np.nan)
+    r0, r1 = max(0, -dy), h - max(0, dy)
+    c0, c1 = max(0, -dx), w - max(0, dx)
+    if r0 < r1 and c0 < c1:
+        out[r0:r1, c0:c1] = a[r0 + dy:r1 + dy, c0 + dx:c1 + dx]
+    return out
+
+
+def nearest_distance(raster: Raster, x_km: np.ndarray, y_km: np.ndarray) -> np.ndarray:
+    """
+    Distance (km) from every cell centre to the nearest point, via jump flooding:
+    each cell keeps the best seed seen so far and, at step k, looks at the seeds
+    of its 8 neighbours k cells away (k = 2^n ... 1, then 2, 1 again to repair
+    the rare JFA misses). Every step is a handful of whole-array NumPy ops, so a
+    full country at sub-km resolution takes seconds. Exact up to about one cell.
+    """
+    h, w = raster.rows, raster.cols
+    seed_x = np.full((h, w), np.nan, dtype=np.float64)
+    seed_y = np.full((h, w), np.nan, dtype=np.float64)
+    if len(x_km) == 0:
+        return np.full((h, w), np.inf)
+
+    row = np.clip((y_km // raster.res_km).astype(np.int64), 0, h - 1)
+    col = np.clip((x_km // raster.res_km).astype(np.int64), 0, w - 1)
+    seed_x[row, col] = x_km
+    seed_y[row, col] = y_km
+
+    cx = (np.arange(w) + 0.5) * raster.res_km
+    cy = (np.arange(h)[:, None] + 0.5) * raster.res_km
+    best = np.hypot(seed_x - cx, seed_y - cy)
+    best[np.isnan(best)] = np.inf
+
+    steps = []
+    k = 1 << int(np.floor(np.log2(max(h, w))))
+    while k >= 1:
+        steps.append(k)
+        k //= 2
+    steps += [2, 1]
+
+    for k in steps:
+        for dy in (-k, 0, k):
+            for dx in (-k, 0, k):
+                if dy == 0 and dx == 0:
+                    continue
+                cand_x = _shift(seed_x, dy, dx)
+                cand_y = _shift(seed_y, dy, dx)
+                d = np.hypot(cand_x - cx, cand_y - cy)
+                better = d < best  # NaN compares False
+                seed_x[better] = cand_x[better]
+                seed_y[better] = cand_y[better]
+                best[better] = d[better]
+    return best
+
+
+def window_sum(counts: np.ndarray, k: int) -> np.ndarray:
+    """Sum of counts in the (2k+1) x (2k+1) window around every cell."""
+    h, w = counts.shape
+    c = np.zeros((h + 1, w + 1), dtype=np.int64)
+    c[1:, 1:] = counts.cumsum(0).cumsum(1)
+    r = np.arange(h)
+    q = np.arange(w)
+    r0, r1 = np.clip(r - k, 0, h)[:, None], np.clip(r + k + 1, 0, h)[:, None]
+    q0, q1 = np.clip(q - k, 0, w), np.clip(q + k + 1, 0, w)
+    return c[r1, q1] - c[r0, q1] - c[r1, q0] + c[r0, q0]
+
+
+def build_coverage(
+    db_path: Path,
+    res_km: float = 0.5,
+    service_km: float = 10.0,
+    density_km: float = 2.0,
+) -> None:
+    """
+    Rasterize the service region and persist coverage_grid:
+    per platform (and 'all') and cell, the restaurant count, restaurant density
+    within +-density_km, and the distance to the nearest restaurant.
+    The service region is every cell within service_km of any restaurant.
+    """
+    con = duckdb.connect(db_path.as_posix())
+    pts = con.execute(
+        """
+        SELECT platform, latitude, longitude
+        FROM stg_restaurants
+        WHERE latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180
+        """
+    ).df()
+    if pts.empty:
+        con.close()
+        raise ValueError("No restaurants with coordinates to rasterize")
+
+    lat = pts["latitude"].to_numpy(dtype=float)
+    lon = pts["longitude"].to_numpy(dtype=float)
+    raster = make_raster(lat, lon, res_km, pad_km=service_km)
+    x, y = raster.to_km(lat, lon)
+    row, col = raster.cell_of(lat, lon)
+
+    k = max(int(round(density_km / res_km)), 0)
+    window_km2 = ((2 * k + 1) * res_km) ** 2
+
+    groups = {"all": np.ones(len(pts), dtype=bool)}
+    for p in sorted(pts["platform"].unique()):
+        groups[str(p)] = (pts["platform"] == p).to_numpy()
+
+    service: Optional[np.ndarray] = None
+    frames = []
+    for platform, mask in groups.items():
+        counts = np.zeros((raster.rows, raster.cols), dtype=np.int64)
+        np.add.at(counts, (row[mask], col[mask]), 1)
+        nearest = nearest_distance(raster, x[mask], y[mask])
+        if service is None:
+            service = nearest <= service_km
+        density = window_sum(counts, k) / window_km2
+
+        rr, cc = np.nonzero(service)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "platform": platform,
+                    "row": rr.astype(np.int32),
+                    "col": cc.astype(np.int32),
+                    "latitude": raster.min_lat + (rr + 0.5) * raster.dlat,
+                    "longitude": raster.min_lon + (cc + 0.5) * raster.dlon,
+                    "restaurant_count": counts[rr, cc].astype(np.int32),
+                    "density_per_km2": density[rr, cc].astype(np.float32),
+                    "nearest_km": nearest[rr, cc].astype(np.float32),
+                }
+            )
+        )
+
+    grid = pd.concat(frames, ignore_index=True)
+    meta = pd.DataFrame(
+        [
+            {
+                "res_km": res_km,
+                "service_km": service_km,
+                "density_km": density_km,
+                "min_lat": raster.min_lat,
+                "min_lon": raster.min_lon,
+                "dlat": raster.dlat,
+                "dlon": raster.dlon,
+                "rows": raster.rows,
+                "cols": raster.cols,
+            }
+        ]
+    )
+
+    con.execute("CREATE OR REPLACE TABLE coverage_grid AS SELECT * FROM grid ORDER BY platform, row, col;")
+    con.execute("CREATE OR REPLACE TABLE coverage_meta AS SELECT * FROM meta;")
+    con.close()
+
+
+def dead_zone_cells(
+    con: duckdb.DuckDBPyConnection,
+    platform: Optional[str] = None,
+    min_km: float = 3.0,
+    max_cells: int = 4000,
+) -> pd.DataFrame:
+    """
+    Service-region cells farther than `min_km` from the nearest restaurant of
+    `platform` (None = any platform). When there are more than `max_cells`,
+    cells are merged into 2x2, 4x4, ... blocks so the payload stays bounded.
+    Columns match geo.grid_deck (min/max lat/lon) plus nearest_km and cells.
+    """
+    params = {"platform": platform or "all", "min_km": float(min_km)}
+    n = con.execute(
+        "SELECT COUNT(*) FROM coverage_grid WHERE platform = $platform AND nearest_km >= $min_km;",
+        params,
+    ).fetchone()[0]
+    factor = 1
+    while n / (factor * factor) > max_cells:
+        factor *= 2
+    params["f"] = factor
+
+    return query_df(
+        con,
+        """
+        WITH dead AS (
+          SELECT row // $f AS brow, col // $f AS bcol, nearest_km
+          FROM coverage_grid
+          WHERE platform = $platform AND nearest_km >= $min_km
+        )
+        SELECT
+          COUNT(*) AS cells,
+          MAX(nearest_km) AS nearest_km,
+          ANY_VALUE(m.min_lat) + brow * $f * ANY_VALUE(m.dlat) AS min_lat,
+          ANY_VALUE(m.min_lon) + bcol * $f * ANY_VALUE(m.dlon) AS min_lon,
+          ANY_VALUE(m.min_lat) + (brow + 1) * $f * ANY_VALUE(m.dlat) AS max_lat,
+          ANY_VALUE(m.min_lon) + (bcol + 1) * $f * ANY_VALUE(m.dlon) AS max_lon,
+          ANY_VALUE(m.min_lat) + (brow + 0.5) * $f * ANY_VALUE(m.dlat) AS latitude,
+          ANY_VALUE(m.min_lon) + (bcol + 0.5) * $f * ANY_VALUE(m.dlon) AS longitude
+        FROM dead, coverage_meta m
+        GROUP BY brow, bcol
+        """,
+        params,
+    )
+
+
+def coverage_summary(con: duckdb.DuckDBPyConnection, min_km: float = 3.0) -> pd.DataFrame:
+    """Share of the service region farther than `min_km` from each platform."""
+    return query_df(
+        con,
+        """
+        SELECT
+          g.platform,
+          COUNT(*) AS cells,
+          COUNT(*) * ANY_VALUE(m.res_km) * ANY_VALUE(m.res_km) AS area_km2,
+          AVG(CASE WHEN g.nearest_km >= $min_km THEN 1.0 ELSE 0.0 END) AS dead_share,
+          MEDIAN(g.nearest_km) AS median_nearest_km,
+          MAX(g.nearest_km) AS max_nearest_km
+        FROM coverage_grid g, coverage_meta m
+        GROUP BY 1
+        ORDER BY dead_share DESC
+        """,
+        {"min_km": float(min_km)},
+    )
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.coverage")
+    p.add_argument("--db", default="data/processed/analytics.duckdb")
+    p.add_argument("--res-km", type=float, default=0.5, help="Raster cell size in km")
+    p.add_argument("--service-km", type=float, default=10.0, help="Service region radius around any restaurant")
+    p.add_argument("--density-km", type=float, default=2.0, help="Half-width of the density window")
+    args = p.parse_args()
+
+    db_path = Path(args.db)
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    build_coverage(db_path, res_km=args.res_km, service_km=args.service_km, density_km=args.density_km)
+    print(f"Coverage raster built: coverage_grid + coverage_meta ({args.res_km} km cells)")
+
+
+if __name__ == "__main__":
+    main()
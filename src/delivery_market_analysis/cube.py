@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+from math import log
+from pathlib import Path
+from typing import Sequence
+
+import duckdb
+import pandas as pd
+
+from delivery_market_analysis.queries import Filters, _where, query_df
+
+# Relative accuracy of the price sketch: every bucket covers [gamma^(b-1), gamma^b),
+# so any quantile read back from it is within 1% of the true value.
+SKETCH_ALPHA = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+
+RESTAURANT_DIMS = ("platform", "city")
+ITEM_DIMS = ("platform", "city", "category_name")
+
+
+def build_cube(db_path: Path) -> None:
+    """
+    Materialize the rollup cube used by the dashboard aggregates.
+
+    cube_restaurants  grain (platform, city)
+    cube_menu_items   grain (platform, city, category_name)
+    cube_price_sketch grain (platform, city, category_name, bucket)
+
+    Every measure is additive (counts, sums, min/max, sketch bucket counts),
+    so coarser levels are derived by summing finer rows instead of rescanning.
+    """
+    con = duckdb.connect(db_path.as_posix())
+
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE cube_restaurants AS
+        SELECT
+          platform,
+          COALESCE(NULLIF(city, ''), 'Unknown') AS city,
+          COUNT(*) AS restaurant_count,
+          COUNT(*) FILTER (WHERE latitude IS NOT NULL AND longitude IS NOT NULL) AS geo_count,
+          SUM(latitude) FILTER (WHERE latitude IS NOT NULL AND longitude IS NOT NULL) AS lat_sum,
+          SUM(longitude) FILTER (WHERE latitude IS NOT NULL AND longitude IS NOT NULL) AS lon_sum,
+          COUNT(rating_value) AS rating_n,
+          SUM(rating_value) AS rating_sum,
+          MIN(rating_value) AS rating_min,
+          MAX(rating_value) AS rating_max,
+          SUM(rating_count) AS review_sum,
+          COUNT(delivery_fee) AS fee_n,
+          SUM(delivery_fee) AS fee_sum,
+          MIN(delivery_fee) AS fee_min,
+          MAX(delivery_fee) AS fee_max
+        FROM stg_restaurants
+        GROUP BY 1, 2
+        ORDER BY 1, 2;
+        """
+    )
+
+    # Menu items carry no city of their own: take it from the restaurant.
+    con.execute(
+        """
+        CREATE OR REPLACE TEMP VIEW _cube_items AS
+        SELECT
+          i.platform,
+          COALESCE(NULLIF(r.city, ''), 'Unknown') AS city,
+          COALESCE(NULLIF(i.category_name, ''), 'Unknown') AS category_name,
+          CASE WHEN i.price > 0 AND i.price < 500 THEN i.price END AS price
+        FROM stg_menu_items i
+        LEFT JOIN stg_restaurants r
+          ON r.platform = i.platform AND r.restaurant_key = i.restaurant_key;
+        """
+    )
+
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE cube_menu_items AS
+        SELECT
+          platform,
+          city,
+          category_name,
+          COUNT(*) AS item_count,
+          COUNT(price) AS price_n,
+          SUM(price) AS price_sum,
+          SUM(price * price) AS price_sumsq,
+          MIN(price) AS price_min,
+          MAX(price) AS price_max
+        FROM _cube_items
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3;
+        """
+    )
+
+    con.execute(
+        f"""
+        CREATE OR REPLACE TABLE cube_price_sketch AS
+        SELECT
+          platform,
+          city,
+          category_name,
+          CAST(CEIL(LN(price) / {log(SKETCH_GAMMA)!r}) AS INTEGER) AS bucket,
+          COUNT(*) AS n
+        FROM _cube_items
+        WHERE price IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4;
+        """
+    )
+
+    con.close()
+
+
+def _group_cols(by: Sequence[str], allowed: Sequence[str]) -> list[str]:
+    cols = list(by)
+    unknown = [c for c in cols if c not in allowed]
+    if unknown:
+        raise ValueError(f"Cannot group cube by {unknown}; allowed: {list(allowed)}")
+    return cols
+
+
+def _select_group(cols: list[str]) -> tuple[str, str]:
+    if not cols:
+        return "", ""
+    joined = ", ".join(cols)
+    return joined + ", ", "GROUP BY " + joined
+
+
+def restaurant_stats(
+    con: duckdb.DuckDBPyConnection,
+    by: Sequence[str] = ("platform",),
+    filters: Filters = Filters(),
+) -> pd.DataFrame:
+    """Restaurant counts, rating/fee aggregates and centroids rolled up to `by`."""
+    if filters.category:
+        raise ValueError("cube_restaurants has no category dimension")
+    cols = _group_cols(by, RESTAURANT_DIMS)
+    select_group, group_by = _select_group(cols)
+    where, params = _where(filters)
+    return query_df(
+        con,
+        f"""
+        SELECT
+          {select_group}
+          CAST(SUM(restaurant_count) AS BIGINT) AS restaurant_count,
+          CAST(SUM(geo_count) AS BIGINT) AS geo_count,
+          SUM(lat_sum) / NULLIF(SUM(geo_count), 0) AS latitude,
+          SUM(lon_sum) / NULLIF(SUM(geo_count), 0) AS longitude,
+          SUM(rating_sum) / NULLIF(SUM(rating_n), 0) AS avg_rating,
+          MIN(rating_min) AS min_rating,
+          MAX(rating_max) AS max_rating,
+          CAST(SUM(review_sum) AS BIGINT) AS total_reviews,
+          SUM(fee_sum) / NULLIF(SUM(fee_n), 0) AS avg_delivery_fee,
+          MIN(fee_min) AS min_delivery_fee,
+          MAX(fee_max) AS max_delivery_fee
+        FROM cube_restaurants
+        {where}
+        {group_by}
+        """,
+        params,
+    )
+
+
+def price_stats(
+    con: duckdb.DuckDBPyConnection,
+    by: Sequence[str] = ("platform",),
+    filters: Filters = Filters(),
+    quantiles: Sequence[float] = (0.5,),
+) -> pd.DataFrame:
+    """
+    Menu item counts and price aggregates rolled up to `by`.
+
+    Quantiles are read from the merged log-bucket sketch and returned as
+    p50, p90, ... columns (relative error <= SKETCH_ALPHA).
+    """
+    cols = _group_cols(by, ITEM_DIMS)
+    select_group, group_by = _select_group(cols)
+    where, params = _where(filters)
+
+    df = query_df(
+        con,
+        f"""
+        SELECT
+          {select_group}
+          CAST(SUM(item_count) AS BIGINT) AS item_count,
+          CAST(SUM(price_n) AS BIGINT) AS price_n,
+          SUM(price_sum) / NULLIF(SUM(price_n), 0) AS avg_price,
+          SQRT(GREATEST(
+            (SUM(price_sumsq) - SUM(price_sum) * SUM(price_sum) / NULLIF(SUM(price_n), 0))
+            / NULLIF(SUM(price_n) - 1, 0),
+            0
+          )) AS std_price,
+          MIN(price_min) AS min_price,
+          MAX(price_max) AS max_price
+        FROM cube_menu_items
+        {where}
+        {group_by}
+        """,
+        params,
+    )
+    if not quantiles:
+        return df
+
+    partition = "PARTITION BY " + ", ".join(cols) if cols else ""
+    q_cols = ",\n".join(
+        f"MIN(bucket) FILTER (WHERE cum >= {float(q)!r} * total) AS b{i}"
+        for i, q in enumerate(quantiles)
+    )
+    sk = query_df(
+        con,
+        f"""
+        WITH merged AS (
+          SELECT {select_group} bucket, SUM(n) AS n
+          FROM cube_price_sketch
+          {where}
+          GROUP BY ALL
+        ),
+        cum AS (
+          SELECT *,
+                 SUM(n) OVER ({partition} ORDER BY bucket) AS cum,
+                 SUM(n) OVER ({partition}) AS total
+          FROM merged
+        )
+        SELECT {select_group} {q_cols}
+        FROM cum
+        {group_by}
+        """,
+        params,
+    )
+    for i, q in enumerate(quantiles):
+        # bucket midpoint in relative terms
+        sk[f"p{round(q * 100):g}"] = 2 * SKETCH_GAMMA ** sk.pop(f"b{i}").astype(float) / (SKETCH_GAMMA + 1)
+
+    if not cols:
+        return pd.concat([df, sk], axis=1)
+    return df.merge(sk, on=cols, how="left")
+
+
+def main() -> None:
+    db_path = Path("data/processed/analytics.duckdb")
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    build_cube(db_path)
+    print("Rollup cube built: cube_restaurants + cube_menu_items + cube_price_sketch")
+
+
+if __name__ == "__main__":
+    main()
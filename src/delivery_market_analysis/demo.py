@@ -1,11 +1,35 @@
 from __future__ import annotations
 
+import argparse
 from pathlib import Path
+from typing import Optional
 
 import duckdb
 
+from delivery_market_analysis.chains import build_chains
+from delivery_market_analysis.cube import build_cube
+from delivery_market_analysis.diet import build_diet
+from delivery_market_analysis.outliers import build_price_stats
+from delivery_market_analysis.pipeline import BuildConfig, build
+from delivery_market_analysis.sampling import build_samples
+from delivery_market_analysis.synthetic import write_raw
+
+
+def create_demo_db(db_path: Path, scale: int = 0, raw_dir: Optional[Path] = None, seed: int = 0) -> None:
+    """
+    Three hard-coded rows per table, or with `scale` that many synthetic
+    restaurants written as raw SQLite files to raw_dir (default data/raw) and
+    built into db_path by the full pipeline.
+    """
+    if scale:
+        raw_dir = Path(raw_dir or "data/raw")
+        write_raw(raw_dir, scale, seed=seed)
+        report = build(BuildConfig(db_path=db_path, raw_dir=raw_dir), force=["all"])
+        failed = report[report["status"].isin(["failed", "blocked"])]
+        if not failed.empty:
+            raise RuntimeError(f"Demo build failed: {failed.to_dict('records')}")
+        return
 
-def create_demo_db(db_path: Path) -> None:
     db_path.parent.mkdir(parents=True, exist_ok=True)
     con = duckdb.connect(db_path.as_posix())
 
@@ -68,7 +92,37 @@ def create_demo_db(db_path: Path) -> None:
 
     con.close()
 
+    build_cube(db_path)
+    build_chains(db_path)
+    build_price_stats(db_path)
+    build_diet(db_path)
+    build_samples(db_path)
+
+
+def add_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--out", default="data/processed/analytics.duckdb")
+    p.add_argument("--scale", type=int, default=0, help="Synthetic restaurants (e.g. 1000 to 10000000); 0 = tiny fixed demo")
+    p.add_argument("--raw", default="data/raw", help="Where --scale writes the raw SQLite files")
+    p.add_argument("--raw-only", action="store_true", help="With --scale: only write the raw files")
+    p.add_argument("--seed", type=int, default=0)
+
+
+def run_from_args(args: argparse.Namespace) -> None:
+    if args.raw_only:
+        if not args.scale:
+            raise SystemExit("--raw-only needs --scale")
+        rows = write_raw(Path(args.raw), args.scale, seed=args.seed)
+        print(f"[demo] wrote {sum(rows.values()):,} rows to {args.raw}: {rows}")
+        return
+    create_demo_db(Path(args.out), args.scale, Path(args.raw), args.seed)
+    print(f"[demo] created {args.out}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.demo")
+    add_arguments(p)
+    run_from_args(p.parse_args())
+
 
 if __name__ == "__main__":
-    create_demo_db(Path("data/processed/analytics.duckdb"))
-    print("[demo] created data/processed/analytics.duckdb")
\ No newline at end of file
+    main()
\ No newline at end of file
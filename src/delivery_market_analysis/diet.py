@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import duckdb
+import pandas as pd
+
+from delivery_market_analysis.queries import query_df
+
+# tag -> bit in diet_mask. Append new tags at the end so stored masks stay valid.
+DIET_TAGS: Dict[str, int] = {
+    "vegan": 0,
+    "vegetarian": 1,
+    "gluten_free": 2,
+    "lactose_free": 3,
+    "halal": 4,
+}
+
+# Tags implied by another tag (a vegan dish is also vegetarian).
+IMPLIES: Dict[str, Tuple[str, ...]] = {"vegan": ("vegetarian",)}
+
+# (term, tag, lang). Terms are matched against accent-stripped lowercase tokens
+# and token bigrams of item name + description; a trailing "*" is a prefix match.
+DIET_TERMS: List[Tuple[str, str, str]] = [
+    ("vegan*", "vegan", "en"),          # vegan, vegans, veganistisch (nl), vegane
+    ("plant based", "vegan", "en"),
+    ("plantaardig", "vegan", "nl"),
+    ("plantaardige", "vegan", "nl"),
+    ("vegetalien", "vegan", "fr"),
+    ("vegetalienne", "vegan", "fr"),
+    ("vegetar*", "vegetarian", "en"),   # vegetarian, vegetarisch (nl), vegetarien(ne) (fr), vegetarier
+    ("veggie*", "vegetarian", "en"),    # also compounds: veggieburger, veggieschotel
+    ("veggy*", "vegetarian", "en"),
+    ("vega", "vegetarian", "nl"),       # Dutch compounds as whole tokens: vega* would take vegas
+    ("vegaburger", "vegetarian", "nl"),
+    ("vegaburgers", "vegetarian", "nl"),
+    ("vegaschotel", "vegetarian", "nl"),
+    ("vegagerecht", "vegetarian", "nl"),
+    ("vegakroket", "vegetarian", "nl"),
+    ("vegaburrito", "vegetarian", "nl"),
+    ("vege", "vegetarian", "fr"),       # whole token only: vege* would take vegetable
+    ("gluten free", "gluten_free", "en"),
+    ("glutenfree", "gluten_free", "en"),
+    ("glutenvrij", "gluten_free", "nl"),
+    ("glutenvrije", "gluten_free", "nl"),
+    ("sans gluten", "gluten_free", "fr"),
+    ("lactose free", "lactose_free", "en"),
+    ("lactosevrij", "lactose_free", "nl"),
+    ("lactosevrije", "lactose_free", "nl"),
+    ("sans lactose", "lactose_free", "fr"),
+    ("halal", "halal", "en"),
+]
+
+
+def tag_bits(tags: Sequence[str]) -> int:
+    """Bitmask for a set of tags (for `diet_mask & bits <> 0` filters)."""
+    return sum(1 << DIET_TAGS[t] for t in tags)
+
+
+def _terms_frame() -> pd.DataFrame:
+    rows = []
+    for term, tag, lang in DIET_TERMS:
+        bits = tag_bits((tag, *IMPLIES.get(tag, ())))
+        rows.append(
+            {
+                "term": term.rstrip("*"),
+                "is_prefix": term.endswith("*"),
+                "tag": tag,
+                "lang": lang,
+                "bits": bits,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def build_diet(db_path: Path) -> None:
+    """
+    Tag every clean menu item in one pass and materialize:
+
+    diet_terms        the dictionary (term, is_prefix, tag, lang, bits)
+    diet_items        tagged items only: (platform, restaurant_key, item_key, diet_mask)
+    diet_restaurants  per restaurant: city, OR of item masks and tagged item counts per tag
+
+    Name and description are accent-stripped, lowercased and split into tokens
+    once; tokens and token bigrams are joined against the dictionary.
+    """
+    con = duckdb.connect(db_path.as_posix())
+    terms = _terms_frame()
+    con.execute("CREATE OR REPLACE TABLE diet_terms AS SELECT * FROM terms;")
+
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE diet_items AS
+        WITH items AS (
+          SELECT
+            platform, restaurant_key, item_key,
+            list_filter(
+              string_split_regex(
+                lower(strip_accents(COALESCE(item_name, '') || ' ' || COALESCE(description, ''))),
+                '[^a-z0-9]+'
+              ),
+              t -> t <> ''
+            ) AS tokens
+          FROM vw_menu_items_clean
+        ),
+        grams AS (
+          SELECT platform, restaurant_key, item_key,
+                 unnest(list_distinct(list_concat(
+                   tokens,
+                   list_transform(range(1, len(tokens)), i -> tokens[i] || ' ' || tokens[i + 1])
+                 ))) AS gram
+          FROM items
+        ),
+        hits AS (
+          SELECT g.platform, g.restaurant_key, g.item_key, d.bits
+          FROM grams g JOIN diet_terms d ON NOT d.is_prefix AND g.gram = d.term
+          UNION ALL
+          SELECT g.platform, g.restaurant_key, g.item_key, d.bits
+          FROM grams g JOIN diet_terms d ON d.is_prefix AND starts_with(g.gram, d.term)
+        )
+        SELECT platform, restaurant_key, item_key, CAST(bit_or(bits) AS USMALLINT) AS diet_mask
+        FROM hits
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2;
+        """
+    )
+
+    per_tag = ",\n".join(
+        f"CAST(SUM(CASE WHEN i.diet_mask & {1 << b} <> 0 THEN 1 ELSE 0 END) AS INTEGER) AS {tag}_items"
+        for tag, b in DIET_TAGS.items()
+    )
+    con.execute(
+        f"""
+        CREATE OR REPLACE TABLE diet_restaurants AS
+        SELECT
+          i.platform,
+          i.restaurant_key,
+          COALESCE(NULLIF(r.city, ''), 'Unknown') AS city,
+          CAST(bit_or(i.diet_mask) AS USMALLINT) AS diet_mask,
+          {per_tag}
+        FROM diet_items i
+        JOIN stg_restaurants r
+          ON r.platform = i.platform AND r.restaurant_key = i.restaurant_key
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 3;
+        """
+    )
+    con.close()
+
+
+def diet_by_city(
+    con: duckdb.DuckDBPyConnection,
+    tags: Sequence[str] = ("vegetarian", "vegan"),
+    platform: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Restaurants per (city, platform) with at least one item of each tag.
+    Totals come from cube_restaurants, so untagged restaurants are counted too.
+    """
+    cols = ",\n".join(
+        f"SUM(CASE WHEN diet_mask & {tag_bits((t,))} <> 0 THEN 1 ELSE 0 END) AS n_{t}" for t in tags
+    )
+    out = ",\n".join(f"CAST(COALESCE(d.n_{t}, 0) AS BIGINT) AS restaurants_with_{t}" for t in tags)
+    return query_df(
+        con,
+        f"""
+        WITH d AS (
+          SELECT platform, city, {cols}
+          FROM diet_restaurants
+          GROUP BY 1, 2
+        )
+        SELECT
+          c.city,
+          c.platform,
+          c.restaurant_count AS restaurants_total,
+          {out}
+        FROM cube_restaurants c
+        LEFT JOIN d ON d.platform = c.platform AND d.city = c.city
+        WHERE ($platform IS NULL OR c.platform = $platform)
+        """,
+        {"platform": platform},
+    )
+
+
+def main() -> None:
+    db_path = Path("data/processed/analytics.duckdb")
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    build_diet(db_path)
+    print("Diet tags built: diet_terms + diet_items + diet_restaurants")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+from __future__ import annotations
+
+from math import cos, degrees, radians
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from delivery_market_analysis.queries import query_df
+
+# Quadtree grid over lon [-180, 180) x lat [-90, 90): level L has 2^L x 2^L cells.
+# Level 8 is ~90 km wide in Belgium, level 16 ~350 m.
+GRID_LEVELS = tuple(range(6, 17))
+MAX_CELLS = 4000
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+
+
+def cell_xy_sql(lat: str, lon: str, level: str) -> tuple[str, str]:
+    x = f"CAST(FLOOR(({lon} + 180.0) / 360.0 * POW(2, {level})) AS BIGINT)"
+    y = f"CAST(FLOOR(({lat} + 90.0) / 180.0 * POW(2, {level})) AS BIGINT)"
+    return x, y
+
+
+def cell_bounds(level: np.ndarray, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, ...]:
+    """(min_lat, min_lon, max_lat, max_lon) of grid cells."""
+    n = np.power(2.0, level)
+    return (
+        y / n * 180.0 - 90.0,
+        x / n * 360.0 - 180.0,
+        (y + 1) / n * 180.0 - 90.0,
+        (x + 1) / n * 360.0 - 180.0,
+    )
+
+
+def zoom_to_level(zoom: float) -> int:
+    # A web-mercator tile at zoom z spans 360/2^z degrees; two extra levels give
+    # roughly 4x4 cells per 256px tile, i.e. ~64px per cell on screen.
+    return int(min(max(round(zoom) + 2, GRID_LEVELS[0]), GRID_LEVELS[-1]))
+
+
+# Finest level of the Morton-coded cell_id stored on stg_restaurants_geo (~2 m);
+# must match the cell_id() macro in sql/90_views_semantic.sql.
+CELL_LEVEL = 24
+EARTH_RADIUS_KM = 6371.0
+
+
+def _spread(v: np.ndarray) -> np.ndarray:
+    v = v.astype(np.int64)
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+
+def morton(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return _spread(np.asarray(x)) | (_spread(np.asarray(y)) << 1)
+
+
+def cell_id(lat, lon, level: int = CELL_LEVEL) -> np.ndarray:
+    """Z-order cell id at `level`; equals cell_id >> 2 * (CELL_LEVEL - level)."""
+    n = 2 ** level
+    x = np.clip(np.floor((np.asarray(lon, dtype=float) + 180.0) / 360.0 * n), 0, n - 1)
+    y = np.clip(np.floor((np.asarray(lat, dtype=float) + 90.0) / 180.0 * n), 0, n - 1)
+    return morton(x, y)
+
+
+def cell_ranges(bbox: BBox, max_cells: int = 64) -> list[tuple[int, int]]:
+    """
+    Cover a bounding box with cells at the finest level that needs at most
+    `max_cells` cells, merged into contiguous [lo, hi] cell_id ranges at CELL_LEVEL.
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox
+
+    def span(level: int) -> tuple[np.ndarray, np.ndarray]:
+        n = 2 ** level
+        xs = np.floor((np.array([min_lon, max_lon]) + 180.0) / 360.0 * n).clip(0, n - 1)
+        ys = np.floor((np.array([min_lat, max_lat]) + 90.0) / 180.0 * n).clip(0, n - 1)
+        return np.arange(xs[0], xs[1] + 1), np.arange(ys[0], ys[1] + 1)
+
+    level = CELL_LEVEL
+    xs, ys = span(level)
+    while level > 0 and len(xs) * len(ys) > max_cells:
+        level -= 1
+        xs, ys = span(level)
+
+    gx, gy = np.meshgrid(xs, ys)
+    codes = np.unique(morton(gx.ravel(), gy.ravel()))
+
+    # merge runs of consecutive Z-order codes, then widen to CELL_LEVEL
+    breaks = np.flatnonzero(np.diff(codes) != 1)
+    starts = np.concatenate([codes[:1], codes[breaks + 1]])
+    ends = np.concatenate([codes[breaks], codes[-1:]])
+    shift = 2 * (CELL_LEVEL - level)
+    return [(int(a) << shift, ((int(b) + 1) << shift) - 1) for a, b in zip(starts, ends)]
+
+
+def _cell_filter(bbox: BBox, max_cells: int) -> str:
+    ranges = cell_ranges(bbox, max_cells)
+    # the outer BETWEEN lets zonemaps skip row groups, the OR list trims the rest
+    ors = " OR ".join(f"cell_id BETWEEN {lo} AND {hi}" for lo, hi in ranges)
+    return f"cell_id BETWEEN {ranges[0][0]} AND {ranges[-1][1]} AND ({ors})"
+
+
+def restaurants_in_bbox(
+    con: duckdb.DuckDBPyConnection,
+    bbox: BBox,
+    platform: Optional[str] = None,
+    max_cells: int = 64,
+) -> pd.DataFrame:
+    """Restaurants inside `bbox`, pruned by cell_id range before the exact check."""
+    params: Dict[str, Any] = {"platform": platform, **_bbox_params(bbox)}
+    return query_df(
+        con,
+        f"""
+        SELECT *
+        FROM stg_restaurants_geo
+        WHERE {_cell_filter(bbox, max_cells)}
+          AND latitude BETWEEN $min_lat AND $max_lat
+          AND longitude BETWEEN $min_lon AND $max_lon
+          AND ($platform IS NULL OR platform = $platform)
+        ORDER BY cell_id
+        """,
+        params,
+    )
+
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> BBox:
+    dlat = degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = degrees(radius_km / (EARTH_RADIUS_KM * max(cos(radians(lat)), 1e-6)))
+    return (max(lat - dlat, -90.0), max(lon - dlon, -180.0), min(lat + dlat, 90.0), min(lon + dlon, 180.0))
+
+
+def restaurants_near(
+    con: duckdb.DuckDBPyConnection,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    platform: Optional[str] = None,
+    limit: Optional[int] = None,
+    max_cells: int = 64,
+) -> pd.DataFrame:
+    """Restaurants within `radius_km` (haversine), nearest first, with distance_km."""
+    bbox = radius_bbox(lat, lon, radius_km)
+    params: Dict[str, Any] = {
+        "platform": platform,
+        "lat": lat,
+        "lon": lon,
+        "radius_km": radius_km,
+        **_bbox_params(bbox),
+    }
+    limit_sql = "" if limit is None else f"LIMIT {int(limit)}"
+    return query_df(
+        con,
+        f"""
+        WITH candidates AS (
+          SELECT *
+          FROM stg_restaurants_geo
+          WHERE {_cell_filter(bbox, max_cells)}
+            AND latitude BETWEEN $min_lat AND $max_lat
+            AND longitude BETWEEN $min_lon AND $max_lon
+            AND ($platform IS NULL OR platform = $platform)
+        ),
+        measured AS (
+          SELECT
+            *,
+            2 * {EARTH_RADIUS_KM} * ASIN(SQRT(
+              POW(SIN(RADIANS(latitude - $lat) / 2), 2)
+              + COS(RADIANS($lat)) * COS(RADIANS(latitude)) * POW(SIN(RADIANS(longitude - $lon) / 2), 2)
+            )) AS distance_km
+          FROM candidates
+        )
+        SELECT *
+        FROM measured
+        WHERE distance_km <= $radius_km
+        ORDER BY distance_km
+        {limit_sql}
+        """,
+        params,
+    )
+
+
+def build_grid(db_path: Path, levels: Sequence[int] = GRID_LEVELS) -> None:
+    """
+    Materialize geo_grid_agg: restaurant counts and rating sums per platform and
+    grid cell at every level. Measures are additive so platforms can be merged.
+    """
+    con = duckdb.connect(db_path.as_posix())
+    x, y = cell_xy_sql("r.latitude", "r.longitude", "lv.level")
+    con.execute(
+        f"""
+        CREATE OR REPLACE TABLE geo_grid_agg AS
+        SELECT
+          lv.level::INTEGER AS level,
+          r.platform,
+          {x} AS cell_x,
+          {y} AS cell_y,
+          COUNT(*) AS restaurant_count,
+          SUM(r.latitude) AS lat_sum,
+          SUM(r.longitude) AS lon_sum,
+          COUNT(r.rating_value) AS rating_n,
+          SUM(r.rating_value) AS rating_sum,
+          SUM(r.rating_count) AS review_sum
+        FROM stg_restaurants r
+        CROSS JOIN (SELECT UNNEST($levels) AS level) lv
+        WHERE r.latitude BETWEEN -90 AND 90
+          AND r.longitude BETWEEN -180 AND 180
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4;
+        """,
+        {"levels": list(levels)},
+    )
+    con.close()
+
+
+def _bbox_params(bbox: Optional[BBox]) -> Dict[str, Any]:
+    if bbox is None:
+        return {"min_lat": None, "min_lon": None, "max_lat": None, "max_lon": None}
+    min_lat, min_lon, max_lat, max_lon = bbox
+    return {"min_lat": min_lat, "min_lon": min_lon, "max_lat": max_lat, "max_lon": max_lon}
+
+
+_BBOX_WHERE = """
+  ($min_lat IS NULL OR {lat} BETWEEN $min_lat AND $max_lat)
+  AND ($min_lon IS NULL OR {lon} BETWEEN $min_lon AND $max_lon)
+"""
+
+
+def _pick_level(counts: pd.DataFrame, max_cells: int, max_level: Optional[int]) -> Optional[int]:
+    if counts.empty:
+        return None
+    if max_level is not None:
+        counts = counts[counts["level"] <= max_level]
+        if counts.empty:
+            return int(GRID_LEVELS[0])
+    fits = counts[counts["cells"] <= max_cells]
+    if fits.empty:
+        return int(counts["level"].min())
+    return int(fits["level"].max())
+
+
+def _finish(df: pd.DataFrame) -> pd.DataFrame:
+    min_lat, min_lon, max_lat, max_lon = cell_bounds(
+        df["level"].to_numpy(), df["cell_x"].to_numpy(), df["cell_y"].to_numpy()
+    )
+    return df.assign(min_lat=min_lat, min_lon=min_lon, max_lat=max_lat, max_lon=max_lon)
+
+
+def grid_cells(
+    con: duckdb.DuckDBPyConnection,
+    platform: Optional[str] = None,
+    bbox: Optional[BBox] = None,
+    max_cells: int = MAX_CELLS,
+    max_level: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Restaurant density cells from geo_grid_agg at the finest level that keeps
+    the result under `max_cells` (and at or below `max_level`, e.g. from
+    zoom_to_level). The payload is bounded no matter how many restaurants exist;
+    with no restaurants the result is empty but has every column.
+    """
+    params: Dict[str, Any] = {"platform": platform, **_bbox_params(bbox)}
+    where = "WHERE ($platform IS NULL OR platform = $platform) AND " + _BBOX_WHERE.format(
+        lat="lat_sum / restaurant_count", lon="lon_sum / restaurant_count"
+    )
+    counts = query_df(
+        con,
+        f"""
+        SELECT level, COUNT(DISTINCT (cell_x, cell_y)) AS cells
+        FROM geo_grid_agg
+        {where}
+        GROUP BY 1
+        """,
+        params,
+    )
+    # no cells at all: any level gives the empty result with its columns
+    level = _pick_level(counts, max_cells, max_level) or GRID_LEVELS[0]
+
+    params["level"] = level
+    df = query_df(
+        con,
+        f"""
+        SELECT
+          level,
+          cell_x,
+          cell_y,
+          CAST(SUM(restaurant_count) AS BIGINT) AS restaurant_count,
+          SUM(lat_sum) / SUM(restaurant_count) AS latitude,
+          SUM(lon_sum) / SUM(restaurant_count) AS longitude,
+          SUM(rating_sum) / NULLIF(SUM(rating_n), 0) AS avg_rating,
+          CAST(SUM(review_sum) AS BIGINT) AS total_reviews,
+          STRING_AGG(DISTINCT platform, ', ') AS platforms
+        FROM geo_grid_agg
+        {where} AND level = $level
+        GROUP BY 1, 2, 3
+        ORDER BY restaurant_count DESC
+        LIMIT {int(max_cells)}
+        """,
+        params,
+    )
+    return _finish(df)
+
+
+def aggregate_points(
+    con: duckdb.DuckDBPyConnection,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    value: Optional[str] = None,
+    max_cells: int = MAX_CELLS,
+    max_level: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Grid-aggregate an arbitrary query with latitude/longitude columns inside
+    DuckDB (for filtered sets that cannot be precomputed, e.g. a dish keyword).
+    `value` names an optional numeric column averaged per cell as avg_value.
+    Without points the result is empty but has every column.
+    """
+    params = dict(params or {})
+    params["levels"] = list(GRID_LEVELS)
+    x, y = cell_xy_sql("p.latitude", "p.longitude", "lv.level")
+    pts = f"""
+        pts AS (
+          SELECT * FROM ({sql}) q
+          WHERE q.latitude BETWEEN -90 AND 90 AND q.longitude BETWEEN -180 AND 180
+        )
+    """
+    counts = query_df(
+        con,
+        f"""
+        WITH {pts}
+        SELECT lv.level, COUNT(DISTINCT ({x}, {y})) AS cells
+        FROM pts p CROSS JOIN (SELECT UNNEST($levels) AS level) lv
+        GROUP BY 1
+        """,
+        params,
+    )
+    level = _pick_level(counts, max_cells, max_level) or GRID_LEVELS[0]
+
+    params.pop("levels")
+    x, y = cell_xy_sql("p.latitude", "p.longitude", str(level))
+    avg_value = f", AVG(p.{value}) AS avg_value" if value else ""
+    df = query_df(
+        con,
+        f"""
+        WITH {pts}
+        SELECT
+          {level} AS level,
+          {x} AS cell_x,
+          {y} AS cell_y,
+          COUNT(*) AS restaurant_count,
+          AVG(p.latitude) AS latitude,
+          AVG(p.longitude) AS longitude
+          {avg_value}
+        FROM pts p
+        GROUP BY 1, 2, 3
+        ORDER BY restaurant_count DESC
+        LIMIT {int(max_cells)}
+        """,
+        params,
+    )
+    return _finish(df)
+
+
+def grid_deck(
+    cells: pd.DataFrame,
+    tooltip: Optional[str] = None,
+    zoom: Optional[float] = None,
+    value: str = "restaurant_count",
+):
+    """pydeck Deck drawing each cell as a rectangle shaded by `value` (log scale)."""
+    import pydeck as pdk
+
+    df = cells.copy()
+    df["polygon"] = [
+        [[w, s], [e, s], [e, n], [w, n]]
+        for s, w, n, e in zip(df["min_lat"], df["min_lon"], df["max_lat"], df["max_lon"])
+    ]
+    shade = np.log1p(df[value].to_numpy(dtype=float))
+    shade = shade / shade.max() if shade.size and shade.max() > 0 else shade
+    df["fill"] = [[255, int(200 * (1 - s)), 0, int(60 + 160 * s)] for s in shade]
+    df = df.drop(columns=["min_lat", "min_lon", "max_lat", "max_lon"])
+
+    weights = df[value].to_numpy(dtype=float)
+    lat0 = float(np.average(df["latitude"], weights=weights))
+    lon0 = float(np.average(df["longitude"], weights=weights))
+    if zoom is None:
+        # fit the extent roughly: one zoom step per halving of the span
+        span = max(np.ptp(df["latitude"]), np.ptp(df["longitude"]) * cos(radians(lat0)), 1e-3)
+        zoom = float(np.clip(np.log2(180.0 / span), 3, 14))
+
+    layer = pdk.Layer(
+        "PolygonLayer",
+        df,
+        get_polygon="polygon",
+        get_fill_color="fill",
+        stroked=False,
+        pickable=True,
+    )
+    return pdk.Deck(
+        layers=[layer],
+        initial_view_state=pdk.ViewState(latitude=lat0, longitude=lon0, zoom=zoom),
+        tooltip={"text": tooltip or "{restaurant_count} restaurants"},
+        map_style=None,
+    )
+
+
+def main() -> None:
+    db_path = Path("data/processed/analytics.duckdb")
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    build_grid(db_path)
+    print(f"Spatial grid built: geo_grid_agg (levels {GRID_LEVELS[0]}-{GRID_LEVELS[-1]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import re
+from datetime import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from delivery_market_analysis.queries import order_sql, query_df
+
+# Weekly opening bitmap: 7 days x 96 quarter-hour slots, Monday 00:00 = bit 0.
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+
+DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+_DAY_PREFIX = {name[:2].lower(): i for i, name in enumerate(DAY_NAMES)}
+_DAY_COLUMNS = ("day_range", "day_of_week", "days", "day", "weekday")
+
+Clock = Union[str, time]
+
+
+def _minutes(t: Clock) -> int:
+    if isinstance(t, time):
+        return t.hour * 60 + t.minute
+    h, m = t.split(":")[:2]
+    return int(h) * 60 + int(m)
+
+
+def parse_days(value: object) -> np.ndarray:
+    """
+    7-bool mask from a day spec: "Monday - Friday", "Sat, Sun", "Every day",
+    a weekday index (0 = Monday) or None (= every day).
+    """
+    mask = np.zeros(7, dtype=bool)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        mask[:] = True
+        return mask
+    s = str(value).strip().lower()
+    if s.isdigit():
+        mask[int(s) % 7] = True
+        return mask
+    if not s or "every" in s or "daily" in s or "all" in s:
+        mask[:] = True
+        return mask
+
+    for part in re.split(r"[,;/]| and ", s):
+        names = [_DAY_PREFIX.get(w[:2]) for w in re.findall(r"[a-z]+", part)]
+        names = [d for d in names if d is not None]
+        if not names:
+            continue
+        if len(names) >= 2 and re.search(r"-|–|to|through", part):
+            a, b = names[0], names[-1]
+            for i in range(7):
+                if (i - a) % 7 <= (b - a) % 7:
+                    mask[i] = True
+        else:
+            mask[names] = True
+    if not mask.any():
+        mask[:] = True
+    return mask
+
+
+def week_bitmap(
+    owner: np.ndarray,
+    day_masks: np.ndarray,
+    start_min: np.ndarray,
+    end_min: np.ndarray,
+    n_owners: int,
+) -> np.ndarray:
+    """
+    Bool matrix (n_owners, WEEK_SLOTS) from opening intervals. An interval that
+    ends at or before its start runs past midnight into the next day (and
+    Sunday night wraps to Monday morning).
+    """
+    rows, days = np.nonzero(day_masks)
+    start = np.clip(start_min[rows], 0, 24 * 60)
+    end = np.clip(end_min[rows], 0, 48 * 60)
+    end = np.where(end <= start, end + 24 * 60, end)
+
+    a = days * SLOTS_PER_DAY + start // SLOT_MINUTES
+    b = days * SLOTS_PER_DAY + -(-end // SLOT_MINUTES)  # ceil: 22:10 closes the 22:00 slot
+    who = owner[rows]
+
+    # difference array per owner; intervals past Sunday midnight wrap around
+    diff = np.zeros((n_owners, WEEK_SLOTS + 1), dtype=np.int32)
+    wrap = b > WEEK_SLOTS
+    np.add.at(diff, (who, a), 1)
+    np.add.at(diff, (who, np.minimum(b, WEEK_SLOTS)), -1)
+    np.add.at(diff, (who[wrap], np.zeros(wrap.sum(), dtype=np.int64)), 1)
+    np.add.at(diff, (who[wrap], b[wrap] - WEEK_SLOTS), -1)
+    return np.cumsum(diff[:, :WEEK_SLOTS], axis=1) > 0
+
+
+def _bit_strings(bits: np.ndarray) -> list[str]:
+    chars = (bits.astype(np.uint8) + ord("0")).view(f"S{WEEK_SLOTS}")
+    return [c.decode("ascii") for c in chars.ravel()]
+
+
+def build_hours(db_path: Path) -> None:
+    """
+    Materialize hours_weekly: one row per restaurant with its weekly opening
+    bitmap (BIT(672)) plus the latest closing time, from UberEats section hours.
+    """
+    con = duckdb.connect(db_path.as_posix())
+    cols = {
+        r[0]
+        for r in con.execute(
+            """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'ubereats' AND table_name = 'restaurant_hours_to_section_hours';
+            """
+        ).fetchall()
+    }
+
+    if "end_time" in cols:
+        day_col = next((c for c in _DAY_COLUMNS if c in cols), None)
+        start = "TRY_CAST(start_time AS INTEGER)" if "start_time" in cols else "0"
+        day = f"CAST({day_col} AS VARCHAR)" if day_col else "NULL"
+        raw = con.execute(
+            f"""
+            SELECT
+              CAST(restaurant_id AS VARCHAR) AS restaurant_key,
+              {day} AS day_spec,
+              COALESCE({start}, 0) AS start_min,
+              TRY_CAST(end_time AS INTEGER) AS end_min
+            FROM ubereats.restaurant_hours_to_section_hours
+            WHERE TRY_CAST(end_time AS INTEGER) IS NOT NULL
+            """
+        ).df()
+    else:
+        raw = pd.DataFrame(columns=["restaurant_key", "day_spec", "start_min", "end_min"])
+
+    keys, owner = np.unique(raw["restaurant_key"].astype(str).to_numpy(), return_inverse=True)
+    specs = raw["day_spec"].astype(object).where(raw["day_spec"].notna(), None)
+    spec_masks = {s: parse_days(s) for s in specs.unique()}
+    day_masks = np.array([spec_masks[s] for s in specs], dtype=bool).reshape(-1, 7)
+
+    bits = week_bitmap(
+        owner,
+        day_masks,
+        raw["start_min"].to_numpy(dtype=np.int64),
+        raw["end_min"].to_numpy(dtype=np.int64),
+        len(keys),
+    )
+    latest_end = raw.groupby(owner)["end_min"].max().reindex(range(len(keys))).to_numpy(dtype=np.int64)
+
+    weekly = pd.DataFrame(
+        {
+            "restaurant_key": keys,
+            "week_bits": _bit_strings(bits),
+            "open_slots": bits.sum(axis=1).astype(np.int32),
+            "latest_end_min": latest_end,
+        }
+    )
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE hours_weekly AS
+        SELECT
+          'ubereats' AS platform,
+          restaurant_key,
+          CAST(week_bits AS BIT) AS week_bits,
+          open_slots,
+          MAKE_TIME(
+            CAST((latest_end_min % 1440) // 60 AS BIGINT),
+            CAST(latest_end_min % 60 AS BIGINT),
+            0
+          ) AS latest_end
+        FROM weekly
+        ORDER BY restaurant_key;
+        """
+    )
+    con.close()
+
+
+def window_mask(day: int, start: Clock, end: Optional[Clock] = None) -> str:
+    """
+    BIT string selecting the slots of `day` (0 = Monday) from `start` up to
+    `end` (exclusive; None = a single slot, "24:00" = until midnight). A window
+    whose end is at or before its start continues into the next day.
+    """
+    a = day * SLOTS_PER_DAY + _minutes(start) // SLOT_MINUTES
+    if end is None:
+        b = a + 1
+    else:
+        e = _minutes(end)
+        if e <= _minutes(start):
+            e += 24 * 60
+        b = day * SLOTS_PER_DAY + -(-e // SLOT_MINUTES)
+    mask = np.zeros(WEEK_SLOTS, dtype=bool)
+    idx = np.arange(a, b) % WEEK_SLOTS
+    mask[idx] = True
+    return _bit_strings(mask[None, :])[0]
+
+
+def open_at_mask(day: int, at: Clock) -> str:
+    return window_mask(day, at)
+
+
+def open_after_mask(day: int, after: Clock) -> str:
+    return window_mask(day, after, "24:00")
+
+
+# sort keys of restaurants_open; the query has one row per (platform, restaurant_key),
+# which makes every row's position unique
+OPEN_ORDER = ("is_open DESC", "latest_end DESC", "platform", "restaurant_key")
+
+
+def restaurants_open_query(mask: str, city: str = "") -> Tuple[str, Dict[str, Any]]:
+    """
+    Unsorted SQL and params of restaurants_open, for queries.page / queries.export.
+    One row per restaurant: stg_restaurants repeats a key per location, so its
+    first location (in the city, when filtered) stands for it.
+    """
+    return (
+        """
+        WITH r AS (
+          SELECT platform, restaurant_key, restaurant_name, city, latitude, longitude
+          FROM stg_restaurants
+          WHERE ($city = '' OR LOWER(city) = LOWER($city))
+          QUALIFY ROW_NUMBER() OVER (
+            PARTITION BY platform, restaurant_key ORDER BY city, latitude, longitude
+          ) = 1
+        )
+        SELECT
+          r.restaurant_name,
+          COALESCE(NULLIF(r.city,''),'Unknown') AS city,
+          r.latitude,
+          r.longitude,
+          h.latest_end,
+          CASE WHEN bit_count(h.week_bits & CAST($mask AS BIT)) > 0 THEN 1 ELSE 0 END AS is_open,
+          h.platform,
+          h.restaurant_key
+        FROM hours_weekly h
+        JOIN r ON r.platform = h.platform AND r.restaurant_key = h.restaurant_key
+        """,
+        {"mask": mask, "city": city},
+    )
+
+
+def restaurants_open(
+    con: duckdb.DuckDBPyConnection,
+    mask: str,
+    city: str = "",
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    """Restaurants with hours, flagged is_open when any slot in `mask` is set."""
+    sql, params = restaurants_open_query(mask, city)
+    limit_sql = "" if limit is None else f"LIMIT {int(limit)}"
+    return query_df(con, f"SELECT * FROM ({sql}) ORDER BY {order_sql(OPEN_ORDER)} {limit_sql}", params)
+
+
+def main() -> None:
+    db_path = Path("data/processed/analytics.duckdb")
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    build_hours(db_path)
+    print("Opening hours built: hours_weekly (7 x 96 quarter-hour bitmap)")
+
+
+if __name__ == "__main__":
+    main()
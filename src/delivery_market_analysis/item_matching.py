@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+MIN_SCORE = 85
+CLUSTERS_PER_TASK = 200
+
+PAIR_COLUMNS = [
+    "canonical_id",
+    "platform_a",
+    "item_key_a",
+    "item_name_a",
+    "price_a",
+    "platform_b",
+    "item_key_b",
+    "item_name_b",
+    "price_b",
+    "score",
+]
+
+
+# Lowercase, strip accents and punctuation: "Crème brûlée (1 pc)" -> "creme brulee 1 pc"
+NORMALIZE_SQL = "trim(regexp_replace(lower(strip_accents({col})), '[^a-z0-9]+', ' ', 'g'))"
+
+# one cluster: canonical_id -> platform -> (item_keys, item_names, prices, normalized names)
+Menu = Tuple[list, list, list, list]
+
+
+def match_menus(
+    names_a: Sequence[str],
+    names_b: Sequence[str],
+    min_score: int = MIN_SCORE,
+) -> List[Tuple[int, int, float]]:
+    """
+    One-to-one item pairs between two menus: (index_a, index_b, score) where
+    each item is the other's best match and the score is at least min_score.
+    """
+    if not names_a or not names_b:
+        return []
+    scores = process.cdist(names_a, names_b, scorer=fuzz.token_sort_ratio, score_cutoff=min_score)
+    best_b = scores.argmax(axis=1)
+    best_a = scores.argmax(axis=0)
+    pairs = []
+    for i, j in enumerate(best_b):
+        s = scores[i, j]
+        if s >= min_score and best_a[j] == i:
+            pairs.append((i, int(j), float(s)))
+    return pairs
+
+
+def _match_clusters(clusters: List[Tuple[str, Dict[str, Menu]]], min_score: int) -> List[tuple]:
+    rows: List[tuple] = []
+    for canonical_id, menus in clusters:
+        platforms = sorted(menus)
+        for x, pa in enumerate(platforms):
+            for pb in platforms[x + 1:]:
+                ka, na, pra, norm_a = menus[pa]
+                kb, nb, prb, norm_b = menus[pb]
+                for i, j, score in match_menus(norm_a, norm_b, min_score):
+                    rows.append((canonical_id, pa, ka[i], na[i], pra[i], pb, kb[j], nb[j], prb[j], score))
+    return rows
+
+
+def build_item_matches(
+    db_path: Path,
+    min_score: int = MIN_SCORE,
+    workers: Optional[int] = None,
+) -> None:
+    """
+    Materialize g1_item_matches: menu items paired across platforms inside each
+    cross-platform canonical cluster of g1_restaurant_matches, with the price
+    difference (price_b - price_a). Scoring never leaves a cluster, so the work
+    grows with the number of clusters rather than with the square of the menu
+    corpus; clusters are spread over a process pool.
+    """
+    con = duckdb.connect(db_path.as_posix())
+    menus = con.execute(
+        f"""
+        WITH cross_clusters AS (
+          SELECT canonical_id
+          FROM g1_restaurant_matches
+          GROUP BY 1
+          HAVING COUNT(DISTINCT platform) >= 2
+        ),
+        items AS (
+          SELECT
+            m.canonical_id,
+            i.platform,
+            i.item_key,
+            i.item_name,
+            CAST(i.price AS DOUBLE) AS price,
+            {NORMALIZE_SQL.format(col="i.item_name")} AS name_norm
+          FROM g1_restaurant_matches m
+          JOIN cross_clusters USING (canonical_id)
+          JOIN vw_menu_items_clean i
+            ON i.platform = m.platform AND i.restaurant_key = m.restaurant_key
+        )
+        SELECT canonical_id, platform, item_key, item_name, price, name_norm
+        FROM items
+        WHERE name_norm <> ''
+        ORDER BY canonical_id, platform, item_key
+        """
+    ).fetchnumpy()
+
+    # split the sorted columns at every (canonical_id, platform) boundary
+    cid, plat = menus["canonical_id"], menus["platform"]
+    n = len(cid)
+    starts = np.flatnonzero(np.r_[True, (cid[1:] != cid[:-1]) | (plat[1:] != plat[:-1])]) if n else np.array([], int)
+    ends = np.r_[starts[1:], n]
+    cols = [menus[c].tolist() for c in ("item_key", "item_name", "price", "name_norm")]
+
+    clusters: Dict[str, Dict[str, Menu]] = {}
+    for a, b in zip(starts, ends):
+        clusters.setdefault(cid[a], {})[plat[a]] = tuple(c[a:b] for c in cols)
+    cluster_list = [(c, m) for c, m in clusters.items() if len(m) >= 2]
+    tasks = [cluster_list[i:i + CLUSTERS_PER_TASK] for i in range(0, len(cluster_list), CLUSTERS_PER_TASK)]
+
+    workers = workers or os.cpu_count() or 1
+    rows: List[tuple] = []
+    if workers <= 1 or len(tasks) <= 1:
+        for t in tasks:
+            rows.extend(_match_clusters(t, min_score))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(_match_clusters, tasks, [min_score] * len(tasks)):
+                rows.extend(part)
+
+    pairs = pd.DataFrame(rows, columns=PAIR_COLUMNS).astype(
+        {"price_a": np.float64, "price_b": np.float64, "score": np.float64}
+    )
+
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE g1_item_matches AS
+        SELECT
+          *,
+          price_b - price_a AS price_diff,
+          price_b / NULLIF(price_a, 0) - 1 AS price_diff_pct
+        FROM pairs
+        ORDER BY canonical_id, platform_a, platform_b;
+        """
+    )
+    con.close()
+
+
+def price_gaps(con: duckdb.DuckDBPyConnection) -> pd.DataFrame:
+    """Matched dishes per platform pair with the average and median price difference."""
+    return con.execute(
+        """
+        SELECT
+          platform_a,
+          platform_b,
+          COUNT(*) AS matched_items,
+          COUNT(DISTINCT canonical_id) AS restaurants,
+          AVG(price_diff) AS avg_price_diff,
+          MEDIAN(price_diff) AS median_price_diff,
+          AVG(price_diff_pct) AS avg_price_diff_pct
+        FROM g1_item_matches
+        GROUP BY 1, 2
+        ORDER BY matched_items DESC;
+        """
+    ).df()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.item_matching")
+    p.add_argument("--db", default="data/processed/analytics.duckdb")
+    p.add_argument("--min-score", type=int, default=MIN_SCORE, help="Minimum token-sort ratio (0-100)")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = p.parse_args()
+
+    db_path = Path(args.db)
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    build_item_matches(db_path, min_score=args.min_score, workers=args.workers)
+    print("G1 item matching built: g1_item_matches")
+
+
+if __name__ == "__main__":
+    main()
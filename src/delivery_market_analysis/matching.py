@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import argparse
 import re
 from dataclasses import dataclass
 from math import asin, cos, radians, sin, sqrt
@@ -10,6 +11,8 @@ import duckdb
 import pandas as pd
 from rapidfuzz import fuzz, process
 
+from delivery_market_analysis import profiling
+
 
 STOPWORDS = {
     "restaurant", "resto", "snack", "bar", "grill", "kitchen", "takeaway", "delivery",
@@ -20,7 +23,7 @@ PLATFORM_ORDER = {"takeaway": 0, "deliveroo": 1, "ubereats": 2}
 
 
 def normalize_text(s: Optional[str]) -> str:
-    if not s:
+    if not s or not isinstance(s, str):  # None / NaN from pandas
         return ""
     s = s.lower()
     s = re.sub(r"[^a-z0-9\s]", " ", s)
@@ -120,30 +123,34 @@ def best_edges_for_city(nodes: List[Node], limit: int = 5) -> List[Tuple[str, st
 def build_matches(db_path: Path) -> None:
     con = duckdb.connect(db_path.as_posix())
 
-    df = con.execute(
-        """
-        SELECT platform, restaurant_key, restaurant_name, city, latitude, longitude
-        FROM stg_restaurants
-        """
-    ).df()
-
-    df["name_norm"] = df["restaurant_name"].map(normalize_text)
-    df["city_norm"] = df["city"].map(normalize_text)
-
-    nodes: List[Node] = []
-    for r in df.itertuples(index=False):
-        lat = float(r.latitude) if r.latitude is not None and str(r.latitude) != "" else None
-        lon = float(r.longitude) if r.longitude is not None and str(r.longitude) != "" else None
-        nodes.append(
-            Node(
-                platform=str(r.platform),
-                restaurant_key=str(r.restaurant_key),
-                name_norm=str(r.name_norm),
-                city_norm=str(r.city_norm),
-                lat=lat,
-                lon=lon,
+    with profiling.profile("matching", "load", con=con) as rec:
+        df = con.execute(
+            """
+            SELECT platform, restaurant_key, restaurant_name, city, latitude, longitude
+            FROM stg_restaurants
+            """
+        ).df()
+        if rec is not None:
+            rec["rows"] = len(df)
+
+    with profiling.profile("matching", "normalize"):
+        df["name_norm"] = df["restaurant_name"].map(normalize_text)
+        df["city_norm"] = df["city"].map(normalize_text)
+
+        nodes: List[Node] = []
+        for r in df.itertuples(index=False):
+            lat = float(r.latitude) if r.latitude is not None and str(r.latitude) != "" else None
+            lon = float(r.longitude) if r.longitude is not None and str(r.longitude) != "" else None
+            nodes.append(
+                Node(
+                    platform=str(r.platform),
+                    restaurant_key=str(r.restaurant_key),
+                    name_norm=str(r.name_norm),
+                    city_norm=str(r.city_norm),
+                    lat=lat,
+                    lon=lon,
+                )
             )
-        )
 
     uf = UnionFind()
 
@@ -153,10 +160,11 @@ def build_matches(db_path: Path) -> None:
         key = n.city_norm or "unknown"
         city_groups.setdefault(key, []).append(n)
 
-    for city_key, group in city_groups.items():
-        edges = best_edges_for_city(group, limit=5)
-        for a, b, _score in edges:
-            uf.union(a, b)
+    with profiling.profile("matching", "score", cities=len(city_groups)):
+        for city_key, group in city_groups.items():
+            edges = best_edges_for_city(group, limit=5)
+            for a, b, _score in edges:
+                uf.union(a, b)
 
     # canonical id = root
     records = []
@@ -167,32 +175,136 @@ def build_matches(db_path: Path) -> None:
 
     match_df = pd.DataFrame(records, columns=["canonical_id", "platform", "restaurant_key"])
 
-    con.execute("DROP TABLE IF EXISTS g1_restaurant_matches;")
-    con.execute("CREATE TABLE g1_restaurant_matches AS SELECT * FROM match_df;")
+    with profiling.profile("matching", "write", con=con):
+        con.execute("DROP TABLE IF EXISTS g1_restaurant_matches;")
+        con.execute("CREATE TABLE g1_restaurant_matches AS SELECT * FROM match_df;")
 
-    # helper view for summary
-    con.execute(
+    with profiling.profile("matching", "canonical", con=con):
+        build_canonical(con)
+    con.close()
+
+
+def _platform_cols(template: str, sep: str = ",\n") -> str:
+    return sep.join(template.format(p=p, bit=1 << i) for p, i in PLATFORM_ORDER.items())
+
+
+def build_canonical(con: duckdb.DuckDBPyConnection) -> None:
+    """
+    g1_canonical_restaurants: one row per canonical_id with the platform set as
+    a bitmask (bit = 1 << PLATFORM_ORDER[platform]), representative name and
+    city, centroid, and rating / review / fee aggregates per platform.
+    """
+    per_platform = _platform_cols(
         """
-        CREATE OR REPLACE VIEW vw_canonical_restaurants AS
+          AVG(CASE WHEN r.platform = '{p}' THEN r.rating_value END) AS {p}_rating,
+          COUNT(CASE WHEN r.platform = '{p}' THEN r.rating_value END) AS {p}_rating_n,
+          CAST(SUM(CASE WHEN r.platform = '{p}' THEN r.rating_count END) AS BIGINT) AS {p}_reviews,
+          AVG(CASE WHEN r.platform = '{p}' THEN r.delivery_fee END) AS {p}_fee""".strip("\n")
+    )
+    con.execute(
+        f"""
+        CREATE OR REPLACE TABLE g1_canonical_restaurants AS
         SELECT
           m.canonical_id,
+          CAST(BIT_OR(CASE m.platform {_platform_cols("WHEN '{p}' THEN {bit}", " ")} ELSE 0 END) AS UTINYINT)
+            AS platform_mask,
           COUNT(*) AS platform_rows,
           COUNT(DISTINCT m.platform) AS platform_count,
-          STRING_AGG(DISTINCT m.platform, ', ') AS platforms
+          STRING_AGG(DISTINCT m.platform, ', ') AS platforms,
+          MODE(r.restaurant_name) AS representative_name,
+          COALESCE(MODE(NULLIF(r.city, '')), 'Unknown') AS city,
+          AVG(r.latitude) AS latitude,
+          AVG(r.longitude) AS longitude,
+          AVG(r.rating_value) AS avg_rating,
+          CAST(SUM(COALESCE(r.rating_count, 0)) AS BIGINT) AS total_reviews,
+          AVG(r.delivery_fee) AS avg_delivery_fee,
+{per_platform}
         FROM g1_restaurant_matches m
-        GROUP BY 1;
+        JOIN stg_restaurants r
+          ON r.platform = m.platform AND r.restaurant_key = m.restaurant_key
+        GROUP BY 1
+        ORDER BY platform_count DESC, canonical_id;
         """
     )
 
-    con.close()
+    # helper view for summary
+    con.execute(
+        """
+        CREATE OR REPLACE VIEW vw_canonical_restaurants AS
+        SELECT canonical_id, platform_rows, platform_count, platforms
+        FROM g1_canonical_restaurants;
+        """
+    )
+
+
+def overlap_pairs(con: duckdb.DuckDBPyConnection) -> pd.DataFrame:
+    """Canonical restaurants listed on both platforms, for every platform pair."""
+    bits = ", ".join(f"('{p}', {1 << i})" for p, i in PLATFORM_ORDER.items())
+    return con.execute(
+        f"""
+        WITH masks AS (
+          SELECT platform_mask, COUNT(*) AS n
+          FROM g1_canonical_restaurants
+          GROUP BY 1
+        ),
+        p AS (SELECT * FROM (VALUES {bits}) t(platform, bit))
+        SELECT a.platform AS p1, b.platform AS p2, CAST(SUM(m.n) AS BIGINT) AS overlap
+        FROM masks m, p a, p b
+        WHERE a.platform < b.platform
+          AND m.platform_mask & a.bit <> 0
+          AND m.platform_mask & b.bit <> 0
+        GROUP BY 1, 2
+        ORDER BY overlap DESC;
+        """
+    ).df()
+
+
+def top_cross_platform(
+    con: duckdb.DuckDBPyConnection,
+    min_reviews: int = 0,
+    min_platforms: int = 2,
+    limit: int = 50,
+) -> pd.DataFrame:
+    """
+    Canonical restaurants rated on at least `min_platforms` platforms with
+    `min_reviews` reviews each; the rating is averaged over those platforms.
+    `rated_platforms` counts those platforms (`platform_count` in the table
+    counts every listing and only prefilters).
+    """
+    ok = {p: f"({p}_rating IS NOT NULL AND COALESCE({p}_reviews, 0) >= $min_reviews)" for p in PLATFORM_ORDER}
+    n_ok = " + ".join(f"CAST({c} AS INTEGER)" for c in ok.values())
+    rating_sum = " + ".join(f"CASE WHEN {c} THEN {p}_rating * {p}_rating_n ELSE 0 END" for p, c in ok.items())
+    rating_n = " + ".join(f"CASE WHEN {c} THEN {p}_rating_n ELSE 0 END" for p, c in ok.items())
+    return con.execute(
+        f"""
+        SELECT
+          canonical_id,
+          {n_ok} AS rated_platforms,
+          platforms,
+          representative_name,
+          city,
+          ({rating_sum}) / NULLIF({rating_n}, 0) AS avg_rating,
+          avg_delivery_fee,
+          total_reviews
+        FROM g1_canonical_restaurants
+        WHERE platform_count >= $min_platforms
+          AND {n_ok} >= $min_platforms
+        ORDER BY rated_platforms DESC, avg_rating DESC, total_reviews DESC
+        LIMIT {int(limit)};
+        """,
+        {"min_reviews": int(min_reviews), "min_platforms": int(min_platforms)},
+    ).df()
 
 
 def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.matching")
+    profiling.add_argument(p)
+    profiling.enable_from_args(p.parse_args())
     db_path = Path("data/processed/analytics.duckdb")
     if not db_path.exists():
         raise FileNotFoundError(db_path)
     build_matches(db_path)
-    print("G1 matching built: g1_restaurant_matches + vw_canonical_restaurants")
+    print("G1 matching built: g1_restaurant_matches + g1_canonical_restaurants")
 
 
 if __name__ == "__main__":
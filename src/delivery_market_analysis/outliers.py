@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from math import sqrt
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from delivery_market_analysis.queries import query_df
+
+# Consistency constant so median/MAD scores are comparable to z-scores on normal data.
+MAD_SCALE = 0.6745
+BATCH_ROWS = 1_000_000
+
+_ITEMS_SQL = """
+SELECT
+  i.platform,
+  COALESCE(NULLIF(i.category_name, ''), 'Unknown') AS category_name,
+  CAST(i.price AS DOUBLE) AS price
+FROM vw_menu_items_clean i
+"""
+
+# (platform, category_name); category_name None = all categories of the platform
+Key = Tuple[str, Optional[str]]
+
+
+@dataclass
+class Moments:
+    """Count, mean and sum of squared deviations (Welford), mergeable with Chan et al."""
+    n: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    @classmethod
+    def of(cls, values: np.ndarray) -> "Moments":
+        if len(values) == 0:
+            return cls()
+        mean = float(values.mean())
+        return cls(len(values), mean, float(((values - mean) ** 2).sum()))
+
+    def merge(self, other: "Moments") -> "Moments":
+        if other.n == 0:
+            return Moments(self.n, self.mean, self.m2)
+        if self.n == 0:
+            return Moments(other.n, other.mean, other.m2)
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        return Moments(
+            n,
+            self.mean + delta * other.n / n,
+            self.m2 + other.m2 + delta * delta * self.n * other.n / n,
+        )
+
+    @property
+    def stddev(self) -> Optional[float]:
+        # sample standard deviation, like STDDEV_SAMP
+        return sqrt(self.m2 / (self.n - 1)) if self.n > 1 else None
+
+
+def _batch_moments(df: pd.DataFrame) -> Dict[Key, Moments]:
+    out: Dict[Key, Moments] = {}
+    for by in (["platform"], ["platform", "category_name"]):
+        g = df.groupby(by, sort=False)["price"]
+        agg = pd.DataFrame({"n": g.count(), "mean": g.mean(), "m2": g.var(ddof=0) * g.count()})
+        for key, row in agg.iterrows():
+            k = (key, None) if len(by) == 1 else tuple(key)
+            out[k] = Moments(int(row["n"]), float(row["mean"]), float(row["m2"]))
+    return out
+
+
+def accumulate(moments: Dict[Key, Moments], batches: Iterable[pd.DataFrame]) -> Dict[Key, Moments]:
+    """Fold price batches (platform, category_name, price) into running moments."""
+    for df in batches:
+        for key, m in _batch_moments(df).items():
+            moments[key] = moments.get(key, Moments()).merge(m)
+    return moments
+
+
+def _moments_frame(moments: Dict[Key, Moments]) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {"platform": k[0], "category_name": k[1], "n": m.n, "mean": m.mean, "m2": m.m2, "stddev": m.stddev}
+            for k, m in moments.items()
+        ],
+        columns=["platform", "category_name", "n", "mean", "m2", "stddev"],
+    )
+
+
+def build_price_stats(db_path: Path) -> None:
+    """
+    Materialize price_moments, price_zscores and price_robust_zscores.
+
+    price_moments         per platform (category_name NULL) and per (platform, category):
+                          n / mean / m2 / stddev streamed in batches over the items,
+                          plus median and MAD for robust scores.
+    price_zscores         one row per item with restaurant name and city denormalized,
+                          z_score (platform), z_category and robust_z, sorted by
+                          abs_z DESC so threshold queries are top-k range scans.
+    price_robust_zscores  the same rows sorted by abs_robust_z DESC.
+
+    The items view is read once into a temp table: the moments stream over its
+    batches, median and MAD need all of it.
+    """
+    con = duckdb.connect(db_path.as_posix())
+
+    con.execute(f"CREATE OR REPLACE TEMP TABLE _items AS {_ITEMS_SQL};")
+    reader = con.execute("SELECT platform, category_name, price FROM _items;").to_arrow_reader(BATCH_ROWS)
+    moments = accumulate({}, (b.to_pandas() for b in reader))
+    stats = _moments_frame(moments)
+
+    con.execute(
+        """
+        CREATE OR REPLACE TEMP TABLE _medians AS
+        SELECT platform, category_name, MEDIAN(price) AS median
+        FROM _items
+        GROUP BY GROUPING SETS ((platform), (platform, category_name));
+        """
+    )
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE price_moments AS
+        WITH mad AS (
+          SELECT i.platform, NULL AS category_name, MEDIAN(ABS(i.price - m.median)) AS mad
+          FROM _items i
+          JOIN _medians m ON m.platform = i.platform AND m.category_name IS NULL
+          GROUP BY 1
+          UNION ALL
+          SELECT i.platform, i.category_name, MEDIAN(ABS(i.price - m.median)) AS mad
+          FROM _items i
+          JOIN _medians m ON m.platform = i.platform AND m.category_name = i.category_name
+          GROUP BY 1, 2
+        )
+        SELECT s.platform, s.category_name, CAST(s.n AS BIGINT) AS n, s.mean, s.m2, s.stddev,
+               m.median, d.mad
+        FROM stats s
+        LEFT JOIN _medians m
+          ON m.platform = s.platform AND m.category_name IS NOT DISTINCT FROM s.category_name
+        LEFT JOIN mad d
+          ON d.platform = s.platform AND d.category_name IS NOT DISTINCT FROM s.category_name
+        ORDER BY s.platform, s.category_name NULLS FIRST;
+        """
+    )
+    build_zscores(con)
+    con.close()
+
+
+def build_zscores(con: duckdb.DuckDBPyConnection) -> None:
+    """(Re)write price_zscores and price_robust_zscores from the current price_moments."""
+    con.execute(
+        f"""
+        CREATE OR REPLACE TABLE price_zscores AS
+        WITH z AS (
+          SELECT
+            i.platform,
+            COALESCE(NULLIF(i.category_name, ''), 'Unknown') AS category_name,
+            r.restaurant_name,
+            r.city,
+            i.item_name,
+            i.price,
+            (i.price - p.mean) / NULLIF(p.stddev, 0) AS z_score,
+            (i.price - c.mean) / NULLIF(c.stddev, 0) AS z_category,
+            {MAD_SCALE} * (i.price - p.median) / NULLIF(p.mad, 0) AS robust_z
+          FROM vw_menu_items_clean i
+          JOIN stg_restaurants r
+            ON r.platform = i.platform AND r.restaurant_key = i.restaurant_key
+          JOIN price_moments p
+            ON p.platform = i.platform AND p.category_name IS NULL
+          LEFT JOIN price_moments c
+            ON c.platform = i.platform
+           AND c.category_name = COALESCE(NULLIF(i.category_name, ''), 'Unknown')
+        )
+        SELECT *, ABS(z_score) AS abs_z, ABS(robust_z) AS abs_robust_z
+        FROM z
+        ORDER BY abs_z DESC NULLS LAST;
+        """
+    )
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE price_robust_zscores AS
+        SELECT * FROM price_zscores
+        ORDER BY abs_robust_z DESC NULLS LAST;
+        """
+    )
+
+
+def update_moments(con: duckdb.DuckDBPyConnection, delta: pd.DataFrame) -> None:
+    """
+    Fold a delta load (platform, category_name, price) into price_moments and
+    refresh the z-score tables. Mean and stddev are exact after the merge; median
+    and MAD are not streamable and keep their values until the next full build.
+    """
+    df = delta.assign(
+        category_name=delta["category_name"].fillna("").replace("", "Unknown"),
+        price=delta["price"].astype(float),
+    )
+    current = con.execute("SELECT platform, category_name, n, mean, m2 FROM price_moments;").df()
+    moments: Dict[Key, Moments] = {
+        (r.platform, None if pd.isna(r.category_name) else r.category_name): Moments(int(r.n), r.mean, r.m2)
+        for r in current.itertuples()
+    }
+    stats = _moments_frame(accumulate(moments, [df]))
+    con.execute(
+        """
+        CREATE OR REPLACE TABLE price_moments AS
+        SELECT s.platform, s.category_name, CAST(s.n AS BIGINT) AS n, s.mean, s.m2, s.stddev,
+               p.median, p.mad
+        FROM stats s
+        LEFT JOIN price_moments p
+          ON p.platform = s.platform AND p.category_name IS NOT DISTINCT FROM s.category_name
+        ORDER BY s.platform, s.category_name NULLS FIRST;
+        """
+    )
+    build_zscores(con)
+
+
+def top_outliers(
+    con: duckdb.DuckDBPyConnection,
+    z: float,
+    platform: Optional[str] = None,
+    robust: bool = False,
+    limit: int = 100,
+) -> pd.DataFrame:
+    """Items with |score| >= z, most extreme first (z_score or median/MAD robust_z)."""
+    score, table = ("abs_robust_z", "price_robust_zscores") if robust else ("abs_z", "price_zscores")
+    return query_df(
+        con,
+        f"""
+        SELECT platform, restaurant_name, city, category_name, item_name, price,
+               z_score, z_category, robust_z
+        FROM {table}
+        WHERE {score} >= $z
+          AND ($platform IS NULL OR platform = $platform)
+        ORDER BY {score} DESC
+        LIMIT {int(limit)}
+        """,
+        {"z": float(z), "platform": platform},
+    )
+
+
+def main() -> None:
+    db_path = Path("data/processed/analytics.duckdb")
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    build_price_stats(db_path)
+    print("Price statistics built: price_moments + price_zscores + price_robust_zscores")
+
+
+if __name__ == "__main__":
+    main()
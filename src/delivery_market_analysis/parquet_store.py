@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import duckdb
+import pandas as pd
+
+from delivery_market_analysis import profiling
+from delivery_market_analysis.ingest import PLATFORMS
+from delivery_market_analysis.semantic import SQL_PATH, _statement_name
+
+DB_PATH = Path("data/processed/analytics.duckdb")
+PARQUET_DIR = Path("data/processed/parquet")
+MANIFEST = "manifest.json"
+SEMANTIC_SQL = "semantic.sql"
+COMPRESSION = "ZSTD"
+ROW_GROUP_SIZE = 122_880  # DuckDB's own row group size: min/max statistics per group
+
+# stg_* relations written partitioned by platform and city. Items and
+# categories carry no city, so they are partitioned by their restaurant's;
+# the backend drops that column again to keep the original layout.
+PARTITIONED = {
+    "stg_restaurants": "platform, city, restaurant_key",
+    "stg_menu_items": "platform, city, restaurant_id",
+    "stg_restaurant_categories": "platform, city, restaurant_id",
+}
+PARTITION_BY = ("platform", "city")
+
+
+def _copy(con: duckdb.DuckDBPyConnection, select: str, target: Path, partition: bool = False) -> Dict[str, str]:
+    """
+    Write `select` to target; returns {column: type} for the columns whose
+    type Parquet cannot hold (e.g. BIT comes back as VARCHAR), so the
+    backend views can cast them back.
+    """
+    options = f"FORMAT PARQUET, COMPRESSION {COMPRESSION}, ROW_GROUP_SIZE {ROW_GROUP_SIZE}"
+    if partition:
+        options += f", PARTITION_BY ({', '.join(PARTITION_BY)})"
+    con.execute(f"COPY ({select}) TO '{target.as_posix()}' ({options});")
+    files = (target / "**" / "*.parquet") if partition else target
+    source = dict((r[0], r[1]) for r in con.execute(f"DESCRIBE {select}").fetchall())
+    written = dict((r[0], r[1]) for r in con.execute(f"DESCRIBE SELECT * FROM read_parquet('{files.as_posix()}')").fetchall())
+    return {c: t for c, t in source.items() if c in written and written[c] != t}
+
+
+def export_parquet(db_path: Path = DB_PATH, out_dir: Path = PARQUET_DIR, sql_path: Path = SQL_PATH) -> Dict[str, Any]:
+    """
+    Write db_path as a Parquet dataset in out_dir:
+
+    raw/platform=<p>/<table>.parquet               raw platform tables
+    stg/<view>/platform=<p>/city=<c>/*.parquet     stg_* materialized, Hive-partitioned
+    tables/<name>.parquet                          every other table (star schema, cube, ...)
+    semantic.sql, manifest.json                    what connect() needs to rebuild the views
+
+    Files are ZSTD-compressed and sorted within each partition so the
+    per-row-group min/max statistics prune well. The dataset is written
+    next to out_dir and swapped in when complete. Returns the manifest.
+    """
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    out_dir = Path(out_dir)
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    con = duckdb.connect(db_path.as_posix(), read_only=True)
+    con.execute("SET enable_progress_bar = false;")
+    manifest: Dict[str, Any] = {"raw": {}, "stg": {}, "tables": {}, "views": []}
+
+    for platform, table in con.execute(
+        "SELECT table_schema, table_name FROM information_schema.tables "
+        "WHERE table_schema IN ? AND table_type = 'BASE TABLE' ORDER BY 1, 2;",
+        [list(PLATFORMS)],
+    ).fetchall():
+        target = tmp / "raw" / f"platform={platform}" / f"{table}.parquet"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with profiling.profile("parquet", f"{platform}.{table}", con=con, allocators=False):
+            _copy(con, f'SELECT * FROM {platform}."{table}"', target)
+        manifest["raw"].setdefault(platform, []).append(table)
+
+    (tmp / "stg").mkdir()
+    con.execute(
+        """
+        CREATE TEMP TABLE _restaurant_city AS
+        SELECT restaurant_id, MIN(city) AS city FROM stg_restaurants GROUP BY 1;
+        """
+    )
+    for view, order in PARTITIONED.items():
+        columns = [r[0] for r in con.execute(f"DESCRIBE {view};").fetchall()]
+        select = (
+            f"SELECT * FROM {view} ORDER BY {order}"
+            if "city" in columns
+            else f"SELECT t.*, c.city FROM {view} t LEFT JOIN _restaurant_city c USING (restaurant_id) ORDER BY {order}"
+        )
+        with profiling.profile("parquet", view, con=con, allocators=False):
+            casts = _copy(con, select, tmp / "stg" / view, partition=True)
+        manifest["stg"][view] = {"columns": columns, "casts": casts}
+
+    (tmp / "tables").mkdir()
+    for (name,) in con.execute(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema = 'main' AND table_type = 'BASE TABLE' AND table_name != 'build_log' ORDER BY 1;"
+    ).fetchall():
+        with profiling.profile("parquet", name, con=con, allocators=False):
+            manifest["tables"][name] = _copy(con, f'SELECT * FROM "{name}"', tmp / "tables" / f"{name}.parquet")
+
+    # views created by build stages rather than the semantic SQL (e.g. matching)
+    semantic = Path(sql_path).read_text(encoding="utf-8")
+    own = {_statement_name(s.query) for s in duckdb.extract_statements(semantic)}
+    manifest["views"] = [
+        sql
+        for name, sql in con.execute(
+            "SELECT view_name, sql FROM duckdb_views() WHERE schema_name = 'main' AND NOT internal AND NOT temporary;"
+        ).fetchall()
+        if f"view {name}" not in own
+    ]
+    con.close()
+
+    (tmp / SEMANTIC_SQL).write_text(semantic, encoding="utf-8")
+    (tmp / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    old = out_dir.with_name(out_dir.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if out_dir.exists():
+        out_dir.rename(old)
+    tmp.rename(out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+def _columns(columns: List[str], casts: Dict[str, str]) -> str:
+    return ", ".join(f'CAST("{c}" AS {casts[c]}) AS "{c}"' if c in casts else f'"{c}"' for c in columns)
+
+
+def connect(parquet_dir: Path = PARQUET_DIR) -> duckdb.DuckDBPyConnection:
+    """
+    In-memory connection that reads the export in parquet_dir in place:
+    raw platform schemas, stg_* and every exported table are views over
+    the files, then the view and macro statements of the exported semantic
+    SQL (src_*, vw_*, cell macros) and the other exported views are run on
+    top, so pages and helpers see the same names as in the DuckDB file.
+    Filters on platform / city skip whole partitions, other filters skip
+    row groups by their statistics.
+    """
+    parquet_dir = Path(parquet_dir).resolve()
+    if not (parquet_dir / MANIFEST).exists():
+        raise FileNotFoundError(parquet_dir / MANIFEST)
+    manifest = json.loads((parquet_dir / MANIFEST).read_text(encoding="utf-8"))
+    con = duckdb.connect()
+
+    for platform, tables in manifest["raw"].items():
+        con.execute(f"CREATE SCHEMA {platform};")
+        for table in tables:
+            path = parquet_dir / "raw" / f"platform={platform}" / f"{table}.parquet"
+            # the platform is the schema here, not a column of the raw table
+            con.execute(
+                f"CREATE VIEW {platform}.\"{table}\" AS "
+                f"SELECT * FROM read_parquet('{path.as_posix()}', hive_partitioning = false);"
+            )
+    for name, casts in manifest["tables"].items():
+        path = (parquet_dir / "tables" / f"{name}.parquet").as_posix()
+        if casts:
+            columns = [r[0] for r in con.execute(f"DESCRIBE SELECT * FROM read_parquet('{path}')").fetchall()]
+            con.execute(f"CREATE VIEW \"{name}\" AS SELECT {_columns(columns, casts)} FROM read_parquet('{path}');")
+        else:
+            con.execute(f"CREATE VIEW \"{name}\" AS SELECT * FROM read_parquet('{path}');")
+    hive = ", ".join(f"'{c}': VARCHAR" for c in PARTITION_BY)
+    for view, spec in manifest["stg"].items():
+        files = (parquet_dir / "stg" / view / "**" / "*.parquet").as_posix()
+        con.execute(
+            f"""
+            CREATE VIEW {view} AS
+            SELECT {_columns(spec["columns"], spec["casts"])}
+            FROM read_parquet('{files}', hive_partitioning = true, hive_types = {{{hive}}});
+            """
+        )
+
+    defined = {f"view {v}" for v in manifest["stg"]}
+    for stmt in duckdb.extract_statements((parquet_dir / SEMANTIC_SQL).read_text(encoding="utf-8")):
+        name = _statement_name(stmt.query)
+        if name.split(" ")[0] in ("view", "macro") and name not in defined:
+            con.execute(stmt.query)
+    for sql in manifest["views"]:
+        con.execute(sql)
+    return con
+
+
+def _median_s(con: duckdb.DuckDBPyConnection, sql: str, params: Dict[str, Any], repeat: int) -> float:
+    con.execute(sql, params).fetchall()  # warm-up: file metadata and OS cache
+    times = []
+    for _ in range(max(1, repeat)):
+        t = time.perf_counter()
+        con.execute(sql, params).fetchall()
+        times.append(time.perf_counter() - t)
+    return statistics.median(times)
+
+
+def compare_scans(
+    db_path: Path = DB_PATH, parquet_dir: Path = PARQUET_DIR, city: str = "Brussel", repeat: int = 3
+) -> pd.DataFrame:
+    """
+    Median time of the same scans on the DuckDB file and on the Parquet
+    export: a full read of every column of each stg_* relation, and a
+    one-city aggregate (partition pruning on Parquet).
+    """
+    scans: Dict[str, Tuple[str, Dict[str, Any]]] = {
+        f"scan {v}": (f"SELECT COUNT(*), MAX(LENGTH(CAST(COLUMNS(*) AS VARCHAR))) FROM {v}", {}) for v in PARTITIONED
+    }
+    scans["city restaurants"] = (
+        "SELECT platform, COUNT(*), AVG(rating_value) FROM stg_restaurants WHERE city = $city GROUP BY 1",
+        {"city": city},
+    )
+    scans["city menu prices"] = (
+        "SELECT i.platform, COUNT(*), AVG(i.price) FROM stg_menu_items i "
+        "JOIN stg_restaurants r USING (restaurant_id) WHERE r.city = $city GROUP BY 1",
+        {"city": city},
+    )
+    native = duckdb.connect(db_path.as_posix(), read_only=True)
+    lake = connect(parquet_dir)
+    rows: List[Dict[str, Any]] = []
+    for name, (sql, params) in scans.items():
+        n, p = _median_s(native, sql, params, repeat), _median_s(lake, sql, params, repeat)
+        rows.append({"query": name, "duckdb_s": round(n, 4), "parquet_s": round(p, 4), "ratio": round(p / n, 2)})
+    native.close()
+    lake.close()
+    return pd.DataFrame(rows)
+
+
+def size_mb(path: Path) -> float:
+    """On-disk size of a file, or of all Parquet files under a directory."""
+    path = Path(path)
+    files = path.rglob("*.parquet") if path.is_dir() else [path]
+    return round(sum(f.stat().st_size for f in files) / 1e6, 1)
+
+
+def add_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--db", default=DB_PATH.as_posix())
+    p.add_argument("--out", default=PARQUET_DIR.as_posix(), help="Directory of the Parquet dataset")
+    p.add_argument("--sql", default=SQL_PATH.as_posix(), help="Semantic layer SQL copied next to the files")
+    p.add_argument("--compare", action="store_true", help="Then time the same scans on the DuckDB file and Parquet")
+    p.add_argument("--city", default="Brussel", help="--compare: city of the filtered queries")
+    profiling.add_argument(p)
+
+
+def run_from_args(args: argparse.Namespace) -> None:
+    profiling.enable_from_args(args)
+    t0 = time.perf_counter()
+    manifest = export_parquet(Path(args.db), Path(args.out), Path(args.sql))
+    print(
+        f"[parquet] {sum(map(len, manifest['raw'].values()))} raw, {len(manifest['stg'])} stg and "
+        f"{len(manifest['tables'])} other tables -> {args.out} in {time.perf_counter() - t0:.1f}s"
+    )
+    if args.compare:
+        print(f"[parquet] {size_mb(Path(args.out))} MB vs {size_mb(Path(args.db))} MB DuckDB file")
+        print(compare_scans(Path(args.db), Path(args.out), args.city).to_string(index=False))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.parquet_store")
+    add_arguments(p)
+    run_from_args(p.parse_args())
+
+
+if __name__ == "__main__":
+    main()
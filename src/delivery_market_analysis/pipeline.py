@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import duckdb
+import pandas as pd
+
+from delivery_market_analysis import profiling
+from delivery_market_analysis.chains import build_chains
+from delivery_market_analysis.coverage import build_coverage
+from delivery_market_analysis.cube import build_cube
+from delivery_market_analysis.diet import build_diet
+from delivery_market_analysis.geo import build_grid
+from delivery_market_analysis.hours import build_hours
+from delivery_market_analysis.ingest import ingest_raw
+from delivery_market_analysis.item_matching import MIN_SCORE, build_item_matches
+from delivery_market_analysis.matching import build_matches
+from delivery_market_analysis.outliers import build_price_stats
+from delivery_market_analysis.parquet_store import export_parquet
+from delivery_market_analysis.sampling import build_samples
+from delivery_market_analysis.semantic import INDEXES, SQL_PATH, apply_semantic, build_indexes
+from delivery_market_analysis.shards import build_shards
+from delivery_market_analysis.snapshots import take_snapshot
+
+DB_PATH = Path("data/processed/analytics.duckdb")
+RAW_DIR = Path("data/raw")
+JOBS = min(4, os.cpu_count() or 1)
+
+
+@dataclass(frozen=True)
+class BuildConfig:
+    db_path: Path = DB_PATH
+    raw_dir: Path = RAW_DIR
+    sql_path: Path = SQL_PATH
+    coverage_res_km: float = 0.5
+    item_min_score: int = MIN_SCORE
+    # worker processes for item matching; does not change the output, so not hashed
+    item_workers: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One build step. `run(config)` writes `outputs` into config.db_path.
+    The stage is skipped when its input hash is the one recorded for its last
+    successful run and all outputs still exist. The hash covers the source
+    of `run`'s module, `inputs(config)` (file contents, SQL text, parameters)
+    and the input hashes of `deps`, so a change upstream rebuilds downstream.
+    """
+    name: str
+    run: Callable[[BuildConfig], Any]
+    deps: Tuple[str, ...] = ()
+    inputs: Callable[[BuildConfig], Dict[str, Any]] = lambda config: {}
+    outputs: Tuple[str, ...] = ()
+    code: Tuple[Callable[..., Any], ...] = ()
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _raw_inputs(config: BuildConfig) -> Dict[str, Any]:
+    files = sorted(Path(config.raw_dir).glob("*.db"))
+    return {"raw": {f.name: _file_digest(f) for f in files}}
+
+
+def _stage(name: str, fn: Callable[[Path], Any], outputs: Sequence[str], deps: Sequence[str] = ("semantic",)) -> Stage:
+    return Stage(name, lambda config: fn(config.db_path), tuple(deps), outputs=tuple(outputs), code=(fn,))
+
+
+STAGES: Dict[str, Stage] = {
+    s.name: s
+    for s in [
+        Stage(
+            "ingest",
+            lambda config: ingest_raw(config.raw_dir, config.db_path),
+            inputs=_raw_inputs,
+            code=(ingest_raw,),
+        ),
+        Stage(
+            "semantic",
+            lambda config: apply_semantic(config.db_path, config.sql_path),
+            deps=("ingest",),
+            inputs=lambda config: {"sql": Path(config.sql_path).read_text(encoding="utf-8")},
+            outputs=("stg_restaurants", "stg_menu_items", "vw_menu_items_clean", "stg_restaurants_geo"),
+            code=(apply_semantic,),
+        ),
+        _stage("cube", build_cube, ("cube_restaurants", "cube_menu_items", "cube_price_sketch")),
+        _stage("grid", build_grid, ("geo_grid_agg",)),
+        Stage(
+            "coverage",
+            lambda config: build_coverage(config.db_path, res_km=config.coverage_res_km),
+            deps=("semantic",),
+            inputs=lambda config: {"res_km": config.coverage_res_km},
+            outputs=("coverage_grid", "coverage_meta"),
+            code=(build_coverage,),
+        ),
+        _stage("hours", build_hours, ("hours_weekly",)),
+        _stage("chains", build_chains, ("chain_brands", "chain_restaurants")),
+        _stage("outliers", build_price_stats, ("price_moments", "price_zscores", "price_robust_zscores")),
+        _stage("diet", build_diet, ("diet_terms", "diet_items", "diet_restaurants")),
+        _stage("samples", build_samples, ("sample_restaurants", "sample_menu_items")),
+        _stage("matching", build_matches, ("g1_restaurant_matches", "g1_canonical_restaurants")),
+        Stage(
+            "item_matching",
+            lambda config: build_item_matches(
+                config.db_path, min_score=config.item_min_score, workers=config.item_workers
+            ),
+            deps=("matching",),
+            inputs=lambda config: {"min_score": config.item_min_score},
+            outputs=("g1_item_matches",),
+            code=(build_item_matches,),
+        ),
+        _stage("indexes", build_indexes, tuple(name for name, _, _ in INDEXES)),
+    ]
+}
+
+
+def _order(stages: Mapping[str, Stage], targets: Sequence[str]) -> List[str]:
+    """Targets and everything they depend on, dependencies first (all stages when empty)."""
+    unknown = [t for t in targets if t not in stages]
+    if unknown:
+        raise ValueError(f"Unknown stage(s) {unknown}; stages: {list(stages)}")
+    order: List[str] = []
+
+    def visit(name: str, path: Tuple[str, ...]) -> None:
+        if name in path:
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + (name,))}")
+        if name in order:
+            return
+        for dep in stages[name].deps:
+            visit(dep, path + (name,))
+        order.append(name)
+
+    for name in targets or list(stages):
+        visit(name, ())
+    return order
+
+
+def input_hashes(config: BuildConfig, stages: Mapping[str, Stage], names: Sequence[str]) -> Dict[str, str]:
+    """Input hash of each stage in `names` (given in dependency order)."""
+    hashes: Dict[str, str] = {}
+    for name in names:
+        stage = stages[name]
+        code = {
+            f.__module__: _file_digest(Path(inspect.getsourcefile(f)))
+            for f in stage.code
+        }
+        payload = {
+            "stage": name,
+            "code": code,
+            "inputs": stage.inputs(config),
+            "deps": {d: hashes[d] for d in stage.deps},
+        }
+        hashes[name] = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    return hashes
+
+
+def _ensure_log(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS build_log (
+          run_id VARCHAR,
+          stage VARCHAR,
+          status VARCHAR,
+          input_hash VARCHAR,
+          started_at TIMESTAMP,
+          seconds DOUBLE,
+          error VARCHAR
+        );
+        """
+    )
+
+
+def _up_to_date(con: duckdb.DuckDBPyConnection, stage: Stage, input_hash: str) -> bool:
+    last = con.execute(
+        """
+        SELECT input_hash
+        FROM build_log
+        WHERE stage = ? AND status = 'built'
+        ORDER BY started_at DESC
+        LIMIT 1;
+        """,
+        [stage.name],
+    ).fetchone()
+    if last is None or last[0] != input_hash:
+        return False
+    if not stage.outputs:
+        return True
+    # outputs are tables or indexes; recreating a table drops its indexes
+    found = con.execute(
+        """
+        SELECT COUNT(DISTINCT name) FROM (
+          SELECT table_name AS name FROM information_schema.tables
+          UNION ALL
+          SELECT index_name FROM duckdb_indexes()
+        )
+        WHERE name IN ?;
+        """,
+        [list(stage.outputs)],
+    ).fetchone()[0]
+    return found == len(stage.outputs)
+
+
+@dataclass
+class StageResult:
+    stage: str
+    status: str  # built | skipped | failed | blocked | would build
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def build(
+    config: BuildConfig = BuildConfig(),
+    targets: Sequence[str] = (),
+    jobs: int = JOBS,
+    force: Sequence[str] = (),
+    skip: Sequence[str] = (),
+    stages: Mapping[str, Stage] = STAGES,
+    dry_run: bool = False,
+) -> pd.DataFrame:
+    """
+    Run `targets` and their dependencies (every stage when empty) as a DAG:
+    up-to-date stages are skipped, stages whose dependencies are done run on
+    up to `jobs` threads, and a failed stage blocks only its dependents.
+    `force` lists stages to rebuild regardless of their hash ("all" for every
+    stage); `skip` lists stages taken as done without running them (e.g. ingest
+    for a database built elsewhere). Every stage's status and wall time is appended to build_log in
+    the database; returns them as a DataFrame in dependency order.
+    """
+    order = _order(stages, targets)
+    hashes = input_hashes(config, stages, order)
+    forced = set(order) if "all" in force else set(force)
+
+    config.db_path.parent.mkdir(parents=True, exist_ok=True)
+    # One connection stays open for the whole build: stages open their own
+    # connections to the same file from worker threads, and DuckDB must not
+    # tear the database instance down and re-create it between them.
+    con = duckdb.connect(config.db_path.as_posix())
+    _ensure_log(con)
+
+    run_id = uuid.uuid4().hex[:12]
+    results: Dict[str, StageResult] = {}
+    # a stage rebuilt in this run invalidates its dependents even if their hash
+    # matches (their hash covers inputs, not the rebuilt tables themselves)
+    rebuilt: set = set()
+
+    def record(name: str, status: str, started: float, seconds: float, error: Optional[str] = None) -> None:
+        results[name] = StageResult(name, status, seconds, error)
+        if not dry_run:
+            con.execute(
+                "INSERT INTO build_log VALUES (?, ?, ?, ?, to_timestamp(?), ?, ?);",
+                [run_id, name, status, hashes[name], started, seconds, error],
+            )
+
+    def run(name: str) -> Tuple[float, float]:
+        started = time.time()
+        t0 = time.perf_counter()
+        with profiling.profile("stage", name):
+            stages[name].run(config)
+        return started, time.perf_counter() - t0
+
+    pending = list(order)
+    running: Dict[Future, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="dma-build") as pool:
+        while pending or running:
+            for name in list(pending):
+                deps = stages[name].deps
+                if any(results.get(d) and results[d].status in ("failed", "blocked") for d in deps):
+                    pending.remove(name)
+                    record(name, "blocked", time.time(), 0.0, "dependency failed")
+                    continue
+                if not all(d in results for d in deps):
+                    continue
+                pending.remove(name)
+                if name in skip:
+                    results[name] = StageResult(name, "skipped")
+                    continue
+                stale = (
+                    name in forced
+                    or any(d in rebuilt for d in deps)
+                    or not _up_to_date(con, stages[name], hashes[name])
+                )
+                if not stale:
+                    record(name, "skipped", time.time(), 0.0)
+                elif dry_run:
+                    rebuilt.add(name)
+                    results[name] = StageResult(name, "would build")
+                else:
+                    running[pool.submit(run, name)] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    started, seconds = future.result()
+                except Exception as e:
+                    record(name, "failed", time.time(), 0.0, f"{type(e).__name__}: {e}")
+                else:
+                    rebuilt.add(name)
+                    record(name, "built", started, seconds)
+    con.close()
+
+    return pd.DataFrame(
+        [
+            {
+                "stage": name,
+                "status": results[name].status,
+                "seconds": round(results[name].seconds, 3),
+                "error": results[name].error,
+            }
+            for name in order
+        ]
+    )
+
+
+def timings(db_path: Path = DB_PATH, runs: int = 5) -> pd.DataFrame:
+    """Stage timings of the last `runs` builds recorded in db_path."""
+    con = duckdb.connect(db_path.as_posix(), read_only=True)
+    df = con.execute(
+        """
+        WITH recent AS (
+          SELECT run_id, MIN(started_at) AS run_started
+          FROM build_log
+          GROUP BY 1
+          ORDER BY 2 DESC
+          LIMIT $runs
+        )
+        SELECT r.run_started, b.stage, b.status, b.seconds
+        FROM build_log b
+        JOIN recent r USING (run_id)
+        ORDER BY r.run_started DESC, b.started_at;
+        """,
+        {"runs": int(runs)},
+    ).df()
+    con.close()
+    return df
+
+
+def add_arguments(p: argparse.ArgumentParser, targets: bool = True) -> None:
+    if targets:
+        p.add_argument(
+            "stages", nargs="*", help=f"Stages to build with their dependencies (default: all): {', '.join(STAGES)}"
+        )
+    p.add_argument("--db", default=DB_PATH.as_posix())
+    p.add_argument("--raw", default=RAW_DIR.as_posix(), help="Directory with the platform *.db files")
+    p.add_argument("--sql", default=SQL_PATH.as_posix(), help="Semantic layer SQL")
+    p.add_argument("--jobs", "-j", type=int, default=JOBS, help="Stages run in parallel")
+    p.add_argument("--force", action="append", default=[], metavar="STAGE", help="Rebuild even if up to date ('all')")
+    p.add_argument("--skip", action="append", default=[], metavar="STAGE", help="Take as done without running")
+    p.add_argument("--dry-run", action="store_true", help="Show what would be built")
+    p.add_argument("--history", type=int, metavar="RUNS", help="Show stage timings of the last RUNS builds and exit")
+    p.add_argument("--coverage-res-km", type=float, default=BuildConfig.coverage_res_km)
+    p.add_argument("--min-score", type=int, default=MIN_SCORE, help="Item matching minimum token-sort ratio")
+    p.add_argument("--workers", type=int, default=None, help="Item matching worker processes")
+    p.add_argument(
+        "--snapshot", nargs="?", const="", metavar="LABEL", help="Then record the raw tables as a new snapshot"
+    )
+    p.add_argument("--shards", metavar="DIR", help="Then split the stg_* relations into region shards in DIR")
+    p.add_argument("--parquet", metavar="DIR", help="Then export raw and stg_* tables as partitioned Parquet to DIR")
+    profiling.add_argument(p)
+
+
+def run_from_args(args: argparse.Namespace, targets: Sequence[str] = ()) -> int:
+    profiling.enable_from_args(args)
+    config = BuildConfig(
+        db_path=Path(args.db),
+        raw_dir=Path(args.raw),
+        sql_path=Path(args.sql),
+        coverage_res_km=args.coverage_res_km,
+        item_min_score=args.min_score,
+        item_workers=args.workers,
+    )
+    if args.history:
+        print(timings(config.db_path, args.history).to_string(index=False))
+        return 0
+    t0 = time.perf_counter()
+    targets = list(targets) or getattr(args, "stages", [])
+    report = build(config, targets, jobs=args.jobs, force=args.force, skip=args.skip, dry_run=args.dry_run)
+    print(report.to_string(index=False))
+    print(f"Total {time.perf_counter() - t0:.1f}s")
+    if report["status"].isin(["failed", "blocked"]).any():
+        return 1
+    if getattr(args, "snapshot", None) is not None and not args.dry_run:
+        print(take_snapshot(config.db_path, args.snapshot or None, config.sql_path))
+    if getattr(args, "shards", None) and not args.dry_run:
+        print(build_shards(config.db_path, Path(args.shards), sql_path=config.sql_path).to_string(index=False))
+    if getattr(args, "parquet", None) and not args.dry_run:
+        export_parquet(config.db_path, Path(args.parquet), config.sql_path)
+        print(f"[parquet] exported to {args.parquet}")
+    return 0
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.pipeline")
+    add_arguments(p)
+    raise SystemExit(run_from_args(p.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
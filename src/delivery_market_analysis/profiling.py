@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import duckdb
+import pandas as pd
+
+# DMA_PROFILE=report.jsonl (or 1 for profile.jsonl) turns profiling on for the whole process;
+# DMA_PROFILE_TRACEMALLOC=0 keeps it off the Python heap (no allocator tracing, less overhead)
+ENV = "DMA_PROFILE"
+TRACEMALLOC_ENV = "DMA_PROFILE_TRACEMALLOC"
+DEFAULT_REPORT = Path("profile.jsonl")
+TOP_ALLOCATORS = 10
+TOP_OPERATORS = 5
+_TRUE = {"1", "true", "yes", "on"}
+
+_lock = threading.Lock()
+_local = threading.local()
+_state: Dict[str, Any] = {"report": None, "run": None, "t0": 0.0, "open": 0}
+
+
+def environment() -> Dict[str, Any]:
+    """Machine, interpreter, library versions and git commit of a run."""
+    import numpy
+    import pyarrow
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "versions": {
+            "duckdb": duckdb.__version__,
+            "pandas": pd.__version__,
+            "numpy": numpy.__version__,
+            "pyarrow": pyarrow.__version__,
+        },
+    }
+
+
+def enable(report: Optional[Path] = None) -> Path:
+    """
+    Start profiling: blocks are appended as JSON lines to `report` (truncated;
+    default profile.jsonl), after one "run" line with environment metadata.
+    Starts tracemalloc unless $DMA_PROFILE_TRACEMALLOC is 0; tracing every
+    allocation slows Python-heavy code (pandas object columns) down 2-4x.
+    """
+    path = Path(report or DEFAULT_REPORT)
+    with _lock:
+        if _state["report"] == path:
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _state.update(report=path, run=uuid.uuid4().hex[:12], t0=time.perf_counter())
+        header = {"type": "run", "run": _state["run"], "argv": sys.argv, **environment()}
+        path.write_text(json.dumps(header) + "\n", encoding="utf-8")
+    if not tracemalloc.is_tracing() and os.environ.get(TRACEMALLOC_ENV, "1").lower() not in {"0", "false", "no", "off"}:
+        tracemalloc.start()
+    return path
+
+
+def disable() -> None:
+    with _lock:
+        _state.update(report=None, run=None)
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def enabled() -> bool:
+    if _state["report"] is None:
+        value = os.environ.get(ENV, "").strip()
+        if value and value.lower() not in {"0", "false", "no", "off"}:
+            enable(DEFAULT_REPORT if value.lower() in _TRUE else Path(value))
+    return _state["report"] is not None
+
+
+def _status_mb(field: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if field == "VmHWM":
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    # Linux: writing 5 to clear_refs resets VmHWM to the current RSS
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # leave out the profiler's own allocations
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    )
+
+
+def _top_allocators(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+    stats = after.compare_to(before, "lineno")
+    stats = [s for s in stats if s.size_diff > 0][:TOP_ALLOCATORS]
+    return [
+        {
+            "where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+            "size_mb": round(s.size_diff / 2**20, 3),
+            "count": s.count_diff,
+        }
+        for s in stats
+    ]
+
+
+def duckdb_profile(con: duckdb.DuckDBPyConnection) -> Optional[Dict[str, Any]]:
+    """Summary of DuckDB's profile of the last query on `con` (see watch): latency, rows, slowest operators."""
+    try:
+        info = json.loads(con.get_profiling_information(format="json"))
+    except (duckdb.Error, ValueError):
+        return None
+    ops: List[Dict[str, Any]] = []
+
+    def walk(node: Dict[str, Any]) -> None:
+        for child in node.get("children", []):
+            ops.append(
+                {
+                    "operator": child.get("operator_type") or child.get("operator_name"),
+                    "seconds": child.get("operator_timing", 0.0),
+                    "rows": child.get("operator_cardinality"),
+                }
+            )
+            walk(child)
+
+    walk(info)
+    return {
+        "query": (info.get("query_name") or "")[:500],
+        "latency_s": info.get("latency"),
+        "cpu_s": info.get("cpu_time"),
+        "rows_scanned": info.get("cumulative_rows_scanned"),
+        "rows_returned": info.get("rows_returned"),
+        "peak_buffer_mb": (info.get("system_peak_buffer_memory") or 0) / 2**20,
+        "operators": sorted(ops, key=lambda o: -(o["seconds"] or 0))[:TOP_OPERATORS],
+    }
+
+
+def watch(con: duckdb.DuckDBPyConnection) -> None:
+    """Turn on DuckDB's profiler for `con` (no output file; read with duckdb_profile)."""
+    con.execute("PRAGMA enable_profiling='no_output';")
+
+
+def _write(record: Dict[str, Any]) -> None:
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        if _state["report"] is not None:
+            with open(_state["report"], "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+@contextlib.contextmanager
+def profile(
+    kind: str,
+    name: str,
+    con: Optional[duckdb.DuckDBPyConnection] = None,
+    allocators: bool = True,
+    **attrs: Any,
+) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Record wall and CPU time, peak RSS, the peak of the Python heap and (with
+    `allocators`) the top allocating source lines of the block, plus DuckDB's
+    profile of the last query on `con`. Yields the record so the block can add
+    fields (e.g. rows), or None when profiling is off.
+
+    CPU time is the whole process (DuckDB's threads included). The peak RSS of
+    a block is exact when no other block runs in another thread; otherwise it
+    is the process peak since the outermost block started (peak_exact false).
+    """
+    if not enabled():
+        yield None
+        return
+
+    t_enter, c_enter = time.perf_counter(), time.process_time()
+    stack: List[Dict[str, Any]] = _local.__dict__.setdefault("stack", [])
+    with _lock:
+        exact = _state["open"] == len(stack)
+        _state["open"] += 1
+    if exact:
+        _reset_peak_rss()
+        tracemalloc.reset_peak()
+    if con is not None:
+        watch(con)
+    before = _snapshot() if allocators and tracemalloc.is_tracing() else None
+    traced_before = tracemalloc.get_traced_memory()[0]
+    record: Dict[str, Any] = {
+        "type": "block",
+        "run": _state["run"],
+        "kind": kind,
+        "name": name,
+        "parent": stack[-1]["name"] if stack else None,
+        "thread": threading.current_thread().name,
+        "start_s": round(time.perf_counter() - _state["t0"], 6),
+        **attrs,
+    }
+    frame = {"name": f"{kind}:{name}", "rss": 0.0, "py": 0, "wall": 0.0, "cpu": 0.0}
+    stack.append(frame)
+    wall, cpu = time.perf_counter(), time.process_time()
+    overhead = (wall - t_enter, cpu - c_enter)
+    error = None
+    try:
+        yield record
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        # nested blocks' own bookkeeping (snapshots, DuckDB profiles) is not this block's time
+        wall = time.perf_counter() - wall - frame["wall"]
+        cpu = time.process_time() - cpu - frame["cpu"]
+        t_exit, c_exit = time.perf_counter(), time.process_time()
+        stack.pop()
+        traced, py_peak = tracemalloc.get_traced_memory()
+        rss_peak = max(_status_mb("VmHWM") or 0.0, frame["rss"])
+        py_peak = max(py_peak, frame["py"])
+        if stack:
+            # a nested block reset the peaks: hand them up to the enclosing block
+            stack[-1]["rss"] = max(stack[-1]["rss"], rss_peak)
+            stack[-1]["py"] = max(stack[-1]["py"], py_peak)
+        with _lock:
+            _state["open"] -= 1
+        record.update(
+            wall_s=round(wall, 6),
+            cpu_s=round(cpu, 6),
+            peak_rss_mb=round(rss_peak, 2),
+            peak_exact=exact,
+            rss_mb=round(_status_mb("VmRSS") or 0.0, 2),
+            py_peak_mb=round(py_peak / 2**20, 3),
+            py_net_mb=round((traced - traced_before) / 2**20, 3),
+            error=error,
+        )
+        if before is not None:
+            record["top_allocators"] = _top_allocators(before, _snapshot())
+        if con is not None:
+            record["duckdb"] = duckdb_profile(con)
+        _write(record)
+        if stack:
+            stack[-1]["wall"] += overhead[0] + frame["wall"] + time.perf_counter() - t_exit
+            stack[-1]["cpu"] += overhead[1] + frame["cpu"] + time.process_time() - c_exit
+
+
+def caller(skip: tuple = ("profiling.py", "queries.py", "contextlib.py")) -> str:
+    """Name of the first function on the stack outside `skip`, to label query blocks."""
+    f = sys._getframe(1)
+    while f is not None and os.path.basename(f.f_code.co_filename) in skip:
+        f = f.f_back
+    if f is None:
+        return "?"
+    return f"{Path(f.f_code.co_filename).stem}.{f.f_code.co_name}"
+
+
+def load(path: Path) -> pd.DataFrame:
+    """The block records of a report, one row each."""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec.get("type") == "block":
+                rows.append(rec)
+    return pd.DataFrame(rows)
+
+
+def summary(blocks: pd.DataFrame) -> pd.DataFrame:
+    """Per (kind, name): calls, total wall and CPU seconds, highest peak RSS and Python heap peak."""
+    if blocks.empty:
+        return pd.DataFrame(columns=["kind", "name", "calls", "wall_s", "cpu_s", "peak_rss_mb", "py_peak_mb"])
+    return (
+        blocks.groupby(["kind", "name"], sort=False)
+        .agg(
+            calls=("wall_s", "size"),
+            wall_s=("wall_s", "sum"),
+            cpu_s=("cpu_s", "sum"),
+            peak_rss_mb=("peak_rss_mb", "max"),
+            py_peak_mb=("py_peak_mb", "max"),
+        )
+        .reset_index()
+    )
+
+
+def diff(baseline: pd.DataFrame, current: pd.DataFrame) -> pd.DataFrame:
+    """summary() of two reports side by side with current - baseline deltas, largest wall-time change first."""
+    cols = ["wall_s", "cpu_s", "peak_rss_mb", "py_peak_mb"]
+    out = summary(baseline).merge(summary(current), on=["kind", "name"], how="outer", suffixes=("_base", ""))
+    for c in cols:
+        out[f"{c}_delta"] = out[c] - out[f"{c}_base"]
+    out = out[
+        ["kind", "name", "calls", "wall_s_base", "wall_s", "wall_s_delta", "cpu_s_delta"]
+        + ["peak_rss_mb_base", "peak_rss_mb", "peak_rss_mb_delta", "py_peak_mb_delta"]
+    ]
+    return out.sort_values("wall_s_delta", key=lambda s: -s.abs().fillna(float("inf"))).reset_index(drop=True)
+
+
+def add_argument(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--profile",
+        nargs="?",
+        const=DEFAULT_REPORT.as_posix(),
+        metavar="REPORT",
+        help=f"Profile stages and queries into a JSON lines report (default {DEFAULT_REPORT}); also ${ENV}",
+    )
+
+
+def enable_from_args(args: argparse.Namespace) -> None:
+    if getattr(args, "profile", None):
+        print(f"[profile] writing {enable(Path(args.profile))}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.profiling")
+    p.add_argument("report", help="Report written by --profile / DMA_PROFILE")
+    p.add_argument("--baseline", help="Earlier report to diff against")
+    p.add_argument("--blocks", action="store_true", help="List every block instead of the per-name summary")
+    args = p.parse_args()
+
+    current = load(Path(args.report))
+    if args.blocks:
+        table = current.drop(columns=["type", "run"], errors="ignore")
+    elif args.baseline:
+        table = diff(load(Path(args.baseline)), current)
+    else:
+        table = summary(current).sort_values("wall_s", ascending=False)
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.max_colwidth", 60):
+        print(table.to_string(index=False, float_format=lambda v: f"{v:,.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,35 @@
 from __future__ import annotations
 
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import duckdb
 import pandas as pd
 
+from delivery_market_analysis import parquet_store, profiling
+
+DB_PATH = Path("data/processed/analytics.duckdb")
+# "duckdb": the analytics.duckdb file; "parquet": the Parquet export in
+# DMA_PARQUET_DIR (see parquet_store.export_parquet)
+BACKENDS = ("duckdb", "parquet")
+BACKEND = os.environ.get("DMA_BACKEND", "duckdb")
+PARQUET_DIR = Path(os.environ.get("DMA_PARQUET_DIR", "data/processed/parquet"))
+QUERY_WORKERS = int(os.environ.get("DMA_QUERY_WORKERS", "4"))
+PAGE_SIZE = 200
+EXPORT_FORMATS = {".parquet": "FORMAT PARQUET", ".csv": "FORMAT CSV, HEADER"}
+
+# A query for submit_all/run_all: (sql, params) / sql, or (fn, *args) where
+# fn is called with a cursor first, like every helper in this package.
+Call = Union[str, Sequence[Any]]
+
+_connections: Dict[str, duckdb.DuckDBPyConnection] = {}
+_pool: Optional[ThreadPoolExecutor] = None
+_lock = Lock()
+
 
 @dataclass(frozen=True)
 class Filters:
@@ -32,6 +56,351 @@ def _where(filters: Filters) -> tuple[str, Dict[str, Any]]:
 
 
 def query_df(con: duckdb.DuckDBPyConnection, sql: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    if profiling.enabled():
+        with profiling.profile("query", profiling.caller(), con=con, allocators=False) as rec:
+            df = con.execute(sql, params or {}).df()
+            rec["rows"] = len(df)
+            return df
     if params:
         return con.execute(sql, params).df()
     return con.execute(sql).df()
+
+
+def has_tables(con: duckdb.DuckDBPyConnection, *names: str) -> bool:
+    found = con.execute(
+        "SELECT COUNT(DISTINCT table_name) FROM information_schema.tables WHERE table_name IN ?;",
+        [list(names)],
+    ).fetchone()[0]
+    return found == len(names)
+
+
+def connect(db_path: Path = DB_PATH, backend: Optional[str] = None) -> duckdb.DuckDBPyConnection:
+    """
+    Read-only connection to db_path, opened once and shared by the whole
+    process. With backend "parquet" (default: DMA_BACKEND) it reads the
+    Parquet export in PARQUET_DIR instead, through the same view names.
+
+    The connection is not safe to use from several threads at once: callers
+    that can run concurrently (Streamlit sessions, server workers) must take
+    their own `connect().cursor()` and query through it.
+    """
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; one of {BACKENDS}")
+    source = PARQUET_DIR if backend == "parquet" else Path(db_path)
+    key = f"{backend}:{source.resolve().as_posix()}"
+    with _lock:
+        if key not in _connections:
+            if not source.exists():
+                raise FileNotFoundError(source)
+            if backend == "parquet":
+                _connections[key] = parquet_store.connect(source)
+            else:
+                _connections[key] = duckdb.connect(source.resolve().as_posix(), read_only=True)
+        return _connections[key]
+
+
+def _query_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="dma-query")
+        return _pool
+
+
+def _run_on(cursor: duckdb.DuckDBPyConnection, fn: Callable[..., Any], args: Sequence[Any]) -> Any:
+    try:
+        return fn(cursor, *args)
+    finally:
+        cursor.close()
+
+
+def submit(con: duckdb.DuckDBPyConnection, call: Call) -> Future:
+    """
+    Start one query on the shared thread pool with its own cursor of `con`.
+    `call` is SQL (optionally (sql, params), run through query_df) or
+    (fn, *args), run as fn(cursor, *args).
+    """
+    if isinstance(call, str):
+        call = (call,)
+    fn, *args = call
+    if isinstance(fn, str):
+        fn, args = query_df, [fn, *args]
+    # cursors are created here, on the caller's thread, and used only by the worker
+    return _query_pool().submit(_run_on, con.cursor(), fn, args)
+
+
+def submit_all(con: duckdb.DuckDBPyConnection, calls: Sequence[Call]) -> List[Future]:
+    """Start independent queries concurrently; futures come back in call order."""
+    return [submit(con, c) for c in calls]
+
+
+def run_all(con: duckdb.DuckDBPyConnection, calls: Sequence[Call]) -> List[Any]:
+    """Run independent queries concurrently and return their results in call order."""
+    return [f.result() for f in submit_all(con, calls)]
+
+
+def _group(by: Sequence[str]) -> tuple[str, str]:
+    if not by:
+        return "", ""
+    cols = ", ".join(by)
+    return cols + ", ", cols + ", "
+
+
+def histogram(
+    con: duckdb.DuckDBPyConnection,
+    relation: str,
+    column: str,
+    *,
+    bins: int = 50,
+    bin_width: Optional[float] = None,
+    edges: Optional[Sequence[float]] = None,
+    lo: Optional[float] = None,
+    hi: Optional[float] = None,
+    filters: Filters = Filters(),
+    by: Sequence[str] = (),
+) -> pd.DataFrame:
+    """
+    Histogram of `relation.column` computed inside DuckDB; only the bins come back.
+
+    Fixed-width bins span [lo, hi] (defaults: min/max of the filtered rows) using
+    either `bins` or `bin_width`. With `edges`, bins are right-closed like pd.cut
+    and values outside (edges[0], edges[-1]] are dropped.
+    Returns one row per non-empty bin: [by...], bin, bin_lo, bin_hi, count.
+    """
+    where, params = _where(filters)
+    where = f"{where} AND" if where else "WHERE"
+    sel, grp = _group(by)
+
+    if edges is not None:
+        e = [float(x) for x in edges]
+        if len(e) < 2 or e != sorted(e):
+            raise ValueError("edges must be increasing and contain at least two values")
+        params["edges"] = e
+        # a flat CASE is much cheaper per row than a list lambda
+        case = " ".join(f"WHEN {column} <= {hi!r} THEN {i}" for i, hi in enumerate(e[1:], start=1))
+        return query_df(
+            con,
+            f"""
+            WITH binned AS (
+              SELECT {sel} CASE {case} END AS bin
+              FROM {relation}
+              {where} {column} > {e[0]!r} AND {column} <= {e[-1]!r}
+            )
+            SELECT {sel} bin, $edges[bin] AS bin_lo, $edges[bin + 1] AS bin_hi, COUNT(*) AS count
+            FROM binned
+            GROUP BY {grp} bin
+            ORDER BY {grp} bin
+            """,
+            params,
+        )
+
+    params["lo"] = lo
+    params["hi"] = hi
+    params["bins"] = int(bins)
+    params["bin_width"] = bin_width
+    return query_df(
+        con,
+        f"""
+        WITH src AS (
+          SELECT {sel} {column} AS x
+          FROM {relation}
+          {where} {column} IS NOT NULL
+            AND ($lo IS NULL OR {column} >= $lo)
+            AND ($hi IS NULL OR {column} <= $hi)
+        ),
+        rng AS (
+          SELECT
+            -- free-width bins are aligned to multiples of the width
+            COALESCE($lo, FLOOR(MIN(x) / $bin_width) * $bin_width, MIN(x)) AS lo,
+            COALESCE($bin_width, NULLIF(COALESCE($hi, MAX(x)) - COALESCE($lo, MIN(x)), 0) / $bins, 1.0) AS w,
+            COALESCE($bin_width, 0) > 0 AS free_bins
+          FROM src
+        ),
+        binned AS (
+          SELECT
+            {sel}
+            CASE
+              WHEN rng.free_bins THEN FLOOR((x - rng.lo) / rng.w)
+              ELSE LEAST(FLOOR((x - rng.lo) / rng.w), $bins - 1)
+            END::BIGINT AS bin,
+            rng.lo,
+            rng.w
+          FROM src, rng
+        )
+        SELECT
+          {sel}
+          bin,
+          ANY_VALUE(lo) + bin * ANY_VALUE(w) AS bin_lo,
+          ANY_VALUE(lo) + (bin + 1) * ANY_VALUE(w) AS bin_hi,
+          COUNT(*) AS count
+        FROM binned
+        GROUP BY {grp} bin
+        ORDER BY {grp} bin
+        """,
+        params,
+    )
+
+
+def price_bands(
+    con: duckdb.DuckDBPyConnection,
+    edges: Sequence[float] = (0, 5, 10, 15, 20, 30, 50, 100, 500),
+    filters: Filters = Filters(),
+    by: Sequence[str] = ("platform",),
+    relation: str = "vw_menu_items_clean",
+) -> pd.DataFrame:
+    """Item counts per right-closed price band, labelled like pd.cut but with compact edges ("(5, 10]", "(7.5, 10]")."""
+    df = histogram(con, relation, "price", edges=edges, filters=filters, by=by)
+    labels = [f"({lo:g}, {hi:g}]" for lo, hi in zip(df["bin_lo"], df["bin_hi"])]
+    df.insert(len(by), "price_band", labels)
+    return df.drop(columns=["bin", "bin_lo", "bin_hi"])
+
+
+def summary_stats(
+    con: duckdb.DuckDBPyConnection,
+    relation: str,
+    column: str,
+    filters: Filters = Filters(),
+    by: Sequence[str] = (),
+) -> pd.DataFrame:
+    """Count, mean, median, min and max of `relation.column`, computed in DuckDB."""
+    where, params = _where(filters)
+    sel, grp = _group(by)
+    group_by = f"GROUP BY {grp.rstrip(', ')}" if by else ""
+    return query_df(
+        con,
+        f"""
+        SELECT
+          {sel}
+          COUNT({column}) AS n,
+          AVG({column}) AS mean,
+          MEDIAN({column}) AS median,
+          MIN({column}) AS min,
+          MAX({column}) AS max
+        FROM {relation}
+        {where}
+        {group_by}
+        """,
+        params,
+    )
+
+
+@dataclass(frozen=True)
+class Page:
+    rows: pd.DataFrame
+    # sort-key values of the last row: pass as `after` for the next page (None on the last page)
+    after: Optional[Tuple[Any, ...]]
+
+
+def _sort_keys(order: Sequence[str]) -> List[Tuple[str, bool]]:
+    keys = []
+    for term in order:
+        col, _, direction = term.strip().partition(" ")
+        direction = direction.strip().upper() or "ASC"
+        if direction not in ("ASC", "DESC"):
+            raise ValueError(f"Bad sort key {term!r}; expected 'column [ASC|DESC]'")
+        keys.append((col, direction == "DESC"))
+    if not keys:
+        raise ValueError("order must name at least one column")
+    return keys
+
+
+def _scalar(value: Any) -> Any:
+    """Plain Python value of a DataFrame cell, usable as a query parameter."""
+    if value is None or (not isinstance(value, (str, bytes)) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value.item() if hasattr(value, "item") else value
+
+
+def _order_by(keys: Sequence[Tuple[str, bool]]) -> str:
+    return ", ".join(f'"{c}" {"DESC" if desc else "ASC"} NULLS LAST' for c, desc in keys)
+
+
+def order_sql(order: Sequence[str]) -> str:
+    """ORDER BY list for sort keys like ("is_open DESC", "restaurant_key"), NULLs last."""
+    return _order_by(_sort_keys(order))
+
+
+def page(
+    con: duckdb.DuckDBPyConnection,
+    sql: str,
+    order: Sequence[str],
+    params: Optional[Dict[str, Any]] = None,
+    after: Optional[Sequence[Any]] = None,
+    size: int = PAGE_SIZE,
+) -> Page:
+    """
+    One page of `sql` with keyset (seek) pagination: the rows sorted by
+    `order` that come after the sort-key values `after` (first page: None).
+
+    `order` names output columns of `sql` ("matched_items DESC", "restaurant_key");
+    together they must identify a row, so end it with a unique key. NULLs sort
+    last. Each page costs a filtered top-N over the query instead of an
+    OFFSET scan, and only `size` rows (plus one to detect the end) come back.
+    """
+    keys = _sort_keys(order)
+    params = dict(params or {})
+    seek = "TRUE"
+    if after is not None:
+        if len(after) != len(keys):
+            raise ValueError(f"after has {len(after)} values for {len(keys)} sort keys")
+        terms = []
+        for i, (col, desc) in enumerate(keys):
+            params[f"_after_{i}"] = after[i]
+            # strictly after a value under NULLS LAST: a larger (smaller) value or NULL
+            past = (
+                f'CASE WHEN $_after_{i} IS NULL THEN FALSE '
+                f'ELSE ("{col}" {"<" if desc else ">"} $_after_{i} OR "{col}" IS NULL) END'
+            )
+            ties = [f'"{c}" IS NOT DISTINCT FROM $_after_{j}' for j, (c, _) in enumerate(keys[:i])]
+            terms.append("(" + " AND ".join([*ties, past]) + ")")
+        seek = " OR ".join(terms)
+
+    rows = query_df(
+        con,
+        f"""
+        SELECT *
+        FROM ({sql.strip().rstrip(";")}) AS q
+        WHERE {seek}
+        ORDER BY {_order_by(keys)}
+        LIMIT {int(size) + 1}
+        """,
+        params,
+    )
+    if len(rows) <= size:
+        return Page(rows.reset_index(drop=True), None)
+    rows = rows.iloc[:size]
+    last = rows.iloc[-1]
+    return Page(rows, tuple(_scalar(last[c]) for c, _ in keys))
+
+
+def export(
+    con: duckdb.DuckDBPyConnection,
+    sql: str,
+    path: Path,
+    params: Optional[Dict[str, Any]] = None,
+    order: Sequence[str] = (),
+) -> int:
+    """
+    Write the full result of `sql` to `path` (.parquet or .csv) and return the
+    row count. DuckDB's COPY streams rows to the file in bounded memory; no
+    DataFrame is built.
+    """
+    path = Path(path)
+    fmt = EXPORT_FORMATS.get(path.suffix.lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported export format {path.suffix!r}; use one of {sorted(EXPORT_FORMATS)}")
+    sort = f"ORDER BY {order_sql(order)}" if order else ""
+    target = path.as_posix().replace("'", "''")
+    with profiling.profile("export", profiling.caller(), con=con, allocators=False, path=path.as_posix()) as rec:
+        rows = int(
+            con.execute(
+                f"COPY (SELECT * FROM ({sql.strip().rstrip(';')}) AS q {sort}) TO '{target}' ({fmt})",
+                params or {},
+            ).fetchone()[0]
+        )
+        if rec is not None:
+            rec["rows"] = rows
+    return rows
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from delivery_market_analysis.queries import Filters, _where, histogram, query_df
+
+# Sampling rates a query can ask for. The stored sample is the largest rate;
+# rows are ranked by a hash inside each (platform, city) stratum, so every
+# smaller rate is the first rows of each stratum (nested samples).
+SAMPLE_RATES = (0.01, 0.05, 0.2)
+# Small strata are kept whole (or at least this many rows) so every city has data.
+MIN_PER_STRATUM = 20
+Z_95 = 1.959964
+
+# relation -> (sample table, filter that turns the sample into that relation)
+SAMPLED: Dict[str, Tuple[str, str]] = {
+    "stg_restaurants": ("sample_restaurants", "TRUE"),
+    "stg_menu_items": ("sample_menu_items", "TRUE"),
+    "vw_menu_items_clean": ("sample_menu_items", "price IS NOT NULL AND price > 0 AND price < 500"),
+}
+
+
+def build_samples(db_path: Path) -> None:
+    """
+    Materialize stratified samples at the largest rate in SAMPLE_RATES:
+
+    sample_restaurants  stg_restaurants rows
+    sample_menu_items   stg_menu_items rows (city taken from the restaurant;
+                        the first one of its locations)
+
+    Each row carries its stratum (platform, stratum_city), the stratum size
+    stratum_n and its stratum_rank in hash order; a query at rate r keeps
+    rows with stratum_rank <= max(MIN_PER_STRATUM, ceil(r * stratum_n)).
+    """
+    con = duckdb.connect(db_path.as_posix())
+    top = max(SAMPLE_RATES)
+    # the high bits of a multi-column hash are poorly mixed and ranking by them
+    # skews small samples; reducing modulo a prime folds every bit in
+    sources = {
+        "sample_restaurants": (
+            """
+            SELECT *, COALESCE(NULLIF(city, ''), 'Unknown') AS stratum_city,
+                   hash(platform, restaurant_key) % 4294967291 AS h
+            FROM stg_restaurants
+            """
+        ),
+        "sample_menu_items": (
+            """
+            WITH r AS (
+              -- one city per restaurant: stg_restaurants has a row per location
+              SELECT platform, restaurant_key, MIN(NULLIF(city, '')) AS city
+              FROM stg_restaurants
+              GROUP BY 1, 2
+            )
+            SELECT i.*, COALESCE(r.city, 'Unknown') AS stratum_city,
+                   hash(i.platform, i.restaurant_key, i.item_key, i.item_name) % 4294967291 AS h
+            FROM stg_menu_items i
+            LEFT JOIN r
+              ON r.platform = i.platform AND r.restaurant_key = i.restaurant_key
+            """
+        ),
+    }
+    for table, src in sources.items():
+        con.execute(
+            f"""
+            CREATE OR REPLACE TABLE {table} AS
+            WITH ranked AS (
+              SELECT *,
+                     COUNT(*) OVER (PARTITION BY platform, stratum_city) AS stratum_n,
+                     ROW_NUMBER() OVER (PARTITION BY platform, stratum_city ORDER BY h) AS stratum_rank
+              FROM ({src})
+            )
+            SELECT * EXCLUDE (h)
+            FROM ranked
+            WHERE stratum_rank <= GREATEST({MIN_PER_STRATUM}, CEIL({top} * stratum_n))
+            ORDER BY stratum_rank, platform, stratum_city;
+            """
+        )
+    con.close()
+
+
+def _alias(expr: str) -> str:
+    m = re.search(r"\s+AS\s+(\w+)\s*$", expr, flags=re.IGNORECASE)
+    return m.group(1) if m else expr.strip()
+
+
+def _stratified(per: pd.DataFrame, cols: Sequence[str]) -> pd.DataFrame:
+    """
+    Stratified estimates of COUNT, SUM and AVG per group from per-(group, stratum)
+    sample sums, with 95% half-widths (finite population corrected; AVG is a
+    ratio estimator with a linearized variance).
+    """
+    N, n = per["stratum_n"].to_numpy(float), per["sample_n"].to_numpy(float)
+    c, s1, s2 = per["c"].to_numpy(float), per["s1"].to_numpy(float), per["s2"].to_numpy(float)
+    scale = np.where(n > 1, N * N * (1 - n / N) / n / np.maximum(n - 1, 1), 0.0)
+    key = per.groupby(list(cols), sort=True, dropna=False).ngroup().to_numpy() if cols else np.zeros(len(per), int)
+    k = int(key.max()) + 1
+
+    count = np.bincount(key, N / n * c, k)
+    total = np.bincount(key, N / n * s1, k)
+    var_count = np.bincount(key, scale * (c - c * c / n), k)
+    var_sum = np.bincount(key, scale * (s2 - s1 * s1 / n), k)
+    avg = np.divide(total, count, out=np.full(k, np.nan), where=count > 0)
+
+    # residuals y - R of the group's rows, R = the group's ratio estimate
+    R = np.nan_to_num(avg[key])
+    z1 = s1 - R * c
+    z2 = s2 - 2 * R * s1 + R * R * c
+    var_avg = np.bincount(key, scale * (z2 - z1 * z1 / n), k) / np.where(count > 0, count * count, np.nan)
+
+    _, first = np.unique(key, return_index=True)
+    out = per[list(cols)].iloc[first].reset_index(drop=True)
+    out["count"] = count
+    out["count_err"] = Z_95 * np.sqrt(np.clip(var_count, 0, None))
+    out["sum"] = total
+    out["sum_err"] = Z_95 * np.sqrt(np.clip(var_sum, 0, None))
+    out["avg"] = avg
+    out["avg_err"] = Z_95 * np.sqrt(np.clip(var_avg, 0, None))
+    return out
+
+
+def aggregate(
+    con: duckdb.DuckDBPyConnection,
+    relation: str,
+    value: Optional[str] = None,
+    by: Sequence[str] = (),
+    filters: Filters = Filters(),
+    where: str = "TRUE",
+    rate: Optional[float] = None,
+) -> pd.DataFrame:
+    """
+    COUNT / SUM / AVG of `value` (rows when None) per `by` with 95% error bounds.
+
+    rate=None scans `relation` exactly (errors are 0). Otherwise the answer is
+    estimated from its stratified sample at that rate. `by` items may be
+    expressions with an alias ("FLOOR(price) AS bin"); `where` is an extra
+    SQL condition on the relation's columns.
+    """
+    v = f"CAST({value} AS DOUBLE)" if value else "1.0"
+    cols = [_alias(b) for b in by]
+    sel = "".join(f"{b}, " for b in by)
+    cond, params = _where(filters)
+    cond = f"{cond} AND" if cond else "WHERE"
+    not_null = f"{value} IS NOT NULL AND" if value else ""
+
+    if rate is None:
+        df = query_df(
+            con,
+            f"""
+            SELECT {sel}
+                   CAST(COUNT(*) AS DOUBLE) AS count, SUM({v}) AS sum, AVG({v}) AS avg
+            FROM {relation}
+            {cond} {not_null} ({where})
+            GROUP BY ALL
+            ORDER BY ALL
+            """,
+            params,
+        )
+        return df.assign(count_err=0.0, sum_err=0.0, avg_err=0.0)[
+            [*cols, "count", "count_err", "sum", "sum_err", "avg", "avg_err"]
+        ]
+
+    if relation not in SAMPLED:
+        raise ValueError(f"No sample for {relation!r}; sampled relations: {sorted(SAMPLED)}")
+    if not 0 < rate <= max(SAMPLE_RATES):
+        raise ValueError(f"rate must be in (0, {max(SAMPLE_RATES)}]")
+    table, row_filter = SAMPLED[relation]
+    params = {**params, "rate": float(rate)}
+    per = query_df(
+        con,
+        f"""
+        WITH s AS (
+          SELECT *,
+                 CAST(LEAST(stratum_n, GREATEST({MIN_PER_STRATUM}, CEIL($rate * stratum_n))) AS BIGINT) AS n_h
+          FROM {table}
+        ),
+        sizes AS (
+          SELECT platform AS _platform, stratum_city AS _city, ANY_VALUE(stratum_n) AS stratum_n, ANY_VALUE(n_h) AS sample_n
+          FROM s
+          WHERE stratum_rank <= n_h
+          GROUP BY 1, 2
+        ),
+        hits AS (
+          SELECT {sel} platform AS _platform, stratum_city AS _city,
+                 COUNT(*) AS c, SUM({v}) AS s1, SUM({v} * {v}) AS s2
+          FROM (SELECT * FROM s WHERE stratum_rank <= n_h AND ({row_filter}))
+          {cond} {not_null} ({where})
+          GROUP BY ALL
+        )
+        SELECT h.*, z.stratum_n, z.sample_n
+        FROM hits h
+        JOIN sizes z USING (_platform, _city)
+        """,
+        params,
+    )
+    if per.empty:
+        return pd.DataFrame(columns=[*cols, "count", "count_err", "sum", "sum_err", "avg", "avg_err"])
+    return _stratified(per, cols)
+
+
+def approx_histogram(
+    con: duckdb.DuckDBPyConnection,
+    relation: str,
+    column: str,
+    *,
+    lo: float,
+    hi: float,
+    bins: int = 50,
+    filters: Filters = Filters(),
+    by: Sequence[str] = (),
+    rate: Optional[float] = None,
+) -> pd.DataFrame:
+    """
+    Fixed-width histogram over [lo, hi] like queries.histogram, with a
+    count_err column; estimated from the sample unless rate is None.
+    """
+    if rate is None:
+        return histogram(con, relation, column, bins=bins, lo=lo, hi=hi, filters=filters, by=by).assign(count_err=0.0)
+    w = (hi - lo) / bins if hi > lo else 1.0
+    bin_sql = f"CAST(LEAST(FLOOR(({column} - {float(lo)!r}) / {w!r}), {int(bins) - 1}) AS BIGINT) AS bin"
+    df = aggregate(
+        con,
+        relation,
+        None,
+        by=(*by, bin_sql),
+        filters=filters,
+        where=f"{column} >= {float(lo)!r} AND {column} <= {float(hi)!r}",
+        rate=rate,
+    )
+    df["bin_lo"] = lo + df["bin"] * w
+    df["bin_hi"] = lo + (df["bin"] + 1) * w
+    return df[[*by, "bin", "bin_lo", "bin_hi", "count", "count_err"]]
+
+
+def refine(
+    con: duckdb.DuckDBPyConnection,
+    fn: Callable[..., pd.DataFrame],
+    *args: Any,
+    rate: float = SAMPLE_RATES[0],
+    **kwargs: Any,
+) -> Iterator[Tuple[pd.DataFrame, bool]]:
+    """
+    Yield (result, exact) twice: fn(..., rate=rate) from the sample right away,
+    then fn(..., rate=None), which runs on a background thread with its own
+    cursor from the start. Without samples only the exact result is yielded.
+    """
+    table = SAMPLED.get(args[0] if args else "", ("", ""))[0]
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        exact = pool.submit(fn, con.cursor(), *args, rate=None, **kwargs)
+        if table and con.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]
+        ).fetchone()[0]:
+            yield fn(con, *args, rate=rate, **kwargs), False
+        yield exact.result(), True
+
+
+def main() -> None:
+    db_path = Path("data/processed/analytics.duckdb")
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    build_samples(db_path)
+    print("Stratified samples built: sample_restaurants + sample_menu_items")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import argparse
+import re
+from pathlib import Path
+from typing import List
+
+import duckdb
+
+from delivery_market_analysis import profiling
+
+DB_PATH = Path("data/processed/analytics.duckdb")
+SQL_PATH = Path("sql/90_views_semantic.sql")
+
+# (index, table, columns). Pages and the API look one restaurant up by its
+# key; the facts are sorted by restaurant_id, so their zone maps already
+# make lookups by id cheap and an index there would only cost space.
+INDEXES = (("idx_dim_restaurant_key", "dim_restaurant", ("restaurant_key",)),)
+
+_CREATE = re.compile(
+    r"CREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMP\w*\s+)?(\w+)\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w.\"]+)", re.IGNORECASE
+)
+
+
+def _statement_name(sql: str) -> str:
+    m = _CREATE.search(sql)
+    return f"{m.group(1).lower()} {m.group(2)}" if m else " ".join(sql.split())[:60]
+
+
+def apply_semantic(db_path: Path = DB_PATH, sql_path: Path = SQL_PATH) -> List[str]:
+    """
+    Run the semantic-layer SQL (unified src_* views, star schema, stg_* views,
+    convenience views, cell macros) against db_path. Returns the view names.
+    """
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    if not sql_path.exists():
+        raise FileNotFoundError(sql_path)
+
+    con = duckdb.connect(db_path.as_posix())
+    sql = sql_path.read_text(encoding="utf-8")
+    if profiling.enabled():
+        # one block per statement, so a slow view or macro shows up by name
+        for stmt in duckdb.extract_statements(sql):
+            with profiling.profile("semantic", _statement_name(stmt.query), con=con, allocators=False):
+                con.execute(stmt.query)
+    else:
+        con.execute(sql)
+
+    views = con.execute(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema='main' AND table_type='VIEW' ORDER BY 1;"
+    ).fetchall()
+    con.close()
+    return [v[0] for v in views]
+
+
+def build_indexes(db_path: Path = DB_PATH) -> List[str]:
+    """
+    Persisted ART indexes on the star schema (INDEXES). The semantic SQL
+    recreates the tables, which drops their indexes, so this runs after it.
+    """
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    con = duckdb.connect(db_path.as_posix())
+    for name, table, columns in INDEXES:
+        con.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)});")
+    con.close()
+    return [name for name, _, _ in INDEXES]
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.semantic")
+    p.add_argument("--db", default=DB_PATH.as_posix())
+    p.add_argument("--sql", default=SQL_PATH.as_posix())
+    profiling.add_argument(p)
+    args = p.parse_args()
+    profiling.enable_from_args(args)
+    print("Views:", apply_semantic(Path(args.db), Path(args.sql)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,560 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from delivery_market_analysis.autocomplete import suggest
+from delivery_market_analysis.chains import chain_summary, top_chains
+from delivery_market_analysis.coverage import coverage_summary, dead_zone_cells
+from delivery_market_analysis.cube import price_stats, restaurant_stats
+from delivery_market_analysis.diet import diet_by_city
+from delivery_market_analysis.hours import open_after_mask, open_at_mask, parse_days, restaurants_open
+from delivery_market_analysis.item_matching import price_gaps
+from delivery_market_analysis.matching import overlap_pairs, top_cross_platform
+from delivery_market_analysis.outliers import top_outliers
+from delivery_market_analysis.queries import DB_PATH, Filters, connect
+from delivery_market_analysis.spatial import nearest_competitors
+
+HOST = "127.0.0.1"
+PORT = 8765
+POOL_SIZE = 4
+CACHE_TTL_S = 60.0
+CACHE_ENTRIES = 256
+STREAM_BATCH_ROWS = 10_000
+READ_TIMEOUT_S = 30.0
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# ---------------------------------------------------------------------
+# Endpoints: the page queries with typed query-string parameters
+
+REQUIRED = object()
+
+
+def _list(value: str) -> Tuple[str, ...]:
+    return tuple(v.strip() for v in value.split(",") if v.strip())
+
+
+def _bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _count(value: str) -> int:
+    n = int(value)
+    if n < 0:
+        raise ValueError(f"expected a non-negative integer, got {n}")
+    return n
+
+
+def _day(value: str) -> int:
+    mask = parse_days(value)
+    if mask.sum() != 1:
+        raise ValueError(f"expected one weekday, got {value!r}")
+    return int(mask.argmax())
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """
+    fn(cursor, **params) returns a DataFrame (cached, coalesced) or, for
+    stream endpoints, an Arrow RecordBatchReader sent batch by batch.
+    params maps name -> (parser, default); REQUIRED marks mandatory ones.
+    """
+    fn: Callable[..., Any]
+    doc: str
+    params: Dict[str, Tuple[Callable[[str], Any], Any]] = field(default_factory=dict)
+    stream: bool = False
+
+    def parse(self, query: Dict[str, str]) -> Dict[str, Any]:
+        unknown = set(query) - set(self.params) - {"format"}
+        if unknown:
+            raise ValueError(f"Unknown parameter(s): {', '.join(sorted(unknown))}")
+        out = {}
+        for name, (parse, default) in self.params.items():
+            if name in query and query[name] != "":
+                try:
+                    out[name] = parse(query[name])
+                except ValueError as e:
+                    raise ValueError(f"Bad value for {name!r}: {e}") from None
+            elif default is REQUIRED:
+                raise ValueError(f"Missing parameter {name!r}")
+            else:
+                out[name] = default
+        return out
+
+
+def _filters(platform: Optional[str], city: Optional[str], category: Optional[str] = None) -> Filters:
+    return Filters(platform=platform, city=city, category=category)
+
+
+def _open_restaurants(cur, day: int, at: str, mode: str, city: str, limit: int) -> pd.DataFrame:
+    if mode not in ("at", "after"):
+        raise ValueError("mode must be 'at' or 'after'")
+    mask = open_at_mask(day, at) if mode == "at" else open_after_mask(day, at)
+    return restaurants_open(cur, mask, city=city, limit=limit)
+
+
+def _suggest(cur, kind: str, prefix: str, k: int) -> pd.DataFrame:
+    return pd.DataFrame(suggest(cur, kind, prefix, k), columns=["label", "frequency"])
+
+
+def _menu_items(cur, platform: Optional[str], restaurant_key: Optional[str], limit: Optional[int]) -> pa.RecordBatchReader:
+    return cur.execute(
+        f"""
+        SELECT platform, restaurant_key, item_key, item_name, description,
+               CAST(price AS DOUBLE) AS price, category_name
+        FROM vw_menu_items_clean
+        WHERE ($platform IS NULL OR platform = $platform)
+          AND ($restaurant_key IS NULL OR restaurant_key = $restaurant_key)
+        {"" if limit is None else f"LIMIT {int(limit)}"}
+        """,
+        {"platform": platform, "restaurant_key": restaurant_key},
+    ).to_arrow_reader(STREAM_BATCH_ROWS)
+
+
+def _restaurants(cur, platform: Optional[str], city: Optional[str], limit: Optional[int]) -> pa.RecordBatchReader:
+    return cur.execute(
+        f"""
+        SELECT platform, restaurant_key, restaurant_name, city, latitude, longitude,
+               rating_value, rating_count, delivery_fee
+        FROM stg_restaurants
+        WHERE ($platform IS NULL OR platform = $platform)
+          AND ($city IS NULL OR LOWER(city) = LOWER($city))
+        {"" if limit is None else f"LIMIT {int(limit)}"}
+        """,
+        {"platform": platform, "city": city},
+    ).to_arrow_reader(STREAM_BATCH_ROWS)
+
+
+_PLACE = {"platform": (str, None), "city": (str, None)}
+
+ENDPOINTS: Dict[str, Endpoint] = {
+    "restaurant_stats": Endpoint(
+        lambda c, by, platform, city: restaurant_stats(c, by=by, filters=_filters(platform, city)),
+        "Restaurant counts, ratings and fees from the rollup cube",
+        {"by": (_list, ("platform",)), **_PLACE},
+    ),
+    "price_stats": Endpoint(
+        lambda c, by, platform, city, category: price_stats(c, by=by, filters=_filters(platform, city, category)),
+        "Menu item price aggregates and median from the rollup cube",
+        {"by": (_list, ("platform",)), **_PLACE, "category": (str, None)},
+    ),
+    "chains": Endpoint(
+        lambda c, min_locations, limit: top_chains(c, min_locations, limit),
+        "Top chains by distinct cities",
+        {"min_locations": (int, 3), "limit": (_count, 50)},
+    ),
+    "chain_summary": Endpoint(
+        lambda c, min_locations: chain_summary(c, min_locations),
+        "Chain vs independent split",
+        {"min_locations": (int, 3)},
+    ),
+    "outliers": Endpoint(
+        lambda c, z, platform, robust, limit: top_outliers(c, z, platform, robust, limit),
+        "Menu items with |z| >= z (robust=true for median/MAD scores)",
+        {"z": (float, 3.0), "platform": (str, None), "robust": (_bool, False), "limit": (_count, 100)},
+    ),
+    "diet_by_city": Endpoint(
+        lambda c, tags, platform: diet_by_city(c, tags, platform),
+        "Restaurants per city with at least one item of each diet tag",
+        {"tags": (_list, ("vegetarian", "vegan")), "platform": (str, None)},
+    ),
+    "overlap_pairs": Endpoint(lambda c: overlap_pairs(c), "Pairwise cross-platform restaurant overlap"),
+    "cross_platform": Endpoint(
+        lambda c, min_reviews, min_platforms, limit: top_cross_platform(c, min_reviews, min_platforms, limit),
+        "Top restaurants listed on several platforms",
+        {"min_reviews": (int, 0), "min_platforms": (int, 2), "limit": (_count, 50)},
+    ),
+    "price_gaps": Endpoint(lambda c: price_gaps(c), "Matched dishes per platform pair with price differences"),
+    "open_restaurants": Endpoint(
+        _open_restaurants,
+        "UberEats restaurants open at / after a day and time",
+        {"day": (_day, 4), "at": (str, "22:00"), "mode": (str, "after"), "city": (str, ""), "limit": (_count, 2000)},
+    ),
+    "coverage": Endpoint(
+        lambda c, min_km: coverage_summary(c, min_km),
+        "Dead-zone area per platform",
+        {"min_km": (float, 3.0)},
+    ),
+    "dead_zones": Endpoint(
+        lambda c, platform, min_km, max_cells: dead_zone_cells(c, platform, min_km, max_cells),
+        "Service-region cells far from the nearest restaurant",
+        {"platform": (str, None), "min_km": (float, 3.0), "max_cells": (_count, 4000)},
+    ),
+    "competitors": Endpoint(
+        lambda c, platform, restaurant_key, k, radius_km, same_category: nearest_competitors(
+            c, platform, restaurant_key, k, radius_km, same_category
+        ),
+        "Nearest competitors of one restaurant (k nearest, or all within radius_km)",
+        {
+            "platform": (str, REQUIRED),
+            "restaurant_key": (str, REQUIRED),
+            "k": (_count, 10),
+            "radius_km": (float, None),
+            "same_category": (_bool, False),
+        },
+    ),
+    "suggest": Endpoint(
+        _suggest,
+        "Autocomplete for item, restaurant or city names",
+        {"kind": (str, "item"), "prefix": (str, REQUIRED), "k": (_count, 10)},
+    ),
+    "menu_items": Endpoint(
+        _menu_items,
+        "Clean menu items (streamed)",
+        {"platform": (str, None), "restaurant_key": (str, None), "limit": (_count, None)},
+        stream=True,
+    ),
+    "restaurants": Endpoint(
+        _restaurants,
+        "Restaurants (streamed)",
+        {**_PLACE, "limit": (_count, None)},
+        stream=True,
+    ),
+}
+
+
+# ---------------------------------------------------------------------
+# Cursor pool, result cache and in-flight coalescing
+
+
+class CursorPool:
+    """At most `size` queries at a time, each on its own cursor of one read-only connection."""
+
+    def __init__(self, con: duckdb.DuckDBPyConnection, size: int = POOL_SIZE) -> None:
+        self._free: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self._free.put_nowait(con.cursor())
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="dma-serve")
+
+    @asynccontextmanager
+    async def cursor(self) -> AsyncIterator[duckdb.DuckDBPyConnection]:
+        cur = await self._free.get()
+        try:
+            yield cur
+        finally:
+            self._free.put_nowait(cur)
+
+    async def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        while not self._free.empty():
+            self._free.get_nowait().close()
+
+
+class ResultCache:
+    """LRU of finished results with a time-to-live."""
+
+    def __init__(self, ttl_s: float = CACHE_TTL_S, entries: int = CACHE_ENTRIES) -> None:
+        self.ttl_s = ttl_s
+        self.entries = entries
+        self._items: "OrderedDict[tuple, Tuple[float, pa.Table]]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[pa.Table]:
+        hit = self._items.get(key)
+        if hit is None or time.monotonic() - hit[0] > self.ttl_s:
+            self._items.pop(key, None)
+            return None
+        self._items.move_to_end(key)
+        return hit[1]
+
+    def put(self, key: tuple, value: pa.Table) -> None:
+        if self.entries <= 0:
+            return
+        self._items[key] = (time.monotonic(), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.entries:
+            self._items.popitem(last=False)
+
+
+def _next_batch(reader: pa.RecordBatchReader) -> Optional[pa.RecordBatch]:
+    try:
+        return reader.read_next_batch()
+    except StopIteration:
+        return None
+
+
+class QueryService:
+    """Runs endpoints on the cursor pool; identical concurrent requests share one query."""
+
+    def __init__(
+        self,
+        con: duckdb.DuckDBPyConnection,
+        pool_size: int = POOL_SIZE,
+        cache_ttl_s: float = CACHE_TTL_S,
+        cache_entries: int = CACHE_ENTRIES,
+    ) -> None:
+        self.pool = CursorPool(con, pool_size)
+        self.cache = ResultCache(cache_ttl_s, cache_entries)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self.stats = {"requests": 0, "queries": 0, "cache_hits": 0, "coalesced": 0}
+
+    async def _query(self, endpoint: Endpoint, params: Dict[str, Any]) -> pa.Table:
+        self.stats["queries"] += 1
+        async with self.pool.cursor() as cur:
+            df = await self.pool.call(lambda: endpoint.fn(cur, **params))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    async def table(self, name: str, params: Dict[str, Any]) -> pa.Table:
+        key = (name, tuple(sorted(params.items())))
+        hit = self.cache.get(key)
+        if hit is not None:
+            self.stats["cache_hits"] += 1
+            return hit
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._query(ENDPOINTS[name], params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.stats["coalesced"] += 1
+        # shield: a client that disconnects must not cancel a query others wait for
+        return await asyncio.shield(task)
+
+    def _finish(self, key: tuple, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.cache.put(key, task.result())
+
+    async def batches(self, name: str, params: Dict[str, Any]) -> AsyncIterator[pa.RecordBatch]:
+        """Record batches of an endpoint; stream endpoints hold a cursor while they are read."""
+        endpoint = ENDPOINTS[name]
+        if not endpoint.stream:
+            table = await self.table(name, params)
+            yield pa.RecordBatch.from_pylist([], schema=table.schema)
+            for batch in table.to_batches(max_chunksize=STREAM_BATCH_ROWS):
+                yield batch
+            return
+        self.stats["queries"] += 1
+        async with self.pool.cursor() as cur:
+            reader = await self.pool.call(lambda: endpoint.fn(cur, **params))
+            yield pa.RecordBatch.from_pylist([], schema=reader.schema)
+            while True:
+                batch = await self.pool.call(_next_batch, reader)
+                if batch is None:
+                    break
+                yield batch
+
+
+# ---------------------------------------------------------------------
+# Output encodings (every response is sent with chunked transfer encoding)
+
+
+async def _prepend(first: pa.RecordBatch, rest: AsyncIterator[pa.RecordBatch]) -> AsyncIterator[pa.RecordBatch]:
+    yield first
+    async for batch in rest:
+        yield batch
+
+
+def _records(batch: pa.RecordBatch, lines: bool) -> str:
+    return batch.to_pandas().to_json(orient="records", lines=lines, date_format="iso")
+
+
+async def encode(fmt: str, batches: AsyncIterator[pa.RecordBatch]) -> AsyncIterator[bytes]:
+    """
+    json: one array of records; ndjson: one record per line; arrow: an Arrow
+    IPC stream. The first item of `batches` is an empty batch carrying the schema.
+    """
+    if fmt == "arrow":
+        sink = io.BytesIO()
+        writer = None
+        async for batch in batches:
+            if batch is None:
+                continue
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, batch.schema)
+            if batch.num_rows:
+                writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        if writer is not None:
+            writer.close()
+            yield sink.getvalue()
+        return
+
+    first = True
+    if fmt == "json":
+        yield b"["
+    async for batch in batches:
+        if batch is None or not batch.num_rows:
+            continue
+        if fmt == "json":
+            body = _records(batch, lines=False)[1:-1]
+            yield (body if first else "," + body).encode()
+        else:
+            yield _records(batch, lines=True).rstrip("\n").encode() + b"\n"
+        first = False
+    if fmt == "json":
+        yield b"]"
+
+
+# ---------------------------------------------------------------------
+# HTTP/1.1 on asyncio streams
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def _head(status: int, content_type: str, keep_alive: bool, chunked: bool = True, length: int = 0) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS[status]}", f"Content-Type: {content_type}"]
+    lines.append("Transfer-Encoding: chunked" if chunked else f"Content-Length: {length}")
+    lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+class QueryServer:
+    """
+    Headless JSON / NDJSON / Arrow API over the analytics database.
+
+    GET /v1/<endpoint>?param=value&format=json|ndjson|arrow
+    GET /v1           endpoint list with parameters
+    GET /healthz      liveness
+    GET /stats        request, query, cache-hit and coalescing counters
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        pool_size: int = POOL_SIZE,
+        cache_ttl_s: float = CACHE_TTL_S,
+        cache_entries: int = CACHE_ENTRIES,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.options = (pool_size, cache_ttl_s, cache_entries)
+        self.service: Optional[QueryService] = None
+
+    async def start(self, host: str = HOST, port: int = PORT) -> asyncio.AbstractServer:
+        if self.service is None:
+            self.service = QueryService(connect(self.db_path), *self.options)
+        return await asyncio.start_server(self._client, host, port)
+
+    async def _json(self, writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+        body = json.dumps(payload, default=str).encode()
+        writer.write(_head(status, CONTENT_TYPES["json"], keep_alive, chunked=False, length=len(body)) + body)
+        await writer.drain()
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), READ_TIMEOUT_S)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    break
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {
+                    k.strip().lower(): v.strip()
+                    for k, _, v in (h.partition(":") for h in header_lines if h)
+                }
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(request_line, headers, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(
+        self, request_line: str, headers: Dict[str, str], writer: asyncio.StreamWriter, keep_alive: bool
+    ) -> None:
+        service = self.service
+        service.stats["requests"] += 1
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            return await self._json(writer, 400, {"error": "Malformed request line"}, keep_alive)
+        if method != "GET":
+            return await self._json(writer, 405, {"error": "Only GET is supported"}, keep_alive)
+
+        url = urlsplit(target)
+        query = dict(parse_qsl(url.query, keep_blank_values=True))
+        path = url.path.rstrip("/")
+        if path == "/healthz":
+            return await self._json(writer, 200, {"status": "ok"}, keep_alive)
+        if path == "/stats":
+            return await self._json(writer, 200, service.stats, keep_alive)
+        if path in ("", "/v1"):
+            listing = {
+                name: {"doc": e.doc, "params": sorted(e.params), "stream": e.stream} for name, e in ENDPOINTS.items()
+            }
+            return await self._json(writer, 200, listing, keep_alive)
+
+        name = path[len("/v1/"):] if path.startswith("/v1/") else None
+        if name not in ENDPOINTS:
+            return await self._json(writer, 404, {"error": f"Unknown endpoint {url.path}"}, keep_alive)
+
+        fmt = query.get("format") or next(
+            (f for f, ct in CONTENT_TYPES.items() if ct in headers.get("accept", "")), "json"
+        )
+        if fmt not in CONTENT_TYPES:
+            return await self._json(writer, 400, {"error": f"format must be one of {sorted(CONTENT_TYPES)}"}, keep_alive)
+
+        try:
+            params = ENDPOINTS[name].parse(query)
+            batches = service.batches(name, params)
+            schema = await batches.__anext__()  # runs the query before the status line is sent
+        except ValueError as e:
+            return await self._json(writer, 400, {"error": str(e)}, keep_alive)
+        except (duckdb.Error, KeyError) as e:
+            return await self._json(writer, 500, {"error": f"{type(e).__name__}: {e}"}, keep_alive)
+
+        writer.write(_head(200, CONTENT_TYPES[fmt], keep_alive))
+        async for data in encode(fmt, _prepend(schema, batches)):
+            await self._chunk(writer, data)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        if data:
+            writer.write(b"%x\r\n" % len(data) + data + b"\r\n")
+            await writer.drain()
+
+    def close(self) -> None:
+        if self.service is not None:
+            self.service.pool.close()
+
+
+def serve(
+    db_path: Path = DB_PATH,
+    host: str = HOST,
+    port: int = PORT,
+    pool_size: int = POOL_SIZE,
+    cache_ttl_s: float = CACHE_TTL_S,
+) -> None:
+    """Run the query API until interrupted."""
+
+    async def run() -> None:
+        server = QueryServer(db_path, pool_size=pool_size, cache_ttl_s=cache_ttl_s)
+        srv = await server.start(host, port)
+        print(f"Serving {db_path} on http://{host}:{port}/v1 ({len(ENDPOINTS)} endpoints)")
+        try:
+            async with srv:
+                await srv.serve_forever()
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
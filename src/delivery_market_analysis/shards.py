@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import duckdb
+import pandas as pd
+
+from delivery_market_analysis import profiling
+from delivery_market_analysis.queries import DB_PATH, Filters
+from delivery_market_analysis.semantic import SQL_PATH, _statement_name
+
+SHARD_DIR = Path("data/processed/shards")
+MANIFEST = "manifest.json"
+SEMANTIC_SQL = "semantic.sql"
+SHARDED = ("stg_restaurants", "stg_menu_items", "stg_restaurant_categories")
+# tables of the semantic SQL computed from SHARDED alone; recreated as views over the shards
+DERIVED = ("stg_restaurants_geo",)
+UNKNOWN = "unknown"
+
+# Region of a restaurant by its (Belgian) postal code: the provinces, with
+# Brussels-Capital on its own. New countries add ranges here; codes outside
+# every range land in UNKNOWN.
+REGIONS: Tuple[Tuple[str, Tuple[Tuple[int, int], ...]], ...] = (
+    ("brussels", ((1000, 1299),)),
+    ("walloon_brabant", ((1300, 1499),)),
+    ("flemish_brabant", ((1500, 1999), (3000, 3499))),
+    ("antwerp", ((2000, 2999),)),
+    ("limburg", ((3500, 3999),)),
+    ("liege", ((4000, 4999),)),
+    ("namur", ((5000, 5999),)),
+    ("hainaut", ((6000, 6599), (7000, 7999))),
+    ("luxembourg", ((6600, 6999),)),
+    ("west_flanders", ((8000, 8999),)),
+    ("east_flanders", ((9000, 9999),)),
+)
+
+_connections: Dict[Tuple[str, Tuple[str, ...]], duckdb.DuckDBPyConnection] = {}
+_lock = Lock()
+
+
+def region_sql(postal_code: str = "postal_code") -> str:
+    """SQL expression mapping a postal code column to its region name."""
+    code = f"TRY_CAST(regexp_extract({postal_code}, '\\d{{4}}') AS INTEGER)"
+    whens = " ".join(
+        f"WHEN {code} BETWEEN {lo} AND {hi} THEN '{name}'" for name, ranges in REGIONS for lo, hi in ranges
+    )
+    return f"CASE {whens} ELSE '{UNKNOWN}' END"
+
+
+def read_manifest(shard_dir: Path = SHARD_DIR) -> Dict[str, Dict[str, Any]]:
+    path = Path(shard_dir) / MANIFEST
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))["shards"]
+
+
+def _write_manifest(shard_dir: Path, shards: Dict[str, Dict[str, Any]]) -> None:
+    tmp = Path(shard_dir) / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps({"shards": dict(sorted(shards.items()))}, indent=2), encoding="utf-8")
+    os.replace(tmp, Path(shard_dir) / MANIFEST)
+
+
+def _check_source(con: duckdb.DuckDBPyConnection, db_path: Path) -> None:
+    columns = dict(
+        con.execute(
+            "SELECT table_name, list(column_name) FROM information_schema.columns "
+            "WHERE table_catalog = 'src' AND table_schema = 'main' AND table_name IN ? GROUP BY 1;",
+            [list(SHARDED)],
+        ).fetchall()
+    )
+    missing = [rel for rel in SHARDED if "restaurant_id" not in columns.get(rel, [])]
+    if missing:
+        raise ValueError(
+            f"{db_path} has no {', '.join(missing)} with restaurant_id: shards need the star schema "
+            "of the semantic SQL (dma build, or dma demo --scale N; the tiny demo database has none)"
+        )
+
+
+def _semantic_statements(sql: str) -> List[str]:
+    """
+    Statements of the semantic SQL that only read the sharded relations:
+    vw_* views and cell macros, and DERIVED tables as views.
+    """
+    out = []
+    for stmt in duckdb.extract_statements(sql):
+        kind, _, name = _statement_name(stmt.query).partition(" ")
+        if name in SHARDED or name.startswith("src_"):
+            continue
+        if kind in ("view", "macro"):
+            out.append(stmt.query)
+        elif kind == "table" and name in DERIVED:
+            out.append(re.sub(r"CREATE\s+OR\s+REPLACE\s+TABLE", "CREATE OR REPLACE VIEW", stmt.query, count=1))
+    return out
+
+
+def _assign(con: duckdb.DuckDBPyConnection) -> None:
+    """
+    Temp tables: every sharded relation with the region of its restaurant,
+    clustered by region so writing one shard skips the others' row groups.
+    """
+    con.execute(
+        f"""
+        CREATE OR REPLACE TEMP TABLE _shard_region AS
+        SELECT restaurant_id, MIN({region_sql()}) AS region
+        FROM stg_restaurants
+        GROUP BY 1;
+        """
+    )
+    for rel in SHARDED:
+        # items and categories follow their restaurant; orphans go to UNKNOWN
+        con.execute(
+            f"""
+            CREATE OR REPLACE TEMP TABLE _shard_{rel} AS
+            SELECT t.*, COALESCE(s.region, '{UNKNOWN}') AS _region
+            FROM {rel} t
+            LEFT JOIN _shard_region s USING (restaurant_id)
+            ORDER BY _region;
+            """
+        )
+
+
+def _fingerprints(con: duckdb.DuckDBPyConnection) -> Dict[str, Dict[str, List[int]]]:
+    """Per region: row count and an order-independent content hash of each relation."""
+    out: Dict[str, Dict[str, List[int]]] = {}
+    for rel in SHARDED:
+        for region, n, h in con.execute(
+            f"SELECT _region, COUNT(*), SUM(hash(t)) FROM _shard_{rel} t GROUP BY 1;"
+        ).fetchall():
+            out.setdefault(region, {r: [0, 0] for r in SHARDED})[rel] = [int(n), int(h)]
+    return out
+
+
+def _write_shard(con: duckdb.DuckDBPyConnection, shard_dir: Path, region: str) -> Dict[str, Any]:
+    final = Path(shard_dir) / f"{region}.duckdb"
+    tmp = final.with_suffix(".duckdb.tmp")
+    tmp.unlink(missing_ok=True)
+    con.execute(f"ATTACH '{tmp.as_posix()}' AS _shard;")
+    try:
+        for rel in SHARDED:
+            # clustered by city so a city filter skips row groups inside the shard too
+            order = "city, platform" if rel == "stg_restaurants" else "platform, restaurant_id"
+            con.execute(
+                f"""
+                CREATE TABLE _shard.{rel} AS
+                SELECT * EXCLUDE (_region) FROM _shard_{rel}
+                WHERE _region = ?
+                ORDER BY {order};
+                """,
+                [region],
+            )
+        meta = con.execute(
+            f"""
+            SELECT
+              list(DISTINCT city ORDER BY city) FILTER (WHERE city IS NOT NULL),
+              (SELECT list(DISTINCT platform ORDER BY platform) FROM (
+                {" UNION ALL ".join(f"SELECT platform FROM _shard.{rel}" for rel in SHARDED)}
+              )),
+              MIN(latitude), MAX(latitude), MIN(longitude), MAX(longitude)
+            FROM _shard.stg_restaurants;
+            """
+        ).fetchone()
+    finally:
+        con.execute("DETACH _shard;")
+    os.replace(tmp, final)
+    cities, platforms, *bbox = meta
+    return {
+        "file": final.name,
+        "cities": cities or [],
+        "platforms": platforms or [],
+        "bbox": None if bbox[0] is None else bbox,
+    }
+
+
+def build_shards(
+    db_path: Path = DB_PATH,
+    shard_dir: Path = SHARD_DIR,
+    regions: Sequence[str] = (),
+    force: bool = False,
+    sql_path: Path = SQL_PATH,
+) -> pd.DataFrame:
+    """
+    Split the stg_* relations of db_path into one DuckDB file per region
+    (`<region>.duckdb` in shard_dir) and record each shard's cities,
+    platforms, bounding box and content fingerprint in manifest.json.
+
+    Only `regions` are considered when given (default: every region with
+    rows); a shard whose fingerprint is unchanged is not rewritten, and a
+    shard is written to a temp file and swapped in, so rebuilding one region
+    never touches the files of the others. The semantic SQL is copied next
+    to the manifest for connect(). Returns one row per region.
+    """
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    known = {name for name, _ in REGIONS} | {UNKNOWN}
+    unknown = [r for r in regions if r not in known]
+    if unknown:
+        raise ValueError(f"Unknown region(s) {unknown}; regions: {sorted(known)}")
+
+    Path(shard_dir).mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(shard_dir)
+    # the source is attached read-only so the dashboard can keep reading it;
+    # shard files are attached next to it for writing
+    con = duckdb.connect()
+    con.execute(f"ATTACH '{db_path.as_posix()}' AS src (READ_ONLY);")
+    con.execute("USE src;")
+    _check_source(con, db_path)
+    _assign(con)
+    fingerprints = _fingerprints(con)
+    present = sorted(fingerprints)
+
+    report = []
+    for region in regions or present:
+        t0 = time.perf_counter()
+        with profiling.profile("shard", region, con=con):
+            fp = fingerprints.get(region, {rel: [0, 0] for rel in SHARDED})
+            entry = manifest.get(region)
+            if region not in fingerprints:
+                status = "empty"
+                if entry is not None:
+                    (Path(shard_dir) / entry["file"]).unlink(missing_ok=True)
+                    del manifest[region]
+            elif not force and entry and entry["fingerprint"] == fp and (Path(shard_dir) / entry["file"]).exists():
+                status = "unchanged"
+            else:
+                status = "built"
+                manifest[region] = _write_shard(con, shard_dir, region)
+                manifest[region]["rows"] = {rel: n for rel, (n, _) in fp.items()}
+                manifest[region]["fingerprint"] = fp
+                _write_manifest(shard_dir, manifest)
+        report.append(
+            {
+                "region": region,
+                "status": status,
+                "seconds": round(time.perf_counter() - t0, 3),
+                "restaurants": fp["stg_restaurants"][0],
+                "menu_items": fp["stg_menu_items"][0],
+            }
+        )
+
+    if not regions:
+        # a full rebuild also drops shards of regions that no longer have rows
+        for region in [r for r in manifest if r not in present]:
+            (Path(shard_dir) / manifest.pop(region)["file"]).unlink(missing_ok=True)
+            report.append({"region": region, "status": "dropped"})
+    _write_manifest(shard_dir, manifest)
+    tmp = Path(shard_dir) / f"{SEMANTIC_SQL}.tmp"
+    tmp.write_text(Path(sql_path).read_text(encoding="utf-8"), encoding="utf-8")
+    os.replace(tmp, Path(shard_dir) / SEMANTIC_SQL)
+    con.close()
+    return pd.DataFrame(report)
+
+
+def prune(
+    manifest: Dict[str, Dict[str, Any]],
+    filters: Filters = Filters(),
+    bbox: Optional[Sequence[float]] = None,
+) -> List[str]:
+    """
+    Regions whose shard can hold rows matching the filters: the platform and
+    city must be listed in the shard, and a (lat_min, lat_max, lon_min,
+    lon_max) box must overlap its bounding box. Category is not pruned on.
+    """
+    keep = []
+    for region, entry in sorted(manifest.items()):
+        if filters.platform and filters.platform not in entry["platforms"]:
+            continue
+        if filters.city and filters.city not in entry["cities"]:
+            continue
+        if bbox is not None and entry["bbox"] is not None:
+            lat0, lat1, lon0, lon1 = entry["bbox"]
+            if bbox[1] < lat0 or bbox[0] > lat1 or bbox[3] < lon0 or bbox[2] > lon1:
+                continue
+        keep.append(region)
+    return keep
+
+
+def connect(
+    shard_dir: Path = SHARD_DIR, filters: Filters = Filters(), bbox: Optional[Sequence[float]] = None
+) -> duckdb.DuckDBPyConnection:
+    """
+    In-memory connection with the shards that survive prune() attached
+    read-only, stg_* views unioning them, and the semantic views and macros
+    that only read stg_* (vw_*, stg_restaurants_geo, cell_id) recreated on
+    top. Helpers over those names run unchanged against it (pass them the
+    same filters); the build tables (cube, chains, matching, ...) are not
+    sharded, so their helpers still need queries.connect(). Connections are
+    shared per set of attached shards; take a cursor per thread.
+    """
+    manifest = read_manifest(shard_dir)
+    if not manifest:
+        raise FileNotFoundError(Path(shard_dir) / MANIFEST)
+    regions = prune(manifest, filters, bbox)
+    key = (Path(shard_dir).resolve().as_posix(), tuple(regions))
+    with _lock:
+        if key in _connections:
+            return _connections[key]
+        con = duckdb.connect()
+        # with nothing left after pruning, one shard supplies the empty schema
+        attached = regions or [sorted(manifest)[0]]
+        for region in attached:
+            path = (Path(shard_dir) / manifest[region]["file"]).resolve().as_posix()
+            con.execute(f"ATTACH '{path}' AS \"shard_{region}\" (READ_ONLY);")
+        for rel in SHARDED:
+            union = " UNION ALL BY NAME ".join(f'SELECT * FROM "shard_{r}".{rel}' for r in attached)
+            con.execute(f"CREATE VIEW {rel} AS {union}{'' if regions else ' LIMIT 0'};")
+        semantic = Path(shard_dir) / SEMANTIC_SQL
+        if semantic.exists():
+            for sql in _semantic_statements(semantic.read_text(encoding="utf-8")):
+                con.execute(sql)
+        _connections[key] = con
+        return con
+
+
+def add_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--db", default=DB_PATH.as_posix())
+    p.add_argument("--out", default=SHARD_DIR.as_posix(), help="Directory of the shard files and manifest.json")
+    p.add_argument(
+        "--region", action="append", default=[], help=f"Only this region (repeatable): {', '.join(n for n, _ in REGIONS)}"
+    )
+    p.add_argument("--force", action="store_true", help="Rewrite shards even if unchanged")
+    p.add_argument("--sql", default=SQL_PATH.as_posix(), help="Semantic layer SQL, copied for shards.connect")
+    profiling.add_argument(p)
+
+
+def run_from_args(args: argparse.Namespace) -> None:
+    profiling.enable_from_args(args)
+    report = build_shards(Path(args.db), Path(args.out), args.region, args.force, Path(args.sql))
+    print(report.to_string(index=False))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.shards")
+    add_arguments(p)
+    run_from_args(p.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import argparse
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+
+from delivery_market_analysis import profiling
+from delivery_market_analysis.ingest import PLATFORMS
+from delivery_market_analysis.semantic import SQL_PATH, _statement_name
+
+DB_PATH = Path("data/processed/analytics.duckdb")
+SCHEMA = "history"
+SYSTEM_COLUMNS = ("row_hash", "valid_from", "valid_to")
+
+# stg_* views that get an "as of snapshot" table macro, built from the src_*
+# view of the same name in the semantic SQL
+ASOF_VIEWS = {
+    "stg_restaurants": "src_restaurants",
+    "stg_menu_items": "src_menu_items",
+    "stg_restaurant_categories": "src_restaurant_categories",
+}
+
+# diff(): identity of a row, and the columns compared between two snapshots
+DIFF_KEYS = {
+    "stg_restaurants": ("platform", "restaurant_key"),
+    "stg_menu_items": ("platform", "restaurant_key", "item_key"),
+    "stg_restaurant_categories": ("platform", "restaurant_key", "category_name"),
+}
+DIFF_COLUMNS = {
+    "stg_restaurants": ("restaurant_name", "rating_value", "rating_count", "delivery_fee", "min_order"),
+    "stg_menu_items": ("item_name", "price"),
+    "stg_restaurant_categories": (),
+}
+
+_RAW_REF = re.compile(r"\b(%s)\.(\"?)(\w+)\2" % "|".join(PLATFORMS))
+
+
+def _history_table(platform: str, table: str) -> str:
+    return f'{SCHEMA}."{platform}__{table}"'
+
+
+def _asof_macro(platform: str, table: str) -> str:
+    return f'{SCHEMA}."{platform}__{table}_asof"'
+
+
+def _ensure_catalog(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA};")
+    con.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA}.snapshots (
+          snapshot_id INTEGER,
+          label VARCHAR,
+          taken_at TIMESTAMP,
+          raw_rows BIGINT,
+          added_rows BIGINT,
+          closed_rows BIGINT
+        );
+        """
+    )
+
+
+def _columns(con: duckdb.DuckDBPyConnection, schema: str, table: str) -> List[str]:
+    rows = con.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = ? AND table_name = ? ORDER BY ordinal_position;",
+        [schema, table],
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def _record_table(con: duckdb.DuckDBPyConnection, snapshot_id: int, platform: str, table: str) -> Tuple[int, int, int]:
+    """
+    Merge the current raw table platform.table into its history table:
+    versions no longer present are closed (valid_to = snapshot_id), rows not
+    seen in any open version are added. Returns (raw rows, added, closed).
+    """
+    cols = _columns(con, platform, table)
+    clash = set(cols) & set(SYSTEM_COLUMNS)
+    if clash:
+        raise ValueError(f"{platform}.{table} has reserved column(s) {sorted(clash)}")
+    hist = _history_table(platform, table)
+
+    # A row is identified by the hash of its whole content (column names
+    # included, so NULL and 'NULL' differ); identical duplicates are told
+    # apart by their occurrence number, so a third copy of a row is one new
+    # version and not a no-op. md5 is stable across DuckDB versions, unlike hash().
+    con.execute(
+        f"""
+        CREATE OR REPLACE TEMP TABLE _snapshot_rows AS
+        WITH h AS (
+          SELECT *, md5_number(CAST(to_json(r) AS VARCHAR)) AS _content
+          FROM {platform}."{table}" r
+        )
+        SELECT
+          * EXCLUDE (_content),
+          _content + CAST(ROW_NUMBER() OVER (PARTITION BY _content) - 1 AS UHUGEINT) AS row_hash
+        FROM h;
+        """
+    )
+
+    con.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {hist} AS
+        SELECT *, CAST(NULL AS INTEGER) AS valid_from, CAST(NULL AS INTEGER) AS valid_to
+        FROM _snapshot_rows LIMIT 0;
+        """
+    )
+    known = set(_columns(con, SCHEMA, f"{platform}__{table}"))
+    for c in cols:
+        if c not in known:  # a new column in a later scrape
+            con.execute(f'ALTER TABLE {hist} ADD COLUMN "{c}" VARCHAR;')
+
+    closed = con.execute(
+        f"""
+        UPDATE {hist} SET valid_to = $snap
+        WHERE valid_to IS NULL
+          AND row_hash NOT IN (SELECT row_hash FROM _snapshot_rows);
+        """,
+        {"snap": snapshot_id},
+    ).fetchone()[0]
+    added = con.execute(
+        f"""
+        INSERT INTO {hist} BY NAME
+        SELECT n.*, $snap AS valid_from, CAST(NULL AS INTEGER) AS valid_to
+        FROM _snapshot_rows n
+        ANTI JOIN (SELECT row_hash FROM {hist} WHERE valid_to IS NULL) o USING (row_hash);
+        """,
+        {"snap": snapshot_id},
+    ).fetchone()[0]
+    rows = con.execute("SELECT COUNT(*) FROM _snapshot_rows;").fetchone()[0]
+    con.execute("DROP TABLE _snapshot_rows;")
+    return int(rows), int(added), int(closed)
+
+
+def _close_dropped(con: duckdb.DuckDBPyConnection, snapshot_id: int, seen: set) -> int:
+    """Close every open version of history tables whose raw table is gone."""
+    closed = 0
+    for (name,) in con.execute(
+        "SELECT table_name FROM information_schema.tables WHERE table_schema = ? AND table_name LIKE '%\\_\\_%' ESCAPE '\\';",
+        [SCHEMA],
+    ).fetchall():
+        if name in seen:
+            continue
+        closed += con.execute(
+            f'UPDATE {SCHEMA}."{name}" SET valid_to = ? WHERE valid_to IS NULL;', [snapshot_id]
+        ).fetchone()[0]
+    return int(closed)
+
+
+def install_asof(con: duckdb.DuckDBPyConnection, sql_path: Path = SQL_PATH) -> List[str]:
+    """
+    (Re)create the time-travel table macros:
+
+    history.<platform>__<table>_asof(snapshot)  the raw table as of a snapshot
+    stg_<name>_asof(snapshot)                   the stg_* view as of a snapshot
+
+    The stg macros are the src_* views of the semantic SQL with every raw
+    table reference swapped for its _asof macro, so they stay in sync with
+    it. restaurant_id comes from the current dim_restaurant and is NULL for
+    restaurants no longer listed. Nothing is copied: each call filters the
+    history tables on the valid_from/valid_to range. Returns the macro names.
+    """
+    made: List[str] = []
+    for (name,) in con.execute(
+        "SELECT table_name FROM information_schema.tables WHERE table_schema = ? AND table_name LIKE '%\\_\\_%' ESCAPE '\\';",
+        [SCHEMA],
+    ).fetchall():
+        platform, table = name.split("__", 1)
+        macro = _asof_macro(platform, table)
+        con.execute(
+            f"""
+            CREATE OR REPLACE MACRO {macro}(snapshot) AS TABLE
+            SELECT * EXCLUDE (row_hash, valid_from, valid_to)
+            FROM {_history_table(platform, table)}
+            WHERE valid_from <= snapshot AND (valid_to IS NULL OR valid_to > snapshot);
+            """
+        )
+        made.append(macro)
+
+    sources = {
+        _statement_name(s.query): s.query
+        for s in duckdb.extract_statements(Path(sql_path).read_text(encoding="utf-8"))
+    }
+    for view, src in ASOF_VIEWS.items():
+        stmt = sources.get(f"view {src}")
+        if stmt is None:
+            raise ValueError(f"{src} not found in {sql_path}")
+        body = re.split(r"\bAS\b", stmt[stmt.index(src) + len(src):], maxsplit=1)[1]
+        body = _RAW_REF.sub(lambda m: f"{_asof_macro(m.group(1), m.group(3))}(snapshot)", body)
+        con.execute(
+            f"""
+            CREATE OR REPLACE MACRO {view}_asof(snapshot) AS TABLE
+            SELECT s.*, d.restaurant_id
+            FROM ({body}) s
+            LEFT JOIN dim_platform p ON p.platform = s.platform
+            LEFT JOIN dim_restaurant d ON d.platform_id = p.platform_id AND d.restaurant_key = s.restaurant_key;
+            """
+        )
+        made.append(f"{view}_asof")
+    return made
+
+
+def take_snapshot(
+    db_path: Path = DB_PATH, label: Optional[str] = None, sql_path: Path = SQL_PATH
+) -> Dict[str, int]:
+    """
+    Record the raw platform tables currently in db_path (as loaded by ingest)
+    as the next snapshot. Only rows that are new or changed since the last
+    snapshot are stored, in history.<platform>__<table> with the range of
+    snapshots [valid_from, valid_to) they were current in; rows that
+    disappeared get their range closed. Then refreshes the _asof macros.
+    Returns the snapshot id with its raw / added / closed row counts.
+    """
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    con = duckdb.connect(db_path.as_posix())
+    _ensure_catalog(con)
+    tables = con.execute(
+        "SELECT table_schema, table_name FROM information_schema.tables "
+        "WHERE table_schema IN ? AND table_type = 'BASE TABLE' ORDER BY 1, 2;",
+        [list(PLATFORMS)],
+    ).fetchall()
+    if not tables:
+        con.close()
+        raise ValueError(f"No raw platform tables in {db_path}; run the ingest first")
+
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        snapshot_id = con.execute(f"SELECT COALESCE(MAX(snapshot_id), 0) + 1 FROM {SCHEMA}.snapshots;").fetchone()[0]
+        raw = added = closed = 0
+        for platform, table in tables:
+            with profiling.profile("snapshot", f"{platform}.{table}", con=con) as rec:
+                r, a, c = _record_table(con, snapshot_id, platform, table)
+                if rec is not None:
+                    rec.update(rows=r, added=a, closed=c)
+            raw, added, closed = raw + r, added + a, closed + c
+        closed += _close_dropped(con, snapshot_id, {f"{p}__{t}" for p, t in tables})
+        con.execute(
+            f"INSERT INTO {SCHEMA}.snapshots VALUES (?, ?, now()::TIMESTAMP, ?, ?, ?);",
+            [snapshot_id, label, raw, added, closed],
+        )
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        con.close()
+        raise
+    install_asof(con, sql_path)
+    con.close()
+    return {"snapshot_id": int(snapshot_id), "raw_rows": raw, "added_rows": added, "closed_rows": closed}
+
+
+def list_snapshots(con: duckdb.DuckDBPyConnection) -> pd.DataFrame:
+    """Snapshot catalog with the rows each history table stores."""
+    _ensure_catalog(con)
+    return con.execute(f"SELECT * FROM {SCHEMA}.snapshots ORDER BY snapshot_id;").df()
+
+
+def raw_changes(con: duckdb.DuckDBPyConnection, platform: str, table: str, a: int, b: int) -> pd.DataFrame:
+    """
+    Row versions of one raw table added or removed between snapshots a < b,
+    read straight from the validity ranges (a changed row shows up as the
+    old version removed and the new one added).
+    """
+    if a >= b:
+        raise ValueError(f"Snapshot {a} must be older than {b}")
+    return con.execute(
+        f"""
+        SELECT
+          CASE WHEN valid_from > $a THEN 'added' ELSE 'removed' END AS change,
+          * EXCLUDE (row_hash)
+        FROM {_history_table(platform, table)}
+        WHERE (valid_from > $a AND valid_from <= $b AND (valid_to IS NULL OR valid_to > $b))
+           OR (valid_from <= $a AND valid_to > $a AND valid_to <= $b)
+        ORDER BY change, valid_from;
+        """,
+        {"a": a, "b": b},
+    ).df()
+
+
+def diff(con: duckdb.DuckDBPyConnection, view: str, a: int, b: int) -> pd.DataFrame:
+    """
+    What changed in a stg_* view from snapshot a to snapshot b: one row per
+    key (DIFF_KEYS) that was added, removed or whose DIFF_COLUMNS changed,
+    with each compared column's value in a and in b.
+    """
+    if view not in DIFF_KEYS:
+        raise ValueError(f"Unknown view {view!r}; one of {list(DIFF_KEYS)}")
+    keys, cols = DIFF_KEYS[view], DIFF_COLUMNS[view]
+    key_sql = ", ".join(f"COALESCE(o.{k}, n.{k}) AS {k}" for k in keys)
+    val_sql = "".join(f", o.{c} AS {c}_a, n.{c} AS {c}_b" for c in cols)
+    changed = " OR ".join(f"o.{c} IS DISTINCT FROM n.{c}" for c in cols) or "FALSE"
+    return con.execute(
+        f"""
+        SELECT
+          {key_sql},
+          CASE
+            WHEN o.{keys[0]} IS NULL THEN 'added'
+            WHEN n.{keys[0]} IS NULL THEN 'removed'
+            ELSE 'changed'
+          END AS change
+          {val_sql}
+        FROM {view}_asof($a) o
+        FULL JOIN {view}_asof($b) n USING ({", ".join(keys)})
+        WHERE o.{keys[0]} IS NULL OR n.{keys[0]} IS NULL OR {changed}
+        ORDER BY {", ".join(str(i + 1) for i in range(len(keys)))};
+        """,
+        {"a": a, "b": b},
+    ).df()
+
+
+def add_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument("action", choices=("take", "list", "diff"), help="take a snapshot, list them, or diff two")
+    p.add_argument("--db", default=DB_PATH.as_posix())
+    p.add_argument("--sql", default=SQL_PATH.as_posix(), help="Semantic layer SQL (for the _asof macros)")
+    p.add_argument("--label", help="take: free-text label, e.g. the scrape date")
+    p.add_argument("--from", dest="a", type=int, help="diff: older snapshot id")
+    p.add_argument("--to", dest="b", type=int, help="diff: newer snapshot id")
+    p.add_argument("--view", default="stg_menu_items", choices=list(DIFF_KEYS), help="diff: view to compare")
+    profiling.add_argument(p)
+
+
+def run_from_args(args: argparse.Namespace) -> None:
+    profiling.enable_from_args(args)
+    db_path = Path(args.db)
+    if args.action == "take":
+        print(take_snapshot(db_path, args.label, Path(args.sql)))
+        return
+    if not db_path.exists():
+        raise FileNotFoundError(db_path)
+    con = duckdb.connect(db_path.as_posix(), read_only=args.action == "diff")
+    if args.action == "list":
+        print(list_snapshots(con).to_string(index=False))
+    else:
+        if args.a is None or args.b is None:
+            raise SystemExit("diff needs --from and --to")
+        print(diff(con, args.view, args.a, args.b).to_string(index=False))
+    con.close()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.snapshots")
+    add_arguments(p)
+    run_from_args(p.parse_args())
+
+
+if __name__ == "__main__":
+    main()
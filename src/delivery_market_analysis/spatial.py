@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from delivery_market_analysis.geo import EARTH_RADIUS_KM
+
+LEAF_SIZE = 32
+QUERY_CHUNK = 2048
+
+
+def to_unit(lat, lon) -> np.ndarray:
+    """(n, 3) unit vectors on the sphere for lat/lon in degrees."""
+    la = np.radians(np.asarray(lat, dtype=np.float64))
+    lo = np.radians(np.asarray(lon, dtype=np.float64))
+    c = np.cos(la)
+    return np.stack([c * np.cos(lo), c * np.sin(lo), np.sin(la)], axis=-1)
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+
+def km_to_chord(km: float) -> float:
+    return float(2.0 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2.0))
+
+
+def _expand(qi: np.ndarray, start: np.ndarray, end: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(query, position) pairs for every position in [start, end) of every (query, node) pair."""
+    counts = end - start
+    total = int(counts.sum())
+    offsets = np.repeat(start - np.cumsum(counts) + counts, counts)
+    return np.repeat(qi, counts), offsets + np.arange(total)
+
+
+def _group_rank(qi_sorted: np.ndarray) -> np.ndarray:
+    """0-based rank of every element within its run of equal (sorted) query ids."""
+    n = len(qi_sorted)
+    first = np.r_[True, qi_sorted[1:] != qi_sorted[:-1]] if n else np.array([], bool)
+    starts = np.flatnonzero(first)
+    return np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+
+
+class SpatialIndex:
+    """
+    KD-tree over 3D unit vectors (chord distance is monotone in great-circle
+    distance, so there is no dateline or pole special-casing).
+
+    The tree is balanced and implicit: node i has children 2i+1 and 2i+2, every
+    split is the median of the node's widest axis, and all leaves sit at the
+    same depth with at most `leaf_size` points stored contiguously. Queries
+    are answered in batches: the whole batch descends the tree level by level
+    as (query, node) pairs, pruned by box distance, with NumPy doing the work.
+    """
+
+    def __init__(self, lat, lon, leaf_size: int = LEAF_SIZE) -> None:
+        xyz = to_unit(lat, lon).reshape(-1, 3)
+        n = len(xyz)
+        depth = int(np.ceil(np.log2(n / leaf_size))) if n > leaf_size else 0
+        n_nodes = 2 ** (depth + 1) - 1
+        start = np.zeros(n_nodes, dtype=np.int64)
+        end = np.zeros(n_nodes, dtype=np.int64)
+        split_axis = np.zeros(n_nodes, dtype=np.int64)
+        split_val = np.zeros(n_nodes)
+        end[0] = n
+        order = np.arange(n)
+
+        for node in range(2 ** depth - 1):  # internal nodes, parents before children
+            a, b = start[node], end[node]
+            mid = a + (b - a) // 2
+            if b - a >= 2:
+                pts = xyz[order[a:b]]
+                axis = int(np.argmax(pts.max(axis=0) - pts.min(axis=0)))
+                part = np.argpartition(pts[:, axis], mid - a)
+                order[a:b] = order[a:b][part]
+                split_axis[node] = axis
+                split_val[node] = xyz[order[mid], axis]
+            start[2 * node + 1], end[2 * node + 1] = a, mid
+            start[2 * node + 2], end[2 * node + 2] = mid, b
+
+        self.order = order  # position in the tree -> original row
+        self.xyz = xyz[order]
+        self.depth = depth
+        self.start, self.end = start, end
+        self.split_axis, self.split_val = split_axis, split_val
+
+        # bounding boxes: leaves from their points, then parents from children
+        self.lo = np.full((n_nodes, 3), np.inf)
+        self.hi = np.full((n_nodes, 3), -np.inf)
+        first_leaf = 2 ** depth - 1
+        leaf = np.arange(first_leaf, n_nodes)
+        full = leaf[end[leaf] > start[leaf]]
+        if len(full):
+            self.lo[full] = np.minimum.reduceat(self.xyz, start[full])
+            self.hi[full] = np.maximum.reduceat(self.xyz, start[full])
+        for level in range(depth - 1, -1, -1):
+            nodes = np.arange(2 ** level - 1, 2 ** (level + 1) - 1)
+            self.lo[nodes] = np.minimum(self.lo[2 * nodes + 1], self.lo[2 * nodes + 2])
+            self.hi[nodes] = np.maximum(self.hi[2 * nodes + 1], self.hi[2 * nodes + 2])
+
+    def __len__(self) -> int:
+        return len(self.xyz)
+
+    def _box_dist(self, q: np.ndarray, node: np.ndarray) -> np.ndarray:
+        d = np.maximum(np.maximum(self.lo[node] - q, q - self.hi[node]), 0.0)
+        return np.sqrt((d * d).sum(axis=1))
+
+    def _within(self, q: np.ndarray, r: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(query, position, chord) for every point within chord r[query] of q[query]."""
+        qi = np.arange(len(q))
+        node = np.zeros(len(q), dtype=np.int64)
+        for _ in range(self.depth + 1):
+            keep = self._box_dist(q[qi], node) <= r[qi]
+            qi, node = qi[keep], node[keep]
+            if node.size and node[0] >= 2 ** self.depth - 1:
+                break
+            qi = np.repeat(qi, 2)
+            node = np.stack([2 * node + 1, 2 * node + 2], axis=1).ravel()
+        qi, pos = _expand(qi, self.start[node], self.end[node])
+        d = np.sqrt(((self.xyz[pos] - q[qi]) ** 2).sum(axis=1))
+        keep = d <= r[qi]
+        return qi[keep], pos[keep], d[keep]
+
+    def _knn_bound(self, q: np.ndarray, k: int) -> np.ndarray:
+        # descend to the deepest level whose nodes still hold >= k points; the
+        # k-th distance inside that node bounds the true k-th neighbour distance
+        level = 0
+        while level < self.depth and len(self) // 2 ** (level + 1) >= k:
+            level += 1
+        node = np.zeros(len(q), dtype=np.int64)
+        for _ in range(level):
+            go_right = q[np.arange(len(q)), self.split_axis[node]] >= self.split_val[node]
+            node = 2 * node + 1 + go_right
+        qi, pos = _expand(np.arange(len(q)), self.start[node], self.end[node])
+        d = np.sqrt(((self.xyz[pos] - q[qi]) ** 2).sum(axis=1))
+        o = np.lexsort((d, qi))
+        qi, d = qi[o], d[o]
+        rank = _group_rank(qi)
+        bound = np.full(len(q), np.inf)
+        hit = rank == k - 1
+        bound[qi[hit]] = d[hit]
+        return bound * (1 + 1e-12)
+
+    def knn(self, lat, lon, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k nearest points for each query: (rows, distances_km), both (queries, k),
+        sorted by distance; rows index the arrays the index was built from
+        (-1 / inf when there are fewer than k points).
+        """
+        q_all = to_unit(lat, lon).reshape(-1, 3)
+        nq = len(q_all)
+        rows = np.full((nq, k), -1, dtype=np.int64)
+        dist = np.full((nq, k), np.inf)
+        if len(self) == 0 or k <= 0:
+            return rows, dist
+        for c0 in range(0, nq, QUERY_CHUNK):
+            q = q_all[c0:c0 + QUERY_CHUNK]
+            qi, pos, d = self._within(q, self._knn_bound(q, k))
+            o = np.lexsort((d, qi))
+            qi, pos, d = qi[o], pos[o], d[o]
+            rank = _group_rank(qi)
+            top = rank < k
+            rows[c0 + qi[top], rank[top]] = self.order[pos[top]]
+            dist[c0 + qi[top], rank[top]] = chord_to_km(d[top])
+        return rows, dist
+
+    def radius(self, lat, lon, radius_km: float) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """For each query, (rows, distances_km) of all points within radius_km, nearest first."""
+        q_all = to_unit(lat, lon).reshape(-1, 3)
+        out: List[Tuple[np.ndarray, np.ndarray]] = []
+        for c0 in range(0, len(q_all), QUERY_CHUNK):
+            q = q_all[c0:c0 + QUERY_CHUNK]
+            if len(self) == 0:
+                out.extend((np.array([], dtype=np.int64), np.array([])) for _ in q)
+                continue
+            qi, pos, d = self._within(q, np.full(len(q), km_to_chord(radius_km)))
+            o = np.lexsort((d, qi))
+            qi, pos, d = qi[o], pos[o], d[o]
+            cuts = np.searchsorted(qi, np.arange(len(q) + 1))
+            rows, km = self.order[pos], chord_to_km(d)
+            out.extend((rows[cuts[i]:cuts[i + 1]], km[cuts[i]:cuts[i + 1]]) for i in range(len(q)))
+        return out
+
+
+# ---------------------------------------------------------------------
+# Cached restaurant index, rebuilt when the dataset version changes
+
+_POINTS_SQL = """
+SELECT platform, restaurant_key, restaurant_name, COALESCE(NULLIF(city,''),'Unknown') AS city, latitude, longitude
+FROM stg_restaurants
+WHERE latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180
+ORDER BY platform, restaurant_key
+"""
+
+_CACHE: Dict[tuple, Tuple[SpatialIndex, pd.DataFrame]] = {}
+
+
+def dataset_version(con: duckdb.DuckDBPyConnection) -> tuple:
+    """Cheap fingerprint of the restaurant coordinates (count and coordinate sums)."""
+    return tuple(
+        con.execute(
+            """
+            SELECT COUNT(*), SUM(latitude), SUM(longitude), MAX(restaurant_key)
+            FROM stg_restaurants
+            WHERE latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180
+            """
+        ).fetchone()
+    )
+
+
+def restaurant_index(con: duckdb.DuckDBPyConnection) -> Tuple[SpatialIndex, pd.DataFrame]:
+    """
+    (index, points) over stg_restaurants with coordinates. Built once per
+    dataset version and kept for the life of the process; index rows are
+    positions in `points`.
+    """
+    key = (con.execute("PRAGMA database_list").fetchone()[2], dataset_version(con))
+    if key not in _CACHE:
+        points = con.execute(_POINTS_SQL).df()
+        _CACHE.clear()
+        _CACHE[key] = (SpatialIndex(points["latitude"].to_numpy(), points["longitude"].to_numpy()), points)
+    return _CACHE[key]
+
+
+def nearest_competitors(
+    con: duckdb.DuckDBPyConnection,
+    platform: str,
+    restaurant_key: str,
+    k: int = 10,
+    radius_km: Optional[float] = None,
+    same_category: bool = False,
+) -> pd.DataFrame:
+    """
+    Competitors of one restaurant on any platform: the k nearest, or everything
+    within radius_km when given; optionally only those sharing a category.
+    """
+    index, points = restaurant_index(con)
+    is_me = (points["platform"] == platform) & (points["restaurant_key"] == restaurant_key)
+    me = points[is_me]
+    if me.empty:
+        return points.head(0).assign(distance_km=[])
+    lat, lon = me.iloc[0]["latitude"], me.iloc[0]["longitude"]
+
+    cats = None
+    wanted = k
+    if same_category:
+        cats = con.execute(
+            """
+            SELECT DISTINCT c.platform, c.restaurant_key
+            FROM stg_restaurant_categories c
+            JOIN (
+              SELECT LOWER(category_name) AS category_name
+              FROM stg_restaurant_categories
+              WHERE platform = $platform AND restaurant_key = $key
+            ) mine ON LOWER(c.category_name) = mine.category_name
+            """,
+            {"platform": platform, "key": restaurant_key},
+        ).df()
+        # competitors that can be found at all: sharing a category and indexed
+        wanted = min(k, len(points[~is_me].merge(cats, on=["platform", "restaurant_key"])))
+
+    # k nearest with a category filter: widen the search until k matches survive
+    n = k + 1
+    while True:
+        if radius_km is None:
+            rows, dist = index.knn([lat], [lon], n)
+            rows, dist = rows[0], dist[0]
+            rows, dist = rows[rows >= 0], dist[rows >= 0]
+        else:
+            rows, dist = index.radius([lat], [lon], radius_km)[0]
+
+        out = points.iloc[rows].assign(distance_km=dist)
+        out = out[~((out["platform"] == platform) & (out["restaurant_key"] == restaurant_key))]
+        if cats is not None:
+            out = out.merge(cats, on=["platform", "restaurant_key"])
+        if radius_km is not None or len(out) >= wanted or n >= len(index):
+            break
+        n = min(4 * n, len(index))
+    if radius_km is None:
+        out = out.head(k)
+    return out.reset_index(drop=True)
+
+
+def benchmark(n_points: int = 200_000, n_queries: int = 10_000, k: int = 10, radius_km: float = 2.0) -> Dict[str, float]:
+    """Batched queries per second on random points over Belgium, next to a brute-force scan."""
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(49.5, 51.5, n_points)
+    lon = rng.uniform(2.5, 6.4, n_points)
+    ql = rng.uniform(49.5, 51.5, n_queries)
+    qo = rng.uniform(2.5, 6.4, n_queries)
+
+    t = time.perf_counter()
+    index = SpatialIndex(lat, lon)
+    build_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    index.knn(ql, qo, k)
+    knn_qps = n_queries / (time.perf_counter() - t)
+
+    t = time.perf_counter()
+    index.radius(ql, qo, radius_km)
+    radius_qps = n_queries / (time.perf_counter() - t)
+
+    xyz = to_unit(lat, lon)
+    brute_n = min(n_queries, 200)
+    t = time.perf_counter()
+    for p in to_unit(ql[:brute_n], qo[:brute_n]):
+        d = ((xyz - p) ** 2).sum(axis=1)
+        np.argpartition(d, k)[:k]
+    brute_qps = brute_n / (time.perf_counter() - t)
+
+    return {
+        "points": n_points,
+        "queries": n_queries,
+        "build_s": build_s,
+        "knn_qps": knn_qps,
+        "radius_qps": radius_qps,
+        "brute_force_knn_qps": brute_qps,
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog="python -m delivery_market_analysis.spatial")
+    p.add_argument("--points", type=int, default=200_000)
+    p.add_argument("--queries", type=int, default=10_000)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--radius-km", type=float, default=2.0)
+    args = p.parse_args()
+    res = benchmark(args.points, args.queries, args.k, args.radius_km)
+    for name, value in res.items():
+        print(f"{name:>20}: {value:,.2f}" if isinstance(value, float) else f"{name:>20}: {value:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# (city, latitude, longitude, postal code), largest first: cities are drawn Zipf by rank
+CITIES: Sequence[Tuple[str, float, float, str]] = (
+    ("Brussel", 50.8466, 4.3528, "1000"),
+    ("Antwerpen", 51.2194, 4.4025, "2000"),
+    ("Gent", 51.0543, 3.7174, "9000"),
+    ("Charleroi", 50.4108, 4.4446, "6000"),
+    ("Liège", 50.6326, 5.5797, "4000"),
+    ("Brugge", 51.2093, 3.2247, "8000"),
+    ("Namur", 50.4674, 4.8720, "5000"),
+    ("Leuven", 50.8798, 4.7005, "3000"),
+    ("Mons", 50.4542, 3.9523, "7000"),
+    ("Mechelen", 51.0259, 4.4776, "2800"),
+    ("Aalst", 50.9378, 4.0410, "9300"),
+    ("Hasselt", 50.9307, 5.3325, "3500"),
+    ("Kortrijk", 50.8279, 3.2649, "8500"),
+    ("Oostende", 51.2154, 2.9286, "8400"),
+    ("Sint-Niklaas", 51.1650, 4.1437, "9100"),
+    ("Genk", 50.9650, 5.5008, "3600"),
+    ("Roeselare", 50.9447, 3.1244, "8800"),
+    ("Tournai", 50.6056, 3.3878, "7500"),
+    ("Wavre", 50.7171, 4.6014, "1300"),
+    ("Arlon", 49.6833, 5.8167, "6700"),
+)
+
+# cuisine -> (restaurant name words, dishes as (name, description, base price))
+CUISINES: Dict[str, Tuple[Sequence[str], Sequence[Tuple[str, str, float]]]] = {
+    "Pizza": (
+        ("Pizza Uno", "Napoli", "Bella Italia", "Pizzeria Roma"),
+        (
+            ("Margherita", "tomato, mozzarella, basil", 11.0),
+            ("Pizza Diavola", "spicy salami, chili", 13.5),
+            ("Pizza Vegetariana", "grilled vegetables, vegetarian", 12.5),
+            ("Calzone", "folded pizza, ham, mushrooms", 14.0),
+        ),
+    ),
+    "Snacks": (
+        ("Frituur", "Snack Center", "Kapsalon King", "Friture du Coin"),
+        (
+            ("Kapsalon", "fries, shoarma, cheese, salad", 11.5),
+            ("Grote friet", "fries with mayonnaise", 4.5),
+            ("Frikandel speciaal", "onions, curry ketchup", 3.5),
+            ("Bicky burger", "burger with bicky sauce", 5.5),
+        ),
+    ),
+    "Middle Eastern": (
+        ("Hummus House", "Beirut Grill", "Falafel Express", "Shawarma Palace"),
+        (
+            ("Hummus bowl", "chickpeas, tahini, vegan", 10.0),
+            ("Falafel wrap", "falafel, salad, vegan", 8.5),
+            ("Chicken shawarma", "marinated chicken, garlic sauce", 12.0),
+            ("Mezze plate", "hummus, baba ganoush, tabbouleh, vegetarian", 15.0),
+        ),
+    ),
+    "Asian": (
+        ("Sushi Bar", "Thai Garden", "Wok Express", "Pho Saigon"),
+        (
+            ("Pad thai", "rice noodles, peanuts, egg", 14.0),
+            ("Salmon maki", "8 pieces", 9.5),
+            ("Green curry", "coconut, vegetables, vegan option", 15.5),
+            ("Pho bo", "beef noodle soup", 14.5),
+        ),
+    ),
+    "Burgers": (
+        ("Burger Town", "Grill House", "Smash Burgers", "Vegan Corner"),
+        (
+            ("Cheeseburger", "beef, cheddar, pickles", 12.0),
+            ("Veggie burger", "vegetarisch, halloumi", 12.5),
+            ("Vegan burger", "plant-based patty, vegan mayo", 13.0),
+            ("Loaded fries", "cheese sauce, bacon", 7.5),
+        ),
+    ),
+}
+
+# UberEats section-hour templates as (day_range, start minute, end minute); end <= start runs past midnight
+HOURS_TEMPLATES: Sequence[Sequence[Tuple[str, int, int]]] = (
+    (("Monday - Friday", 690, 840), ("Monday - Friday", 1050, 1320), ("Saturday - Sunday", 1050, 1380)),
+    (("Every day", 660, 1320),),
+    (("Monday - Wednesday", 1080, 1440), ("Thursday - Saturday", 1080, 180), ("Sunday", 1080, 1380)),
+    (("Tuesday - Sunday", 720, 1350),),
+    (("Mon, Tue, Thu", 1020, 1290), ("Fri, Sat", 1020, 120)),
+)
+
+PLATFORM_SHARE = {"takeaway": 0.75, "ubereats": 0.45, "deliveroo": 0.4}
+CITY_ZIPF = 1.1
+CHAIN_SHARE = 0.25  # restaurants that belong to a chain brand
+CHAIN_ZIPF = 1.3
+NAME_NOISE_SHARE = 0.3  # UberEats / Deliveroo listings named differently than the base restaurant
+LONG_DESCRIPTION_SHARE = 0.02
+BAD_UTF8_SHARE = 0.001
+# PRAGMA application_id of generated files ("DMA1"); other files are never overwritten
+APPLICATION_ID = 0x444D4131
+
+_SYLLABLES = ("ba", "lo", "mi", "ra", "ne", "to", "ka", "vi", "do", "se", "lu", "pe", "zo", "ri", "ma", "no")
+
+
+def _zipf(rng: np.random.Generator, n_values: int, size: int, s: float) -> np.ndarray:
+    """Indices in [0, n_values) with P(i) proportional to 1 / (i + 1) ** s."""
+    p = 1.0 / np.arange(1, n_values + 1) ** s
+    return rng.choice(n_values, size, p=p / p.sum())
+
+
+def _frame(rng: np.random.Generator, restaurants: int) -> pd.DataFrame:
+    """Base restaurants (one row per real-world restaurant) with their platform listings."""
+    n = int(restaurants)
+    cuisine_names = list(CUISINES)
+    words = np.array([w for c in cuisine_names for w in CUISINES[c][0]], dtype=object)
+    surnames = np.array([(a + b + c).title() for a in _SYLLABLES for b in _SYLLABLES for c in _SYLLABLES], dtype=object)
+
+    # independents: a cuisine word plus a made-up surname
+    cuisine = rng.integers(0, len(cuisine_names), n)
+    name = words[cuisine * 4 + rng.integers(0, 4, n)] + " " + surnames[rng.integers(0, len(surnames), n)]
+
+    # chains: brands drawn Zipf; the largest brands are the bare name words ("Pizza Uno")
+    n_chains = max(len(words), n // 500)
+    chain_word = np.arange(n_chains) % len(words)
+    chain_name = words[chain_word].copy()
+    chain_name[len(words) :] += " " + surnames[rng.integers(0, len(surnames), n_chains - len(words))]
+    in_chain = rng.random(n) < CHAIN_SHARE
+    brand = _zipf(rng, n_chains, int(in_chain.sum()), CHAIN_ZIPF)
+    name[in_chain] = chain_name[brand]
+    cuisine[in_chain] = chain_word[brand] // 4
+
+    city = _zipf(rng, len(CITIES), n, CITY_ZIPF)
+    city_lat = np.array([c[1] for c in CITIES])
+    city_lon = np.array([c[2] for c in CITIES])
+
+    listed = {p: rng.random(n) < share for p, share in PLATFORM_SHARE.items()}
+    listed["takeaway"] |= ~(listed["ubereats"] | listed["deliveroo"])
+    return pd.DataFrame(
+        {
+            "base_id": np.arange(n),
+            "name": name,
+            "cuisine": np.array(cuisine_names, dtype=object)[cuisine],
+            "city": np.array([c[0] for c in CITIES], dtype=object)[city],
+            "postal_code": np.array([c[3] for c in CITIES], dtype=object)[city],
+            "latitude": city_lat[city] + rng.normal(0, 0.02, n),
+            "longitude": city_lon[city] + rng.normal(0, 0.03, n),
+            **{f"on_{p}": v for p, v in listed.items()},
+        }
+    )
+
+
+def _noisy(rng: np.random.Generator, names: pd.Series, cities: pd.Series) -> pd.Series:
+    """The same restaurant as typed on another platform: case, a city suffix, a dropped letter, dashes."""
+    out = names.copy()
+    op = np.where(rng.random(len(names)) < NAME_NOISE_SHARE, rng.integers(0, 5, len(names)), -1)
+    variants = (
+        lambda s, c: s.str.upper(),
+        lambda s, c: s.str.lower(),
+        lambda s, c: s + " - " + c,
+        lambda s, c: s.str[:-1],
+        lambda s, c: s.str.replace(" ", "-", regex=False),
+    )
+    for i, variant in enumerate(variants):
+        m = op == i
+        out[m] = variant(names[m], cities[m])
+    return out
+
+
+def _bad_utf8(rng: np.random.Generator, values: np.ndarray) -> np.ndarray:
+    """Replace a few strings by bytes ending in an invalid UTF-8 sequence, as in scraped dumps."""
+    values = np.array(values, dtype=object)
+    for i in np.flatnonzero(rng.random(len(values)) < BAD_UTF8_SHARE):
+        values[i] = str(values[i]).encode("utf-8") + b" \xc3\x28\xff"
+    return values
+
+
+def _menu(rng: np.random.Generator, keys: np.ndarray, cuisines: np.ndarray, per_restaurant: int) -> pd.DataFrame:
+    counts = np.maximum(rng.poisson(per_restaurant, len(keys)), 1)
+    owner = np.repeat(np.arange(len(keys)), counts)
+    table = [(c, d) for c in CUISINES for d in range(4)]
+    first = {c: 4 * i for i, c in enumerate(CUISINES)}
+    flat = pd.Series(cuisines).map(first).to_numpy(dtype=np.int64)[owner] + rng.integers(0, 4, len(owner))
+    name = np.array([CUISINES[c][1][d][0] for c, d in table], dtype=object)[flat]
+    desc = pd.Series(np.array([CUISINES[c][1][d][1] for c, d in table], dtype=object)[flat])
+    base = np.array([CUISINES[c][1][d][2] for c, d in table])[flat]
+
+    # some menus paste whole ingredient and allergen lists into the description
+    long = np.flatnonzero(rng.random(len(owner)) < LONG_DESCRIPTION_SHARE)
+    reps = rng.integers(10, 80, len(long))
+    desc.iloc[long] = (desc.iloc[long] + ". Allergens: gluten, milk, egg, soy. ").str.repeat(reps).to_numpy()
+    return pd.DataFrame(
+        {
+            "restaurant_key": keys[owner],
+            "item_no": np.arange(len(owner)),
+            "name": _bad_utf8(rng, name),
+            "description": _bad_utf8(rng, desc.to_numpy()),
+            "price": np.round(base * rng.lognormal(0, 0.15, len(owner)), 2),
+        }
+    )
+
+
+def _hours(rng: np.random.Generator, keys: np.ndarray) -> pd.DataFrame:
+    """Section hours: one template of HOURS_TEMPLATES per restaurant, closing times jittered."""
+    rows = [r for t in HOURS_TEMPLATES for r in t]
+    sizes = np.array([len(t) for t in HOURS_TEMPLATES])
+    first = np.cumsum(sizes) - sizes
+    template = rng.integers(0, len(HOURS_TEMPLATES), len(keys))
+    n_rows = sizes[template]
+    owner = np.repeat(np.arange(len(keys)), n_rows)
+    # position of each row within its restaurant's template
+    offset = np.arange(len(owner)) - np.repeat(np.cumsum(n_rows) - n_rows, n_rows)
+    flat = first[template][owner] + offset
+    end = np.array([r[2] for r in rows])[flat] + rng.choice([-30, -15, 0, 0, 15, 30], len(owner))
+    return pd.DataFrame(
+        {
+            "restaurant_id": keys[owner],
+            "day_range": np.array([r[0] for r in rows], dtype=object)[flat],
+            "start_time": np.array([r[1] for r in rows])[flat],
+            "end_time": np.clip(end, 0, 1440),
+        }
+    )
+
+
+def _write(con: sqlite3.Connection, table: str, df: pd.DataFrame) -> int:
+    cols = ", ".join(f'"{c}"' for c in df.columns)
+    con.execute(f'CREATE TABLE "{table}" ({cols});')
+    # CAST keeps bytes values as (possibly invalid) TEXT instead of BLOB
+    marks = ", ".join("?" if pd.api.types.is_numeric_dtype(df[c]) else "CAST(? AS TEXT)" for c in df.columns)
+    con.executemany(f'INSERT INTO "{table}" VALUES ({marks});', zip(*(df[c].tolist() for c in df.columns)))
+    return len(df)
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    if path.exists():
+        con = sqlite3.connect(path.as_posix())
+        app_id = con.execute("PRAGMA application_id;").fetchone()[0]
+        con.close()
+        if app_id != APPLICATION_ID:
+            raise FileExistsError(f"{path} was not generated by synthetic.write_raw; not overwriting it")
+        path.unlink()
+    con = sqlite3.connect(path.as_posix())
+    con.execute(f"PRAGMA application_id = {APPLICATION_ID};")
+    con.execute("PRAGMA journal_mode=OFF;")
+    con.execute("PRAGMA synchronous=OFF;")
+    return con
+
+
+def _takeaway(con: sqlite3.Connection, rng: np.random.Generator, t: pd.DataFrame, items_per_restaurant: int) -> int:
+    """Takeaway: restaurants + locations (via a link table) + menuItems + categories."""
+    n = 0
+    slug = (t["name"].str.lower().str.replace(" ", "-", regex=False) + "-" + t["base_id"].astype(str)).to_numpy()
+    cats = list(CUISINES)
+    items = _menu(rng, slug, t["cuisine"].to_numpy(), items_per_restaurant)
+    n += _write(
+        con,
+        "restaurants",
+        pd.DataFrame(
+            {
+                "restaurant_id": np.arange(len(t)),
+                "primarySlug": slug,
+                "name": _bad_utf8(rng, t["name"]),
+                "address": "Kerkstraat " + (t["base_id"] % 200 + 1).astype(str),
+                "city": t["city"],
+                "latitude": t["latitude"].round(6),
+                "longitude": t["longitude"].round(6),
+                "ratings": np.round(rng.uniform(3, 5, len(t)), 1),
+                "ratingsNumber": rng.integers(0, 1000, len(t)),
+                "deliveryFee": np.round(rng.uniform(0, 4, len(t)), 2),
+                "minOrder": rng.choice([10, 15, 20], len(t)),
+            }
+        ),
+    )
+    n += _write(
+        con,
+        "locations",
+        pd.DataFrame(
+            {
+                "ID": np.arange(len(t)),
+                "postalCode": t["postal_code"],
+                "city": t["city"],
+                "latitude": t["latitude"].round(6),
+                "longitude": t["longitude"].round(6),
+            }
+        ),
+    )
+    n += _write(con, "locations_to_restaurants", pd.DataFrame({"restaurant_id": np.arange(len(t)), "location_id": np.arange(len(t))}))
+    n += _write(
+        con,
+        "menuItems",
+        pd.DataFrame(
+            {
+                "ID": items["item_no"],
+                "primarySlug": items["restaurant_key"],
+                "name": items["name"],
+                "description": items["description"],
+                "price": items["price"],
+            }
+        ),
+    )
+    n += _write(con, "categories", pd.DataFrame({"id": np.arange(len(cats)), "name": cats}))
+    n += _write(
+        con,
+        "categories_restaurants",
+        pd.DataFrame({"category_id": t["cuisine"].map({c: i for i, c in enumerate(cats)}), "restaurant_id": np.arange(len(t))}),
+    )
+    return n
+
+
+def _deliveroo(con: sqlite3.Connection, rng: np.random.Generator, d: pd.DataFrame, items_per_restaurant: int) -> int:
+    """Deliveroo: restaurants without a city, menu_items, categories."""
+    n = 0
+    keys = d["base_id"].to_numpy()
+    items = _menu(rng, keys, d["cuisine"].to_numpy(), items_per_restaurant)
+    n += _write(
+        con,
+        "restaurants",
+        pd.DataFrame(
+            {
+                "id": keys,
+                "name": _noisy(rng, d["name"], d["city"]),
+                "address": "Rue de la Station " + (d["base_id"] % 150 + 1).astype(str),
+                "postal_code": d["postal_code"],
+                "latitude": (d["latitude"] + rng.normal(0, 1e-4, len(d))).round(6),
+                "longitude": (d["longitude"] + rng.normal(0, 1e-4, len(d))).round(6),
+                "rating": np.round(rng.uniform(3, 5, len(d)), 1),
+                "rating_number": rng.integers(0, 1000, len(d)),
+                "delivery_fee": np.round(rng.uniform(1, 4, len(d)), 2),
+                "min_order": rng.choice([10, 15, 20], len(d)),
+            }
+        ),
+    )
+    n += _write(
+        con,
+        "menu_items",
+        pd.DataFrame(
+            {
+                "id": items["item_no"],
+                "restaurant_id": items["restaurant_key"],
+                "name": items["name"],
+                "description": items["description"],
+                "price": items["price"],
+            }
+        ),
+    )
+    n += _write(con, "categories", pd.DataFrame({"restaurant_id": keys, "name": d["cuisine"]}))
+    return n
+
+
+def _ubereats(con: sqlite3.Connection, rng: np.random.Generator, u: pd.DataFrame, items_per_restaurant: int) -> int:
+    """UberEats: location__* / rating__* columns, categories, section hours in minutes."""
+    n = 0
+    keys = u["base_id"].to_numpy()
+    items = _menu(rng, keys, u["cuisine"].to_numpy(), items_per_restaurant)
+    n += _write(
+        con,
+        "restaurants",
+        pd.DataFrame(
+            {
+                "id": keys,
+                "title": _noisy(rng, u["name"], u["city"]),
+                "location__address": "Grote Markt " + (u["base_id"] % 100 + 1).astype(str),
+                "location__city": u["city"],
+                "location__postal_code": u["postal_code"],
+                "location__latitude": (u["latitude"] + rng.normal(0, 1e-4, len(u))).round(6),
+                "location__longitude": (u["longitude"] + rng.normal(0, 1e-4, len(u))).round(6),
+                "rating__rating_value": np.round(rng.uniform(3, 5, len(u)), 1),
+                "rating__review_count": rng.integers(0, 1000, len(u)),
+            }
+        ),
+    )
+    n += _write(
+        con,
+        "menu_items",
+        pd.DataFrame(
+            {
+                "id": items["item_no"],
+                "restaurant_id": items["restaurant_key"],
+                "name": items["name"],
+                "description": items["description"],
+                "price": items["price"],
+            }
+        ),
+    )
+    n += _write(con, "restaurant_to_categories", pd.DataFrame({"restaurant_id": keys, "category": u["cuisine"]}))
+    n += _write(con, "restaurant_hours_to_section_hours", _hours(rng, keys))
+    return n
+
+
+_WRITERS = {"takeaway": _takeaway, "ubereats": _ubereats, "deliveroo": _deliveroo}
+
+
+def _write_platform(raw_dir: Path, platform: str, restaurants: int, items_per_restaurant: int, seed: int) -> int:
+    # every process rebuilds the same base restaurants; listings draw from their own stream
+    base = _frame(np.random.default_rng(seed), restaurants)
+    rng = np.random.default_rng([seed, list(_WRITERS).index(platform)])
+    con = _connect(raw_dir / f"{platform}.db")
+    n = _WRITERS[platform](con, rng, base[base[f"on_{platform}"]].reset_index(drop=True), items_per_restaurant)
+    con.commit()
+    con.close()
+    return n
+
+
+def write_raw(
+    raw_dir: Path,
+    restaurants: int = 1_000,
+    items_per_restaurant: int = 8,
+    seed: int = 0,
+    jobs: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Write takeaway.db, ubereats.db and deliveroo.db into raw_dir in each
+    platform's native schema (the tables the semantic SQL reads), generated
+    from `restaurants` base restaurants of which many are listed on several
+    platforms. Cities and chain brands are Zipf-distributed, duplicate
+    listings carry name and coordinate noise, a few descriptions are very long
+    and a few strings are invalid UTF-8. The same seed gives the same files.
+    Files are written on `jobs` processes (default: one per CPU, at most
+    three). Returns rows per file.
+    """
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    args = [(raw_dir, p, int(restaurants), int(items_per_restaurant), int(seed)) for p in _WRITERS]
+    jobs = min(len(args), jobs or os.cpu_count() or 1)
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            counts = list(pool.map(_write_platform, *zip(*args)))
+    else:
+        counts = [_write_platform(*a) for a in args]
+    return dict(zip(_WRITERS, counts))
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis import autocomplete
+from delivery_market_analysis.autocomplete import PrefixIndex, load_index, normalize, suggest
+from delivery_market_analysis.demo import create_demo_db
+
+
+def test_normalize_matches_sql() -> None:
+    con = duckdb.connect()
+    for text in ["Crème Brûlée (1 pc)", "  Pizza-Margherita!! ", "Kapsalon XL"]:
+        sql = autocomplete.NORMALIZE_SQL.format(col="$t")
+        assert normalize(text) == con.execute(f"SELECT {sql}", {"t": text}).fetchone()[0]
+
+
+def test_suggest_ranks_by_frequency_and_matches_word_starts() -> None:
+    index = PrefixIndex(
+        ["kapsalon", "kapsalon kip", "mini kapsalon", "kebab", "pizza"],
+        ["kapsalon", "kapsalon kip", "mini kapsalon", "kebab", "pizza"],
+        [50, 10, 20, 99, 5],
+    )
+    assert index.suggest("KAP") == [("kapsalon", 50), ("mini kapsalon", 20), ("kapsalon kip", 10)]
+    assert index.suggest("k", 2) == [("kebab", 99), ("kapsalon", 50)]
+    assert index.suggest("kapsalon k") == [("kapsalon kip", 10)]
+    assert index.suggest("zzz") == []
+    assert index.suggest("") == []
+
+
+def test_precomputed_prefixes_agree_with_scan(monkeypatch) -> None:
+    keys = [f"{a}{b} {c}" for a in "abc" for b in "xyz" for c in ("one", "two", "three")]
+    freqs = list(range(len(keys)))
+    scanned = PrefixIndex(keys, keys, freqs)
+    monkeypatch.setattr(autocomplete, "SCAN_LIMIT", 2)
+    cached = PrefixIndex(keys, keys, freqs)
+    assert cached._top and not scanned._top
+    for prefix in ["a", "ax", "ax ", "t", "th", "thr", "o"]:
+        assert cached.suggest(prefix, 5) == scanned.suggest(prefix, 5)
+
+
+@pytest.fixture()
+def con(tmp_path: Path):
+    db = tmp_path / "analytics.duckdb"
+    create_demo_db(db)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    yield con
+    con.close()
+
+
+def test_suggest_from_database(con) -> None:
+    assert suggest(con, "item", "Kaps") == [("kapsalon", 1)]
+    assert suggest(con, "restaurant", "house") == [("Hummus House", 1)]
+    assert suggest(con, "city", "gh") == [("Ghent", 1)]
+    assert load_index(con, "city") is load_index(con, "city")
+    with pytest.raises(ValueError):
+        load_index(con, "postcode")
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import pytest
+
+from delivery_market_analysis.bench import PAGE_QUERIES, SCANNED_VIEWS, compare, run_bench
+
+
+def _run(**metrics):
+    return {"meta": {}, "metrics": {k: {"value": v, "unit": u} for k, (v, u) in metrics.items()}}
+
+
+def test_compare_flags_slower_times_and_lower_throughput() -> None:
+    base = _run(q=(1.0, "s"), fast=(0.001, "s"), rate=(1000.0, "rows/s"), gone=(1.0, "s"))
+    cur = _run(q=(1.5, "s"), fast=(0.003, "s"), rate=(700.0, "rows/s"), new=(1.0, "s"))
+    diff = compare(base, cur, threshold=0.2).set_index("metric")
+
+    assert list(diff.index) == ["q", "fast", "rate"]
+    assert diff.loc["q", "slowdown"] == pytest.approx(0.5)
+    assert diff.loc["rate", "slowdown"] == pytest.approx(1000 / 700 - 1)
+    assert diff["regression"].to_dict() == {"q": True, "fast": False, "rate": True}
+    assert not compare(base, base)["regression"].any()
+
+
+def test_bench_runs_offline_on_generated_data(tmp_path: Path) -> None:
+    result = run_bench(scale=60, repeat=1, suites=("ingest", "scan", "stages", "queries"), workdir=tmp_path)
+    metrics = result["metrics"]
+
+    assert result["meta"]["scale"] == 60 and result["meta"]["raw_rows"] > 60
+    assert metrics["ingest.rows_per_s"]["unit"] == "rows/s"
+    assert {"stage.matching", "stage.item_matching"} <= set(metrics)
+    assert {f"scan.{v}" for v in SCANNED_VIEWS} <= set(metrics)
+    assert {f"query.{q}" for q in PAGE_QUERIES} <= set(metrics)
+    assert all(m["value"] >= 0 for m in metrics.values())
+
+    with pytest.raises(ValueError):
+        run_bench(scale=10, suites=("nope",), workdir=tmp_path)
@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis.chains import brand_key, build_chains, chain_summary, top_chains
+from delivery_market_analysis.demo import create_demo_db
+
+
+@pytest.fixture()
+def con(tmp_path: Path):
+    db = tmp_path / "analytics.duckdb"
+    create_demo_db(db)
+    build_chains(db)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    yield con
+    con.close()
+
+
+def test_brand_key_normalizes_and_falls_back() -> None:
+    assert brand_key("  McDonald's ") == brand_key("mcdonald s")
+    assert brand_key("Restaurant") == "restaurant"
+    assert brand_key(None) == ""
+
+
+def test_summary_covers_every_restaurant(con) -> None:
+    total = con.execute("SELECT COUNT(*) FROM stg_restaurants WHERE restaurant_name IS NOT NULL").fetchone()[0]
+    for threshold in (1, 2, 3):
+        summary = chain_summary(con, threshold)
+        assert int(summary["rows"].sum()) == total
+    everyone = chain_summary(con, 1)
+    assert everyone["group_tag"].tolist() == ["chain"]
+
+
+def test_restaurant_with_several_locations_counts_once_per_row(tmp_path: Path) -> None:
+    db = tmp_path / "analytics.duckdb"
+    create_demo_db(db)
+    con = duckdb.connect(db.as_posix())
+    # a second location row of r1 under the same (platform, restaurant_key)
+    con.execute(
+        "INSERT INTO demo.stg_restaurants "
+        "VALUES ('takeaway','r1','Pizza Uno','Antwerp',51.2000,4.4100,3.4,30,1.99)"
+    )
+    con.close()
+    build_chains(db)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    brand = con.execute(
+        "SELECT rows_total, rating_n, avg_rating, avg_delivery_fee FROM chain_brands WHERE display_name = 'Pizza Uno'"
+    ).fetchone()
+    assert brand[:2] == (2, 2)
+    assert brand[2] == pytest.approx(3.9) and brand[3] == pytest.approx(2.49)
+    assert int(chain_summary(con, 1)["rows"].sum()) == 4
+    con.close()
+
+
+def test_top_chains_respects_threshold(con) -> None:
+    chains = top_chains(con, 2)
+    assert (chains["cities"] >= 2).all()
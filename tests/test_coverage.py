@@ -0,0 +1,30 @@
+import numpy as np
+
+from delivery_market_analysis.coverage import make_raster, nearest_distance, window_sum
+
+
+def test_nearest_distance_matches_brute_force() -> None:
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(50.5, 51.0, 300)
+    lon = rng.uniform(3.5, 4.5, 300)
+    raster = make_raster(lat, lon, res_km=0.5, pad_km=5.0)
+    x, y = raster.to_km(lat, lon)
+
+    dist = nearest_distance(raster, x, y)
+
+    cx = (np.arange(raster.cols) + 0.5) * raster.res_km
+    cy = (np.arange(raster.rows) + 0.5) * raster.res_km
+    gx, gy = np.meshgrid(cx, cy)
+    brute = np.sqrt((gx[..., None] - x) ** 2 + (gy[..., None] - y) ** 2).min(axis=-1)
+    # exact up to the one-seed-per-cell simplification
+    assert np.all(dist >= brute - 1e-9)
+    assert np.all(dist - brute <= raster.res_km * np.sqrt(2))
+    assert np.mean(dist - brute) < 0.01
+
+
+def test_window_sum_matches_naive() -> None:
+    counts = np.random.default_rng(1).integers(0, 3, size=(7, 9))
+    got = window_sum(counts, 1)
+    padded = np.pad(counts, 1)
+    naive = sum(padded[1 + dy:8 + dy, 1 + dx:10 + dx] for dy in (-1, 0, 1) for dx in (-1, 0, 1))
+    assert (got == naive).all()
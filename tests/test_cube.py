@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis.cube import price_stats, restaurant_stats
+from delivery_market_analysis.demo import create_demo_db
+from delivery_market_analysis.queries import Filters
+
+
+@pytest.fixture()
+def con(tmp_path: Path):
+    db = tmp_path / "analytics.duckdb"
+    create_demo_db(db)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    yield con
+    con.close()
+
+
+def test_restaurant_rollup_matches_base_view(con) -> None:
+    cube = restaurant_stats(con, by=("platform",)).set_index("platform").sort_index()
+    base = con.execute(
+        "SELECT platform, COUNT(*) AS n, AVG(rating_value) AS r FROM stg_restaurants GROUP BY 1"
+    ).df().set_index("platform").sort_index()
+    assert (cube["restaurant_count"] == base["n"]).all()
+    assert cube["avg_rating"].round(6).equals(base["r"].round(6))
+
+
+def test_price_rollup_overall_and_filtered(con) -> None:
+    overall = price_stats(con, by=(), quantiles=(0.5,)).iloc[0]
+    assert overall["price_n"] == 3
+    assert overall["avg_price"] == pytest.approx((10.0 + 9.5 + 8.0) / 3)
+    assert overall["p50"] == pytest.approx(9.5, rel=0.01)
+
+    one = price_stats(con, by=("platform",), filters=Filters(platform="takeaway"))
+    assert list(one["platform"]) == ["takeaway"]
+    assert one["p50"].iloc[0] == pytest.approx(10.0, rel=0.01)
+
+
+def test_rollup_rejects_unknown_dimension(con) -> None:
+    with pytest.raises(ValueError):
+        restaurant_stats(con, by=("category_name",))
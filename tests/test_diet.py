@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis.cube import build_cube
+from delivery_market_analysis.diet import build_diet, diet_by_city, tag_bits
+
+
+@pytest.fixture()
+def con(tmp_path: Path):
+    db = tmp_path / "analytics.duckdb"
+    con = duckdb.connect(db.as_posix())
+    con.execute(
+        """
+        CREATE TABLE stg_restaurants AS
+        SELECT * FROM (VALUES
+          ('takeaway','r1','A','Gent',51.05,3.72,4.0,10,2.0),
+          ('takeaway','r2','B','Gent',51.05,3.72,4.0,10,2.0),
+          ('ubereats','r3','C','Brussel',50.85,4.35,4.0,10,2.0)
+        ) t(platform, restaurant_key, restaurant_name, city, latitude, longitude, rating_value, rating_count, delivery_fee);
+        """
+    )
+    con.execute(
+        """
+        CREATE TABLE stg_menu_items AS
+        SELECT * FROM (VALUES
+          ('takeaway','r1','i1','Burger Végétarien',NULL,9.0,CAST(NULL AS VARCHAR)),
+          ('takeaway','r1','i2','Bowl','100% plant-based, glutenvrij',11.0,NULL),
+          ('takeaway','r1','i5','Veggieburger',NULL,8.0,NULL),
+          ('takeaway','r1','i6','Vegaschotel','met rijst',10.0,NULL),
+          ('takeaway','r1','i7','Las Vegas burger','with bacon',12.0,NULL),
+          ('takeaway','r2','i3','Vegetable soup','with beef stock',5.0,NULL),
+          ('ubereats','r3','i4','Pizza','Gluten free base',12.0,NULL)
+        ) t(platform, restaurant_key, item_key, item_name, description, price, category_name);
+        """
+    )
+    con.execute("CREATE VIEW vw_menu_items_clean AS SELECT * FROM stg_menu_items WHERE price > 0;")
+    con.close()
+    build_cube(db)
+    build_diet(db)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    yield con
+    con.close()
+
+
+def test_items_tagged_across_languages(con) -> None:
+    masks = dict(con.execute("SELECT item_key, diet_mask FROM diet_items").fetchall())
+    assert masks["i1"] == tag_bits(["vegetarian"])
+    assert masks["i2"] == tag_bits(["vegan", "vegetarian", "gluten_free"])
+    assert masks["i4"] == tag_bits(["gluten_free"])
+    assert masks["i5"] == masks["i6"] == tag_bits(["vegetarian"])  # Dutch compounds
+    assert "i3" not in masks  # "vegetable" is not "vegetar..."
+    assert "i7" not in masks  # "vegas" is not "vega"
+
+
+def test_city_rollup_counts_untagged_restaurants(con) -> None:
+    df = diet_by_city(con, ("vegetarian", "vegan", "gluten_free")).set_index("city")
+    assert df.loc["Gent", "restaurants_total"] == 2
+    assert df.loc["Gent", "restaurants_with_vegetarian"] == 1
+    assert df.loc["Gent", "restaurants_with_vegan"] == 1
+    assert df.loc["Brussel", "restaurants_with_gluten_free"] == 1
+    assert diet_by_city(con, platform="ubereats")["restaurants_with_vegan"].sum() == 0
@@ -0,0 +1,147 @@
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pytest
+
+from delivery_market_analysis.geo import (
+    GRID_LEVELS,
+    aggregate_points,
+    build_grid,
+    cell_id,
+    cell_ranges,
+    grid_cells,
+    grid_deck,
+    restaurants_in_bbox,
+    restaurants_near,
+    zoom_to_level,
+)
+
+
+def _macros() -> list[str]:
+    lines = Path("sql/90_views_semantic.sql").read_text(encoding="utf-8").splitlines()
+    sql = "\n".join(line for line in lines if not line.lstrip().startswith("--"))
+    return [s for s in sql.split(";") if s.strip().startswith("CREATE OR REPLACE MACRO")]
+
+
+@pytest.fixture()
+def con():
+    con = duckdb.connect()
+    for stmt in _macros():
+        con.execute(stmt)
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(50.7, 51.3, 2000)
+    lon = rng.uniform(3.0, 5.0, 2000)
+    con.execute(
+        """
+        CREATE TABLE stg_restaurants_geo AS
+        SELECT cell_id(latitude, longitude) AS cell_id, *
+        FROM (SELECT UNNEST($lat) AS latitude, UNNEST($lon) AS longitude, 'takeaway' AS platform)
+        ORDER BY cell_id
+        """,
+        {"lat": lat.tolist(), "lon": lon.tolist()},
+    )
+    yield con
+    con.close()
+
+
+def test_python_cell_id_matches_sql_macro(con) -> None:
+    df = con.execute("SELECT cell_id, latitude, longitude FROM stg_restaurants_geo").df()
+    assert (cell_id(df["latitude"], df["longitude"]) == df["cell_id"]).all()
+
+
+def test_cell_ranges_cover_bbox() -> None:
+    bbox = (50.8, 4.3, 50.9, 4.45)
+    lat = np.random.default_rng(1).uniform(bbox[0], bbox[2], 500)
+    lon = np.random.default_rng(2).uniform(bbox[1], bbox[3], 500)
+    ids = cell_id(lat, lon)
+    ranges = cell_ranges(bbox, max_cells=16)
+    assert all(any(lo <= i <= hi for lo, hi in ranges) for i in ids)
+
+
+def test_bbox_and_radius_lookups_match_brute_force(con) -> None:
+    df = con.execute("SELECT latitude, longitude FROM stg_restaurants_geo").df()
+
+    bbox = (50.9, 3.5, 51.0, 3.9)
+    hits = restaurants_in_bbox(con, bbox)
+    expected = df["latitude"].between(bbox[0], bbox[2]) & df["longitude"].between(bbox[1], bbox[3])
+    assert len(hits) == int(expected.sum())
+
+    near = restaurants_near(con, 51.0, 4.0, 5.0)
+    dlat = np.radians(df["latitude"] - 51.0)
+    dlon = np.radians(df["longitude"] - 4.0)
+    a = np.sin(dlat / 2) ** 2 + np.cos(np.radians(51.0)) * np.cos(np.radians(df["latitude"])) * np.sin(dlon / 2) ** 2
+    dist = 2 * 6371.0 * np.arcsin(np.sqrt(a))
+    assert len(near) == int((dist <= 5.0).sum())
+    assert near["distance_km"].is_monotonic_increasing
+
+
+def test_aggregate_points_bounds_payload(con) -> None:
+    cells = aggregate_points(con, "SELECT latitude, longitude FROM stg_restaurants_geo", max_cells=50)
+    assert 0 < len(cells) <= 50
+    assert cells["restaurant_count"].sum() == 2000
+
+
+@pytest.fixture()
+def grid(tmp_path: Path):
+    db = tmp_path / "analytics.duckdb"
+    con = duckdb.connect(db.as_posix())
+    rng = np.random.default_rng(3)
+    con.execute(
+        """
+        CREATE TABLE stg_restaurants AS
+        SELECT * FROM (
+          SELECT
+            UNNEST($lat) AS latitude,
+            UNNEST($lon) AS longitude,
+            UNNEST($rating) AS rating_value,
+            10 AS rating_count,
+            UNNEST($platform) AS platform
+        )
+        """,
+        {
+            "lat": rng.uniform(50.7, 51.3, 3000).tolist(),
+            "lon": rng.uniform(3.0, 5.0, 3000).tolist(),
+            "rating": rng.uniform(1, 5, 3000).tolist(),
+            "platform": rng.choice(["takeaway", "ubereats"], 3000).tolist(),
+        },
+    )
+    con.close()
+    build_grid(db)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    yield con
+    con.close()
+
+
+def test_grid_cells_add_up_at_every_level(grid) -> None:
+    per_platform = dict(grid.execute("SELECT platform, COUNT(*) FROM stg_restaurants GROUP BY 1").fetchall())
+    for level in GRID_LEVELS:
+        cells = grid_cells(grid, max_cells=10**6, max_level=level)
+        assert cells["level"].unique().tolist() == [level]
+        assert cells["restaurant_count"].sum() == 3000
+        assert not cells.duplicated(["cell_x", "cell_y"]).any()
+        takeaway = grid_cells(grid, platform="takeaway", max_cells=10**6, max_level=level)
+        assert takeaway["restaurant_count"].sum() == per_platform["takeaway"]
+
+
+def test_grid_payload_stays_bounded_as_zoom_increases(grid) -> None:
+    assert zoom_to_level(0) == GRID_LEVELS[0] and zoom_to_level(30) == GRID_LEVELS[-1]
+    levels = []
+    for zoom in range(4, 20):
+        cells = grid_cells(grid, max_cells=200, max_level=zoom_to_level(zoom))
+        assert 0 < len(cells) <= 200
+        assert cells["restaurant_count"].sum() == 3000  # coarser cells rather than dropped ones
+        levels.append(int(cells["level"].iloc[0]))
+    assert levels == sorted(levels) and levels[-1] < zoom_to_level(19)
+
+    deck = grid_deck(cells, zoom=12)
+    assert len(deck.layers[0].data) == len(cells)
+
+
+def test_empty_results_keep_their_columns(con, grid) -> None:
+    none = aggregate_points(
+        con, "SELECT latitude, longitude, 1.0 AS price FROM stg_restaurants_geo WHERE latitude > 90", value="price"
+    )
+    assert none.empty and {"restaurant_count", "avg_value", "min_lat", "max_lon"} <= set(none.columns)
+    cells = grid_cells(grid, platform="deliveroo")
+    assert cells.empty and {"restaurant_count", "avg_rating", "min_lat", "max_lon"} <= set(cells.columns)
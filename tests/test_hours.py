@@ -0,0 +1,85 @@
+import duckdb
+import numpy as np
+
+from delivery_market_analysis.hours import (
+    OPEN_ORDER,
+    SLOTS_PER_DAY,
+    WEEK_SLOTS,
+    open_after_mask,
+    open_at_mask,
+    parse_days,
+    restaurants_open,
+    restaurants_open_query,
+    week_bitmap,
+    window_mask,
+)
+from delivery_market_analysis.queries import page
+
+
+def test_parse_days() -> None:
+    assert parse_days("Monday - Friday").tolist() == [True] * 5 + [False] * 2
+    assert parse_days("Sat, Sun").tolist() == [False] * 5 + [True] * 2
+    assert parse_days("Friday - Monday").tolist() == [True, False, False, False, True, True, True]
+    assert parse_days(None).all()
+
+
+def test_week_bitmap_handles_overnight_and_sunday_wrap() -> None:
+    days = np.array([parse_days("Friday"), parse_days("Sunday")])
+    bits = week_bitmap(
+        owner=np.array([0, 1]),
+        day_masks=days,
+        start_min=np.array([18 * 60, 20 * 60]),
+        end_min=np.array([2 * 60, 1 * 60 + 10]),  # 02:00 / 01:10 next day
+        n_owners=2,
+    )
+    fri, sat, mon = 4 * SLOTS_PER_DAY, 5 * SLOTS_PER_DAY, 0
+    assert bits[0, fri + 18 * 4] and bits[0, sat + 7] and not bits[0, sat + 8]
+    # Sunday night spills into Monday morning; 01:10 keeps the 01:00 slot open
+    assert bits[1, mon + 4] and not bits[1, mon + 5]
+    assert bits[1].sum() == 4 * 4 + 5
+
+
+def test_masks_select_expected_slots() -> None:
+    assert window_mask(0, "00:00").index("1") == 0
+    after = open_after_mask(6, "23:00")
+    assert len(after) == WEEK_SLOTS
+    assert after.count("1") == 4 and after.endswith("1111")
+
+
+def test_open_listing_has_one_row_per_restaurant_and_pages_completely() -> None:
+    con = duckdb.connect()
+    # u1 has two location rows; all restaurants share the same sort values
+    con.execute(
+        """
+        CREATE TABLE stg_restaurants AS
+        SELECT * FROM (VALUES
+          ('ubereats','u1','A','Gent',51.05,3.72),
+          ('ubereats','u1','A','Gent',51.06,3.73),
+          ('ubereats','u2','B','Gent',51.05,3.72),
+          ('ubereats','u3','C','Brussel',50.85,4.35)
+        ) t(platform, restaurant_key, restaurant_name, city, latitude, longitude)
+        """
+    )
+    con.execute(
+        """
+        CREATE TABLE hours_weekly AS
+        SELECT 'ubereats' AS platform, k AS restaurant_key, CAST($bits AS BIT) AS week_bits,
+               1 AS open_slots, TIME '23:00' AS latest_end
+        FROM (SELECT UNNEST(['u1', 'u2', 'u3']) AS k)
+        """,
+        {"bits": open_at_mask(0, "12:00")},
+    )
+    mask = open_at_mask(0, "12:00")
+    assert restaurants_open(con, mask)["restaurant_key"].tolist() == ["u1", "u2", "u3"]
+    assert restaurants_open(con, mask, city="gent")["restaurant_key"].tolist() == ["u1", "u2"]
+    assert restaurants_open(con, mask, limit=0).empty
+
+    sql, params = restaurants_open_query(mask)
+    seen, after = [], None
+    while True:
+        listing = page(con, sql, OPEN_ORDER, params, after=after, size=1)
+        seen += listing.rows["restaurant_key"].tolist()
+        if listing.after is None:
+            break
+        after = listing.after
+    assert seen == ["u1", "u2", "u3"]
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis import item_matching
+from delivery_market_analysis.item_matching import build_item_matches, match_menus, price_gaps
+
+
+def test_match_menus_is_one_to_one() -> None:
+    a = ["margherita", "pizza margherita", "tiramisu"]
+    b = ["margherita pizza", "tiramisu", "cola"]
+    pairs = match_menus(a, b, min_score=85)
+    assert {(i, j) for i, j, _ in pairs} == {(1, 0), (2, 1)}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_build_pairs_items_within_clusters(tmp_path: Path, monkeypatch, workers: int) -> None:
+    monkeypatch.setattr(item_matching, "CLUSTERS_PER_TASK", 1)
+    db = tmp_path / "analytics.duckdb"
+    con = duckdb.connect(db.as_posix())
+    con.execute(
+        """
+        CREATE TABLE g1_restaurant_matches AS
+        SELECT * FROM (VALUES
+          ('c1','takeaway','t1'), ('c1','ubereats','u1'),
+          ('c2','takeaway','t2'), ('c2','deliveroo','d2'),
+          ('c3','takeaway','t3')
+        ) t(canonical_id, platform, restaurant_key);
+        """
+    )
+    con.execute(
+        """
+        CREATE VIEW vw_menu_items_clean AS
+        SELECT * FROM (VALUES
+          ('takeaway','t1','i1','Crème Brûlée',6.0),
+          ('ubereats','u1','i2','creme brulee',7.5),
+          ('takeaway','t2','i3','Kapsalon groot',10.0),
+          ('deliveroo','d2','i4','Kapsalon (groot)',9.0),
+          ('deliveroo','d2','i5','Crème Brûlée',5.0),
+          ('takeaway','t3','i6','Kapsalon groot',8.0)
+        ) t(platform, restaurant_key, item_key, item_name, price);
+        """
+    )
+    con.close()
+
+    build_item_matches(db, workers=workers)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    rows = con.execute(
+        "SELECT canonical_id, item_key_a, item_key_b, price_diff FROM g1_item_matches ORDER BY 1"
+    ).fetchall()
+    assert rows == [("c1", "i1", "i2", 1.5), ("c2", "i4", "i3", 1.0)]
+    assert price_gaps(con)["matched_items"].sum() == 2
+    con.close()
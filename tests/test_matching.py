@@ -0,0 +1,50 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis.matching import PLATFORM_ORDER, build_matches, overlap_pairs, top_cross_platform
+
+
+@pytest.fixture()
+def con(tmp_path: Path):
+    db = tmp_path / "analytics.duckdb"
+    con = duckdb.connect(db.as_posix())
+    con.execute(
+        """
+        CREATE TABLE stg_restaurants AS
+        SELECT * FROM (VALUES
+          ('takeaway','t1','Pizza Napoli','Gent',51.0500,3.7200,4.0,100,2.0),
+          ('deliveroo','d1','Pizza Napoli','Gent',51.0501,3.7201,4.6,20,1.0),
+          ('ubereats','u1','Pizza Napoli','Gent',51.0502,3.7199,4.4,300,NULL),
+          ('takeaway','t2','Sushi Zen','Gent',51.0600,3.7300,4.8,10,3.0)
+        ) t(platform, restaurant_key, restaurant_name, city, latitude, longitude, rating_value, rating_count, delivery_fee);
+        """
+    )
+    con.close()
+    build_matches(db)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    yield con
+    con.close()
+
+
+def test_canonical_table_has_platform_bitmask(con) -> None:
+    rows = con.execute(
+        "SELECT platform_mask, platform_count, city FROM g1_canonical_restaurants ORDER BY platform_count DESC"
+    ).fetchall()
+    assert rows[0] == (sum(1 << i for i in PLATFORM_ORDER.values()), 3, "Gent")
+    assert rows[1][1] == 1
+
+
+def test_overlap_pairs_from_bitmask(con) -> None:
+    pairs = overlap_pairs(con)
+    assert len(pairs) == 3
+    assert (pairs["overlap"] == 1).all()
+
+
+def test_top_candidates_respect_review_threshold(con) -> None:
+    assert top_cross_platform(con, min_reviews=0, min_platforms=3).iloc[0]["rated_platforms"] == 3
+    top = top_cross_platform(con, min_reviews=50, min_platforms=2).iloc[0]
+    # deliveroo (20 reviews) drops out: rating is averaged over takeaway + ubereats
+    assert top["rated_platforms"] == 2
+    assert top["avg_rating"] == pytest.approx(4.2)
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from delivery_market_analysis.outliers import Moments, build_price_stats, top_outliers, update_moments
+
+
+@pytest.fixture()
+def con(tmp_path: Path):
+    db = tmp_path / "analytics.duckdb"
+    con = duckdb.connect(db.as_posix())
+    con.execute(
+        """
+        CREATE TABLE stg_restaurants AS
+        SELECT ['takeaway','ubereats'][1 + i % 2] AS platform, CAST(i AS VARCHAR) AS restaurant_key,
+               'R' || i AS restaurant_name, 'City' || (i % 3) AS city
+        FROM range(20) t(i);
+        """
+    )
+    con.execute(
+        """
+        CREATE TABLE items AS
+        SELECT ['takeaway','ubereats'][1 + (i % 20) % 2] AS platform, CAST(i % 20 AS VARCHAR) AS restaurant_key,
+               'item' || i AS item_name, 5 + (i * 7919 % 1000) / 50.0 AS price,
+               CASE WHEN i % 3 = 0 THEN NULL ELSE 'cat' || (i % 3) END AS category_name
+        FROM range(2000) t(i)
+        UNION ALL SELECT 'takeaway', '0', 'caviar', 480.0, 'cat1';
+        """
+    )
+    con.execute("CREATE VIEW vw_menu_items_clean AS SELECT * FROM items WHERE price > 0 AND price < 500;")
+    con.close()
+    build_price_stats(db)
+    con = duckdb.connect(db.as_posix())
+    yield con
+    con.close()
+
+
+def test_merged_moments_match_numpy() -> None:
+    x = np.random.default_rng(0).lognormal(2, 1, 10_000)
+    m = Moments()
+    for chunk in np.array_split(x, 7):
+        m = m.merge(Moments.of(chunk))
+    assert m.n == len(x)
+    assert m.mean == pytest.approx(x.mean())
+    assert m.stddev == pytest.approx(x.std(ddof=1))
+
+
+def test_moments_match_sql(con) -> None:
+    got = con.execute(
+        """
+        SELECT m.mean, s.mu, m.stddev, s.sd
+        FROM price_moments m
+        JOIN (SELECT platform, AVG(price) AS mu, STDDEV_SAMP(price) AS sd FROM items GROUP BY 1) s
+          USING (platform)
+        WHERE m.category_name IS NULL
+        """
+    ).fetchall()
+    assert len(got) == 2
+    for mean, mu, sd, ref in got:
+        assert mean == pytest.approx(mu) and sd == pytest.approx(ref)
+
+
+def test_top_outliers_sorted_and_thresholded(con) -> None:
+    df = top_outliers(con, 3.0)
+    assert df.iloc[0]["item_name"] == "caviar"
+    assert (df["z_score"].abs() >= 3.0).all()
+    assert df["z_score"].abs().is_monotonic_decreasing
+    robust = top_outliers(con, 3.0, robust=True)
+    assert not robust.empty
+    assert (robust["robust_z"].abs() >= 3.0).all()
+    assert robust["robust_z"].abs().is_monotonic_decreasing
+    ordered = con.execute("SELECT abs_robust_z FROM price_robust_zscores").fetchnumpy()["abs_robust_z"]
+    assert (np.diff(ordered[~np.isnan(ordered)]) <= 0).all()
+
+
+def test_update_moments_equals_full_recompute(con) -> None:
+    delta = pd.DataFrame({"platform": ["ubereats"] * 3, "category_name": [None, "cat1", "new"], "price": [1.0, 2.0, 90.0]})
+    update_moments(con, delta)
+    con.execute("INSERT INTO items SELECT platform, '1', 'x', price, category_name FROM delta;")
+    n, mean, sd = con.execute(
+        "SELECT n, mean, stddev FROM price_moments WHERE platform = 'ubereats' AND category_name IS NULL"
+    ).fetchone()
+    ref = con.execute("SELECT COUNT(*), AVG(price), STDDEV_SAMP(price) FROM items WHERE platform = 'ubereats'").fetchone()
+    assert n == ref[0] and mean == pytest.approx(ref[1]) and sd == pytest.approx(ref[2])
+    assert con.execute("SELECT n FROM price_moments WHERE category_name = 'new'").fetchone()[0] == 1
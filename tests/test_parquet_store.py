@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis import queries
+from delivery_market_analysis.ingest import ingest_raw
+from delivery_market_analysis.parquet_store import PARTITIONED, compare_scans, connect, export_parquet
+from delivery_market_analysis.semantic import apply_semantic
+from delivery_market_analysis.synthetic import write_raw
+
+SQL = Path(__file__).resolve().parents[1] / "sql" / "90_views_semantic.sql"
+
+
+@pytest.fixture()
+def db(tmp_path: Path) -> Path:
+    write_raw(tmp_path / "raw", restaurants=300, seed=0, jobs=1)
+    db = tmp_path / "analytics.duckdb"
+    ingest_raw(tmp_path / "raw", db)
+    apply_semantic(db, SQL)
+    return db
+
+
+def test_export_is_partitioned_and_reads_like_the_native_file(
+    db: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    out = tmp_path / "parquet"
+    manifest = export_parquet(db, out, SQL)
+    assert set(manifest["raw"]) == {"takeaway", "ubereats", "deliveroo"}
+    assert (out / "raw" / "platform=takeaway" / "restaurants.parquet").exists()
+    assert any((out / "stg" / "stg_restaurants" / "platform=takeaway").glob("city=*/*.parquet"))
+
+    full = duckdb.connect(db.as_posix(), read_only=True)
+    files = connect(out)
+    for rel in [*PARTITIONED, "vw_menu_items_clean", "takeaway.restaurants"]:
+        q = f"SELECT COUNT(*), SUM(hash(t)) FROM {rel} t"
+        assert files.execute(q).fetchone() == full.execute(q).fetchone(), rel
+    # the partition column added to items is not part of the view
+    assert files.execute("DESCRIBE stg_menu_items").df()["column_name"].tolist() == (
+        full.execute("DESCRIBE stg_menu_items").df()["column_name"].tolist()
+    )
+
+    monkeypatch.setattr(queries, "PARQUET_DIR", out)
+    f = queries.Filters(city="Gent")
+    assert queries.histogram(queries.connect(backend="parquet"), "stg_restaurants", "rating_value", filters=f).equals(
+        queries.histogram(full, "stg_restaurants", "rating_value", filters=f)
+    )
+    with pytest.raises(ValueError):
+        queries.connect(backend="csv")
+    full.close()
+
+    report = compare_scans(db, out, city="Gent", repeat=1)
+    assert {f"scan {v}" for v in PARTITIONED} <= set(report["query"]) and (report["parquet_s"] > 0).all()
@@ -0,0 +1,141 @@
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis.pipeline import STAGES, BuildConfig, Stage, _order, build
+from delivery_market_analysis.ingest import ingest_raw
+from delivery_market_analysis.semantic import apply_semantic
+from delivery_market_analysis.synthetic import write_raw
+
+SQL = Path(__file__).resolve().parents[1] / "sql" / "90_views_semantic.sql"
+
+
+def _table_stage(name, deps=(), inputs=None, calls=None, fail=False, barrier=None):
+    def run(config):
+        if barrier is not None:
+            barrier.wait()
+        if fail:
+            raise RuntimeError("boom")
+        calls.append(name)
+        con = duckdb.connect(config.db_path.as_posix())
+        con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT 1 AS x")
+        con.close()
+
+    return Stage(name, run, tuple(deps), inputs=inputs or (lambda config: {}), outputs=(name,))
+
+
+def _status(report):
+    return dict(zip(report["stage"], report["status"]))
+
+
+def test_unchanged_stages_are_skipped_and_changes_propagate(tmp_path: Path) -> None:
+    calls = []
+    params = {"value": 1}
+    stages = {
+        s.name: s
+        for s in [
+            _table_stage("a", inputs=lambda config: dict(params), calls=calls),
+            _table_stage("b", deps=["a"], calls=calls),
+            _table_stage("c", calls=calls),
+        ]
+    }
+    config = BuildConfig(db_path=tmp_path / "analytics.duckdb")
+
+    assert set(_status(build(config, stages=stages, jobs=2)).values()) == {"built"}
+    assert _status(build(config, stages=stages)) == {"a": "skipped", "b": "skipped", "c": "skipped"}
+
+    params["value"] = 2
+    assert _status(build(config, stages=stages)) == {"a": "built", "b": "built", "c": "skipped"}
+
+    con = duckdb.connect(config.db_path.as_posix())
+    con.execute("DROP TABLE b")
+    con.close()
+    assert _status(build(config, ["b"], stages=stages)) == {"a": "skipped", "b": "built"}
+    assert _status(build(config, ["b"], force=["a"], stages=stages)) == {"a": "built", "b": "built"}
+    assert _status(build(config, stages=stages, dry_run=True)) == {"a": "skipped", "b": "skipped", "c": "skipped"}
+
+    con = duckdb.connect(config.db_path.as_posix(), read_only=True)
+    logged = con.execute("SELECT COUNT(*), COUNT(DISTINCT run_id) FROM build_log").fetchone()
+    con.close()
+    assert logged == (13, 5)  # the dry run records nothing
+    assert calls.count("a") == 3 and calls.count("c") == 1
+
+
+def test_failure_blocks_only_dependents(tmp_path: Path) -> None:
+    calls = []
+    stages = {
+        s.name: s
+        for s in [
+            _table_stage("a", fail=True, calls=calls),
+            _table_stage("b", deps=["a"], calls=calls),
+            _table_stage("c", calls=calls),
+        ]
+    }
+    report = build(BuildConfig(db_path=tmp_path / "analytics.duckdb"), stages=stages)
+    assert _status(report) == {"a": "failed", "b": "blocked", "c": "built"}
+    assert "boom" in report.set_index("stage").loc["a", "error"]
+
+
+def test_independent_stages_run_in_parallel(tmp_path: Path) -> None:
+    # both stages wait for each other: this only finishes if they run at the same time
+    barrier = threading.Barrier(2, timeout=10)
+    calls = []
+    stages = {n: _table_stage(n, calls=calls, barrier=barrier) for n in ("a", "b")}
+    report = build(BuildConfig(db_path=tmp_path / "analytics.duckdb"), stages=stages, jobs=2)
+    assert set(_status(report).values()) == {"built"}
+
+
+def test_stage_graph() -> None:
+    assert _order(STAGES, ["item_matching"]) == ["ingest", "semantic", "matching", "item_matching"]
+    assert _order(STAGES, [])[:2] == ["ingest", "semantic"]
+    with pytest.raises(ValueError):
+        _order(STAGES, ["nope"])
+    cyclic = {"a": Stage("a", print, ("b",)), "b": Stage("b", print, ("a",))}
+    with pytest.raises(ValueError):
+        _order(cyclic, ["a"])
+
+
+def test_index_stage_rebuilds_indexes_dropped_by_the_semantic_sql(tmp_path: Path) -> None:
+    write_raw(tmp_path / "raw", restaurants=100, seed=0, jobs=1)
+    config = BuildConfig(db_path=tmp_path / "analytics.duckdb", raw_dir=tmp_path / "raw", sql_path=SQL)
+    assert _status(build(config, ["indexes"])) == {"ingest": "built", "semantic": "built", "indexes": "built"}
+
+    apply_semantic(config.db_path, SQL)  # recreates dim_restaurant without its index
+    assert _status(build(config, ["indexes"]))["indexes"] == "built"
+    assert _status(build(config, ["indexes"]))["indexes"] == "skipped"
+    con = duckdb.connect(config.db_path.as_posix(), read_only=True)
+    assert con.execute("SELECT index_name FROM duckdb_indexes()").fetchall() == [("idx_dim_restaurant_key",)]
+    con.close()
+
+
+def test_semantic_sql_defines_views_once_before_use() -> None:
+    sql = Path("sql/90_views_semantic.sql").read_text(encoding="utf-8")
+    defined = re.findall(r"CREATE OR REPLACE (?:VIEW|TABLE) (\w+)", sql)
+    assert len(defined) == len(set(defined))
+    for name in defined:
+        first_use = re.search(rf"(?:FROM|JOIN)\s+{name}\b", sql)
+        if first_use:
+            assert sql.index(f" {name} AS") < first_use.start(), name
+
+
+def test_star_schema_keeps_every_src_row(tmp_path: Path) -> None:
+    write_raw(tmp_path / "raw", restaurants=100, seed=0, jobs=1)
+    # a platform whose restaurant feed came back empty still has items and categories
+    raw = sqlite3.connect(tmp_path / "raw" / "deliveroo.db")
+    raw.execute("DELETE FROM restaurants")
+    raw.commit()
+    raw.close()
+    db = tmp_path / "analytics.duckdb"
+    ingest_raw(tmp_path / "raw", db)
+    apply_semantic(db, SQL)
+
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    for name in ("restaurants", "menu_items", "restaurant_categories"):
+        q = "SELECT platform, COUNT(*) FROM {} GROUP BY 1 ORDER BY 1"
+        assert con.execute(q.format(f"stg_{name}")).fetchall() == con.execute(q.format(f"src_{name}")).fetchall()
+    assert con.execute("SELECT COUNT(*) FROM stg_menu_items WHERE platform = 'deliveroo'").fetchone()[0] > 0
+    con.close()
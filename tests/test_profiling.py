@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis import profiling
+from delivery_market_analysis.queries import query_df
+from delivery_market_analysis.semantic import _statement_name
+
+
+@pytest.fixture()
+def report(tmp_path: Path, monkeypatch):
+    monkeypatch.delenv(profiling.ENV, raising=False)
+    path = profiling.enable(tmp_path / "profile.jsonl")
+    yield path
+    profiling.disable()
+
+
+def test_off_by_default(monkeypatch) -> None:
+    monkeypatch.delenv(profiling.ENV, raising=False)
+    with profiling.profile("stage", "x") as rec:
+        assert rec is None
+    assert not profiling.enabled()
+
+
+def test_nested_blocks_record_time_memory_and_allocators(report: Path) -> None:
+    with profiling.profile("stage", "outer") as outer:
+        with profiling.profile("ingest", "inner") as inner:
+            blob = [bytes(1000) for _ in range(5000)]
+            inner["rows"] = len(blob)
+        outer["note"] = "done"
+
+    blocks = profiling.load(report).set_index("name")
+    assert list(blocks.index) == ["inner", "outer"]
+    assert blocks.loc["inner", "parent"] == "stage:outer" and blocks.loc["inner", "rows"] == 5000
+    assert blocks.loc["outer", "note"] == "done"
+    assert blocks.loc["inner", "py_peak_mb"] >= 4.5
+    assert blocks.loc["outer", "py_peak_mb"] >= blocks.loc["inner", "py_peak_mb"]  # nested peak handed up
+    assert blocks.loc["outer", "peak_rss_mb"] >= blocks.loc["inner", "peak_rss_mb"] > 0
+    assert all(blocks["peak_exact"]) and all(blocks["wall_s"] >= 0) and all(blocks["cpu_s"] >= 0)
+    top = blocks.loc["inner", "top_allocators"][0]
+    assert "test_profiling.py" in top["where"] and top["size_mb"] > 4
+
+
+def test_queries_carry_duckdb_profile_and_caller(report: Path) -> None:
+    con = duckdb.connect()
+
+    def top_numbers():
+        return query_df(con, "SELECT range AS n FROM range(1000) WHERE range > $lo ORDER BY n DESC LIMIT 5", {"lo": 10})
+
+    assert len(top_numbers()) == 5
+    with pytest.raises(duckdb.Error):
+        with profiling.profile("stage", "broken"):
+            con.execute("SELECT * FROM missing_table")
+
+    blocks = profiling.load(report).set_index("name")
+    q = blocks.loc["test_profiling.top_numbers"]
+    assert q["kind"] == "query" and q["rows"] == 5
+    assert q["duckdb"]["rows_scanned"] == 1000 and q["duckdb"]["operators"]
+    assert "missing_table" in blocks.loc["broken", "error"]
+
+
+def test_diff_two_reports(tmp_path: Path) -> None:
+    for path, secs in [(tmp_path / "a.jsonl", 1.0), (tmp_path / "b.jsonl", 1.5)]:
+        profiling.enable(path)
+        with profiling.profile("stage", "cube", allocators=False) as rec:
+            pass
+        profiling.disable()
+        # rewrite the measured time so the diff is deterministic
+        text = path.read_text().replace(f'"wall_s": {rec["wall_s"]}', f'"wall_s": {secs}')
+        path.write_text(text)
+
+    d = profiling.diff(profiling.load(tmp_path / "a.jsonl"), profiling.load(tmp_path / "b.jsonl"))
+    row = d.set_index("name").loc["cube"]
+    assert row["wall_s_base"] == 1.0 and row["wall_s_delta"] == pytest.approx(0.5)
+
+
+def test_semantic_statement_names() -> None:
+    assert _statement_name("CREATE OR REPLACE VIEW stg_restaurants AS SELECT 1") == "view stg_restaurants"
+    assert _statement_name("\n-- x\nCREATE MACRO cell_id(a) AS a") == "macro cell_id"
+    assert _statement_name("INSTALL spatial") == "INSTALL spatial"
@@ -0,0 +1,135 @@
+import threading
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from delivery_market_analysis.queries import (
+    Filters,
+    connect,
+    export,
+    histogram,
+    page,
+    price_bands,
+    run_all,
+    submit_all,
+    summary_stats,
+)
+
+
+@pytest.fixture()
+def con():
+    con = duckdb.connect()
+    con.execute(
+        """
+        CREATE TABLE vw_menu_items_clean AS
+        SELECT
+          CASE WHEN i % 3 = 0 THEN 'takeaway' ELSE 'ubereats' END AS platform,
+          NULL::VARCHAR AS category_name,
+          ((i * 37) % 1000) / 10.0 + 0.05 AS price
+        FROM range(3000) r(i);
+        """
+    )
+    yield con
+    con.close()
+
+
+def test_histogram_fixed_bins_matches_numpy(con) -> None:
+    prices = con.execute("SELECT price FROM vw_menu_items_clean").df()["price"].to_numpy()
+    expected, _ = np.histogram(prices, bins=20)
+    hist = histogram(con, "vw_menu_items_clean", "price", bins=20)
+    assert hist["count"].tolist() == expected.tolist()
+
+
+def test_price_bands_match_pd_cut(con) -> None:
+    edges = [0, 5, 10, 20, 50, 100]
+    df = con.execute("SELECT platform, price FROM vw_menu_items_clean WHERE platform = 'takeaway'").df()
+    expected = pd.cut(df["price"], bins=edges).value_counts().sort_index()
+    bands = price_bands(con, edges=edges, filters=Filters(platform="takeaway"))
+    assert bands["count"].tolist() == expected[expected > 0].tolist()
+    assert bands["price_band"].iloc[0] == "(0, 5]"
+
+
+def test_summary_stats_grouped(con) -> None:
+    stats = summary_stats(con, "vw_menu_items_clean", "price", by=("platform",)).set_index("platform")
+    assert stats.loc["takeaway", "n"] == 1000
+    assert stats.loc["ubereats", "n"] == 2000
+
+
+def test_run_all_returns_results_in_call_order(tmp_path) -> None:
+    db = tmp_path / "analytics.duckdb"
+    w = duckdb.connect(db.as_posix())
+    w.execute("CREATE TABLE t AS SELECT range AS x FROM range(1000)")
+    w.close()
+
+    con = connect(db)
+    assert connect(db) is con
+    with pytest.raises(duckdb.Error):
+        con.execute("CREATE TABLE u (x INTEGER)")  # shared connection is read-only
+
+    threads = []
+
+    def where_am_i(cur, label):
+        threads.append(threading.current_thread().name)
+        return label, cur.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+    results = run_all(
+        con,
+        [
+            "SELECT SUM(x) AS s FROM t",
+            ("SELECT COUNT(*) AS n FROM t WHERE x < $k", {"k": 10}),
+            (where_am_i, "a"),
+            (summary_stats, "t", "x"),
+        ],
+    )
+    assert results[0]["s"].iloc[0] == 499500
+    assert results[1]["n"].iloc[0] == 10
+    assert results[2] == ("a", 1000)
+    assert results[3]["max"].iloc[0] == 999
+    assert threads and all(name.startswith("dma-query") for name in threads)
+
+    futures = submit_all(con, [("SELECT 1 AS one",), (where_am_i, "b")])
+    assert [f.result() for f in futures][1] == ("b", 1000)
+
+
+def test_keyset_pages_cover_the_sorted_result_once(con) -> None:
+    sql = """
+        SELECT platform, price, CASE WHEN i % 4 = 0 THEN NULL ELSE i % 5 END AS bucket, i AS id
+        FROM (SELECT *, ROW_NUMBER() OVER () AS i FROM vw_menu_items_clean);
+    """
+    order = ("platform DESC", "bucket", "price DESC", "id")
+    expected = con.execute(
+        f"SELECT * FROM ({sql.rstrip().rstrip(';')}) "
+        "ORDER BY platform DESC, bucket NULLS LAST, price DESC, id"
+    ).df()
+
+    pages, after = [], None
+    while True:
+        p = page(con, sql, order, after=after, size=128)
+        pages.append(p.rows)
+        after = p.after
+        if after is None:
+            break
+    assert len(pages) == -(-len(expected) // 128)
+    pd.testing.assert_frame_equal(pd.concat(pages, ignore_index=True), expected)
+
+
+def test_page_rejects_bad_keys(con) -> None:
+    with pytest.raises(ValueError):
+        page(con, "SELECT * FROM vw_menu_items_clean", ["price SIDEWAYS"])
+    with pytest.raises(ValueError):
+        page(con, "SELECT * FROM vw_menu_items_clean", ["price"], after=(1.0, 2.0))
+
+
+def test_export_streams_full_result(con, tmp_path) -> None:
+    sql = "SELECT * FROM vw_menu_items_clean WHERE platform = $platform"
+    n = export(con, sql, tmp_path / "items.parquet", {"platform": "takeaway"}, order=["price DESC"])
+    table = pd.read_parquet(tmp_path / "items.parquet")
+    assert n == len(table) == 1000
+    assert table["price"].is_monotonic_decreasing
+
+    assert export(con, sql, tmp_path / "items.csv", {"platform": "ubereats"}) == 2000
+    assert len(pd.read_csv(tmp_path / "items.csv")) == 2000
+    with pytest.raises(ValueError):
+        export(con, sql, tmp_path / "items.xlsx", {"platform": "ubereats"})
@@ -0,0 +1,126 @@
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pytest
+
+from delivery_market_analysis.demo import create_demo_db
+from delivery_market_analysis.queries import Filters, histogram
+from delivery_market_analysis.sampling import aggregate, approx_histogram, build_samples, refine
+
+
+@pytest.fixture()
+def big_db(tmp_path: Path) -> Path:
+    db = tmp_path / "analytics.duckdb"
+    con = duckdb.connect(db.as_posix())
+    con.execute(
+        """
+        CREATE TABLE stg_restaurants AS
+        SELECT CASE WHEN i % 3 = 0 THEN 'takeaway' ELSE 'ubereats' END AS platform,
+               'r' || i AS restaurant_key,
+               ['Gent', 'Antwerpen', 'Brussel', NULL][i % 4 + 1] AS city,
+               1 + (i * 7919 % 400) / 100.0 AS rating_value
+        FROM range(2000) t(i);
+        """
+    )
+    con.execute(
+        """
+        CREATE TABLE stg_menu_items AS
+        SELECT r.platform, r.restaurant_key, r.restaurant_key || '-' || j AS item_key,
+               'dish ' || j AS item_name,
+               CAST(ROUND(2 + (hash(r.restaurant_key, j) % 3000) / 100.0 + CASE WHEN r.city = 'Gent' THEN 5 ELSE 0 END, 2)
+                    AS DECIMAL(8, 2)) AS price,
+               CAST(NULL AS VARCHAR) AS category_name
+        FROM stg_restaurants r, range(20) t(j);
+        """
+    )
+    con.execute(
+        """
+        CREATE VIEW vw_menu_items_clean AS
+        SELECT * FROM stg_menu_items WHERE price IS NOT NULL AND price > 0 AND price < 500;
+        """
+    )
+    con.close()
+    build_samples(db)
+    return db
+
+
+def test_samples_are_stratified_and_nested(big_db: Path) -> None:
+    con = duckdb.connect(big_db.as_posix(), read_only=True)
+    strata = con.execute(
+        """
+        SELECT platform, stratum_city, ANY_VALUE(stratum_n) AS n_total, COUNT(*) AS n_sample, MAX(stratum_rank)
+        FROM sample_menu_items GROUP BY 1, 2
+        """
+    ).fetchall()
+    assert len(strata) == 8
+    for _, _, n_total, n_sample, max_rank in strata:
+        assert n_sample == max_rank == max(20, int(np.ceil(0.2 * n_total)))
+
+
+def test_restaurant_with_several_locations_keeps_its_items_once(big_db: Path) -> None:
+    con = duckdb.connect(big_db.as_posix())
+    # a second location row for every tenth restaurant, in another city
+    con.execute(
+        "INSERT INTO stg_restaurants SELECT platform, restaurant_key, 'Leuven', rating_value "
+        "FROM stg_restaurants WHERE CAST(substr(restaurant_key, 2) AS INTEGER) % 10 = 0"
+    )
+    con.close()
+    build_samples(big_db)
+    con = duckdb.connect(big_db.as_posix(), read_only=True)
+    covered = con.execute(
+        "SELECT SUM(n) FROM (SELECT ANY_VALUE(stratum_n) AS n FROM sample_menu_items GROUP BY platform, stratum_city)"
+    ).fetchone()[0]
+    assert covered == con.execute("SELECT COUNT(*) FROM stg_menu_items").fetchone()[0]
+    con.close()
+
+
+def test_estimates_cover_exact_answers(big_db: Path) -> None:
+    con = duckdb.connect(big_db.as_posix(), read_only=True)
+    exact = aggregate(con, "vw_menu_items_clean", "price", by=("platform",))
+    truth = con.execute(
+        "SELECT platform, COUNT(*), AVG(price::DOUBLE) FROM vw_menu_items_clean GROUP BY 1 ORDER BY 1"
+    ).fetchall()
+    assert [tuple(r) for r in exact[["platform", "count"]].itertuples(index=False)] == [(p, n) for p, n, _ in truth]
+    assert (exact["avg_err"] == 0).all()
+
+    for rate in (0.01, 0.05, 0.2):
+        est = aggregate(con, "vw_menu_items_clean", "price", by=("platform",), rate=rate)
+        m = est.merge(exact, on="platform", suffixes=("", "_exact"))
+        # every item is in some stratum, so platform totals are known exactly
+        np.testing.assert_allclose(m["count"], m["count_exact"])
+        assert (np.abs(m["avg"] - m["avg_exact"]) <= 1.5 * m["avg_err"]).all()
+        assert (m["avg_err"] > 0).all()
+
+    # a filter that cuts across strata is a domain estimate with a real count error
+    est = aggregate(con, "vw_menu_items_clean", "price", where="price > 20", rate=0.05)
+    n_exact = con.execute("SELECT COUNT(*) FROM vw_menu_items_clean WHERE price > 20").fetchone()[0]
+    assert abs(est["count"].iloc[0] - n_exact) <= 1.5 * est["count_err"].iloc[0]
+
+    rest = aggregate(con, "stg_restaurants", "rating_value", by=("city",), filters=Filters(platform="ubereats"), rate=0.05)
+    assert rest["city"].isna().sum() == 1 and len(rest) == 4
+
+
+def test_approx_histogram_matches_exact_bins(big_db: Path) -> None:
+    con = duckdb.connect(big_db.as_posix(), read_only=True)
+    exact = histogram(con, "vw_menu_items_clean", "price", bins=10, lo=0, hi=40)
+    est = approx_histogram(con, "vw_menu_items_clean", "price", lo=0, hi=40, bins=10, rate=0.2)
+    assert est["bin"].tolist() == exact["bin"].tolist()
+    np.testing.assert_allclose(est["bin_lo"], exact["bin_lo"])
+    assert est["count"].sum() == pytest.approx(exact["count"].sum())
+    assert (np.abs(est["count"] - exact["count"]) <= 2 * est["count_err"] + 1e-9).all()
+
+
+def test_refine_yields_estimate_then_exact(big_db: Path, tmp_path: Path) -> None:
+    con = duckdb.connect(big_db.as_posix(), read_only=True)
+    steps = list(refine(con, aggregate, "vw_menu_items_clean", "price", by=("platform",)))
+    assert [exact for _, exact in steps] == [False, True]
+    assert (steps[1][0]["avg_err"] == 0).all()
+
+    demo = tmp_path / "tiny.duckdb"
+    create_demo_db(demo)
+    con = duckdb.connect(demo.as_posix(), read_only=True)
+    # tiny strata are sampled whole, so the estimate is the exact answer
+    (approx, _), (exact, _) = refine(con, aggregate, "stg_restaurants", "rating_value")
+    assert approx["avg"].iloc[0] == pytest.approx(exact["avg"].iloc[0])
+    assert approx["avg_err"].iloc[0] == 0
@@ -0,0 +1,91 @@
+import asyncio
+import io
+import json
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+
+from delivery_market_analysis.demo import create_demo_db
+from delivery_market_analysis.queries import connect
+from delivery_market_analysis.server import QueryServer, QueryService
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory) -> Path:
+    db = tmp_path_factory.mktemp("serve") / "analytics.duckdb"
+    create_demo_db(db)
+    return db
+
+
+def _get(url: str):
+    try:
+        with urllib.request.urlopen(url) as resp:
+            return resp.status, resp.headers["Content-Type"], resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers["Content-Type"], e.read()
+
+
+def test_identical_requests_share_one_query(db: Path) -> None:
+    async def run():
+        service = QueryService(connect(db), pool_size=2)
+        params = {"min_locations": 1, "limit": 5}
+        first, second = await asyncio.gather(service.table("chains", params), service.table("chains", params))
+        again = await service.table("chains", params)
+        service.pool.close()
+        return service.stats, first, second, again
+
+    stats, first, second, again = asyncio.run(run())
+    assert first is second is again
+    assert first.num_rows > 0
+    assert stats == {"requests": 0, "queries": 1, "cache_hits": 1, "coalesced": 1}
+
+
+def test_http_formats_and_errors(db: Path) -> None:
+    async def run():
+        server = QueryServer(db, pool_size=2)
+        srv = await server.start("127.0.0.1", 0)
+        base = f"http://127.0.0.1:{srv.sockets[0].getsockname()[1]}"
+        loop = asyncio.get_running_loop()
+        urls = [
+            "/v1",
+            "/v1/chains?min_locations=1&limit=3",
+            "/v1/restaurants?platform=takeaway&format=ndjson",
+            "/v1/menu_items?format=arrow",
+            "/v1/chains?min_locations=many",
+            "/v1/competitors",
+            "/v1/chains?limit=-1",
+            "/v1/suggest?kind=bogus&prefix=a",
+            "/v1/restaurants?limit=0",
+            "/v1/nope",
+            "/stats",
+        ]
+        try:
+            return [await loop.run_in_executor(None, _get, base + u) for u in urls]
+        finally:
+            srv.close()
+            await srv.wait_closed()
+            server.close()
+
+    listing, chains, ndjson, arrow, bad, missing, negative, invalid, empty, unknown, stats = asyncio.run(run())
+
+    assert listing[0] == 200 and "price_stats" in json.loads(listing[2])
+    assert chains[0] == 200 and chains[1] == "application/json"
+    assert len(json.loads(chains[2])) == 3
+
+    rows = [json.loads(line) for line in ndjson[2].decode().splitlines()]
+    assert rows and {r["platform"] for r in rows} == {"takeaway"}
+
+    table = pa.ipc.open_stream(io.BytesIO(arrow[2])).read_all()
+    assert table.num_rows > 0 and "price" in table.column_names
+
+    assert bad[0] == 400 and "min_locations" in json.loads(bad[2])["error"]
+    assert missing[0] == 400
+    assert negative[0] == 400 and "limit" in json.loads(negative[2])["error"]
+    # errors raised by the query itself still get a status in the default json format
+    assert invalid[0] == 400 and "kind" in json.loads(invalid[2])["error"]
+    assert empty[0] == 200 and json.loads(empty[2]) == []
+    assert unknown[0] == 404
+    assert json.loads(stats[2])["requests"] == 11
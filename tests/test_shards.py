@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis.demo import create_demo_db
+from delivery_market_analysis.ingest import ingest_raw
+from delivery_market_analysis.queries import Filters, histogram, price_bands
+from delivery_market_analysis.semantic import apply_semantic
+from delivery_market_analysis.shards import SHARDED, build_shards, connect, prune, read_manifest
+from delivery_market_analysis.synthetic import write_raw
+
+SQL = Path(__file__).resolve().parents[1] / "sql" / "90_views_semantic.sql"
+
+
+@pytest.fixture()
+def db(tmp_path: Path) -> Path:
+    write_raw(tmp_path / "raw", restaurants=300, seed=0, jobs=1)
+    db = tmp_path / "analytics.duckdb"
+    ingest_raw(tmp_path / "raw", db)
+    apply_semantic(db, SQL)
+    return db
+
+
+def test_shards_cover_the_source_and_prune_on_filters(db: Path, tmp_path: Path) -> None:
+    out = tmp_path / "shards"
+    report = build_shards(db, out, sql_path=SQL)
+    assert set(report["status"]) == {"built"} and {"brussels", "antwerp", "east_flanders"} <= set(report["region"])
+
+    full = duckdb.connect(db.as_posix(), read_only=True)
+    every = connect(out)
+    for rel in SHARDED:
+        q = f"SELECT COUNT(*), SUM(hash(t)) FROM {rel} t"
+        assert every.execute(q).fetchone() == full.execute(q).fetchone()
+
+    manifest = read_manifest(out)
+    assert prune(manifest, Filters(city="Gent")) == ["east_flanders"]
+    assert prune(manifest, Filters(city="Atlantis")) == []
+    assert prune(manifest, bbox=(51.1, 51.3, 4.3, 4.5)) == ["antwerp"]
+
+    gent = connect(out, Filters(city="Gent"))
+    assert [r[0] for r in gent.execute("SHOW DATABASES").fetchall() if r[0].startswith("shard_")] == ["shard_east_flanders"]
+    f = Filters(city="Gent")
+    assert histogram(gent, "stg_restaurants", "rating_value", filters=f).equals(
+        histogram(full, "stg_restaurants", "rating_value", filters=f)
+    )
+    assert connect(out, Filters(city="Atlantis")).execute("SELECT COUNT(*) FROM stg_menu_items").fetchone()[0] == 0
+    # the semantic views over stg_* are recreated on the shards
+    takeaway = Filters(platform="takeaway")
+    assert price_bands(connect(out, takeaway), filters=takeaway).equals(price_bands(full, filters=takeaway))
+    q = "SELECT COUNT(*), SUM(hash(t)) FROM stg_restaurants_geo t WHERE city = 'Gent'"
+    assert gent.execute(q).fetchone() == full.execute(q).fetchone()
+    full.close()
+
+
+def test_source_without_star_schema_is_refused(tmp_path: Path) -> None:
+    db = tmp_path / "analytics.duckdb"
+    create_demo_db(db)
+    with pytest.raises(ValueError, match="star schema"):
+        build_shards(db, tmp_path / "shards")
+
+
+def test_rebuild_rewrites_only_changed_regions(db: Path, tmp_path: Path) -> None:
+    out = tmp_path / "shards"
+    build_shards(db, out)
+    before = {p.name: p.stat().st_mtime_ns for p in out.glob("*.duckdb")}
+
+    con = duckdb.connect(db.as_posix())
+    con.execute(
+        "UPDATE fact_menu_items SET price = price + 1 "
+        "WHERE restaurant_id IN (SELECT restaurant_id FROM stg_restaurants WHERE city = 'Gent')"
+    )
+    con.close()
+
+    report = build_shards(db, out).set_index("region")["status"]
+    assert report["east_flanders"] == "built"
+    assert set(report.drop("east_flanders")) == {"unchanged"}
+    after = {p.name: p.stat().st_mtime_ns for p in out.glob("*.duckdb")}
+    assert {n for n in before if before[n] != after[n]} == {"east_flanders.duckdb"}
+
+    assert list(build_shards(db, out, ["antwerp"], force=True)["region"]) == ["antwerp"]
+    with pytest.raises(ValueError):
+        build_shards(db, out, ["atlantis"])
@@ -0,0 +1,73 @@
+import sqlite3
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis.ingest import ingest_raw
+from delivery_market_analysis.semantic import apply_semantic
+from delivery_market_analysis.snapshots import diff, list_snapshots, raw_changes, take_snapshot
+from delivery_market_analysis.synthetic import write_raw
+
+SQL = Path(__file__).resolve().parents[1] / "sql" / "90_views_semantic.sql"
+
+
+def _scrape(raw: Path, db: Path, label: str) -> dict:
+    ingest_raw(raw, db)
+    apply_semantic(db, SQL)
+    return take_snapshot(db, label, SQL)
+
+
+def _edit(path: Path, *statements: str) -> None:
+    con = sqlite3.connect(path)
+    for sql in statements:
+        con.execute(sql)
+    con.commit()
+    con.close()
+
+
+def test_snapshots_store_only_changes_and_travel_back(tmp_path: Path) -> None:
+    raw, db = tmp_path / "raw", tmp_path / "analytics.duckdb"
+    write_raw(raw, restaurants=200, seed=0, jobs=1)
+
+    first = _scrape(raw, db, "week 1")
+    assert first["snapshot_id"] == 1 and first["added_rows"] == first["raw_rows"]
+    con = duckdb.connect(db.as_posix())
+    items_1 = con.execute("SELECT COUNT(*), ROUND(SUM(price), 2) FROM stg_menu_items").fetchone()
+    restaurants_1 = con.execute("SELECT COUNT(*) FROM stg_restaurants").fetchone()[0]
+    con.close()
+
+    src = sqlite3.connect(raw / "takeaway.db")
+    dropped = src.execute("SELECT COUNT(*) FROM restaurants WHERE rowid % 20 = 0").fetchone()[0]
+    src.close()
+    _edit(
+        raw / "takeaway.db",
+        "UPDATE menuItems SET price = price + 1 WHERE ID % 10 = 0",
+        "DELETE FROM restaurants WHERE rowid % 20 = 0",
+        "INSERT INTO categories SELECT * FROM categories LIMIT 1",  # an exact duplicate row
+    )
+    second = _scrape(raw, db, "week 2")
+    assert 0 < second["added_rows"] < first["raw_rows"] / 10
+    # every repriced item closes one version and adds one; the duplicate only adds
+    assert second["closed_rows"] == second["added_rows"] - 1 + dropped
+
+    assert _scrape(raw, db, "week 3")["added_rows"] == 0
+
+    con = duckdb.connect(db.as_posix())
+    assert list(list_snapshots(con)["label"]) == ["week 1", "week 2", "week 3"]
+    assert con.execute("SELECT COUNT(*), ROUND(SUM(price), 2) FROM stg_menu_items_asof(1)").fetchone() == items_1
+    assert con.execute("SELECT COUNT(*) FROM stg_restaurants_asof(1)").fetchone()[0] == restaurants_1
+    assert con.execute("SELECT COUNT(*) FROM stg_restaurants_asof(2)").fetchone()[0] == restaurants_1 - dropped
+    assert con.execute("SELECT COUNT(*) FROM stg_restaurants_asof(0)").fetchone()[0] == 0
+
+    items = diff(con, "stg_menu_items", 1, 2)
+    assert items["change"].unique().tolist() == ["changed"] and len(items) > 0
+    assert ((items["price_b"] - items["price_a"]).round(6) == 1).all()
+    assert diff(con, "stg_restaurants", 1, 2)["change"].tolist() == ["removed"] * dropped
+    assert diff(con, "stg_menu_items", 2, 3).empty
+
+    versions = raw_changes(con, "takeaway", "menuItems", 1, 2)
+    assert versions["change"].value_counts().to_dict() == {"added": len(items), "removed": len(items)}
+    with pytest.raises(ValueError):
+        raw_changes(con, "takeaway", "menuItems", 2, 1)
+    con.close()
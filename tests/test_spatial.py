@@ -0,0 +1,108 @@
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pytest
+
+from delivery_market_analysis.demo import create_demo_db
+from delivery_market_analysis.ingest import ingest_raw
+from delivery_market_analysis.semantic import apply_semantic
+from delivery_market_analysis.spatial import (
+    SpatialIndex,
+    chord_to_km,
+    nearest_competitors,
+    restaurant_index,
+    to_unit,
+)
+from delivery_market_analysis.synthetic import write_raw
+
+SQL = Path(__file__).resolve().parents[1] / "sql" / "90_views_semantic.sql"
+
+
+def _brute(lat, lon, qlat, qlon):
+    xyz = to_unit(lat, lon)
+    return np.stack([chord_to_km(np.sqrt(((xyz - p) ** 2).sum(axis=1))) for p in to_unit(qlat, qlon)])
+
+
+@pytest.mark.parametrize("n", [0, 1, 40, 3000])
+def test_knn_and_radius_match_brute_force(n: int) -> None:
+    rng = np.random.default_rng(n)
+    lat, lon = rng.uniform(50.0, 51.5, n), rng.uniform(2.5, 6.0, n)
+    qlat, qlon = rng.uniform(50.0, 51.5, 100), rng.uniform(2.5, 6.0, 100)
+    index = SpatialIndex(lat, lon, leaf_size=8)
+    dist = _brute(lat, lon, qlat, qlon) if n else np.zeros((100, 0))
+
+    rows, km = index.knn(qlat, qlon, k=5)
+    for i in range(100):
+        expected = np.sort(dist[i])[:5]
+        m = len(expected)
+        np.testing.assert_allclose(km[i, :m], expected)
+        np.testing.assert_allclose(dist[i][rows[i, :m]], expected)
+        assert (rows[i, m:] == -1).all()
+
+    for i, (found, found_km) in enumerate(index.radius(qlat, qlon, 5.0)):
+        assert set(found.tolist()) == set(np.flatnonzero(dist[i] <= 5.0).tolist())
+        assert (np.diff(found_km) >= 0).all()
+
+
+def test_index_crosses_the_dateline() -> None:
+    index = SpatialIndex([0.0, 0.0, 0.0], [179.99, -179.99, 90.0])
+    rows, km = index.knn([0.0], [179.995], k=2)
+    assert set(rows[0].tolist()) == {0, 1}
+    assert km[0].max() < 2.0
+
+
+@pytest.fixture()
+def con(tmp_path: Path):
+    db = tmp_path / "analytics.duckdb"
+    create_demo_db(db)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    yield con
+    con.close()
+
+
+def test_nearest_competitors_excludes_self_and_sorts(con) -> None:
+    out = nearest_competitors(con, "takeaway", "r1", k=5)
+    assert len(out) == 2
+    assert "r1" not in out["restaurant_key"].tolist()
+    assert out["distance_km"].is_monotonic_increasing
+    # Antwerp -> Brussels is ~41 km, Antwerp -> Ghent ~50 km
+    assert out["restaurant_key"].tolist() == ["r3", "r2"]
+    assert out["distance_km"].iloc[0] == pytest.approx(41.4, abs=1.0)
+
+    near = nearest_competitors(con, "takeaway", "r1", radius_km=45.0)
+    assert near["restaurant_key"].tolist() == ["r3"]
+    assert nearest_competitors(con, "takeaway", "missing").empty
+
+
+def test_restaurant_index_is_cached(con) -> None:
+    assert restaurant_index(con) is restaurant_index(con)
+
+
+def test_same_category_returns_the_k_nearest_matches(tmp_path: Path) -> None:
+    write_raw(tmp_path / "raw", restaurants=400, seed=0, jobs=1)
+    db = tmp_path / "analytics.duckdb"
+    ingest_raw(tmp_path / "raw", db)
+    apply_semantic(db, SQL)
+    con = duckdb.connect(db.as_posix(), read_only=True)
+
+    _, points = restaurant_index(con)
+    me = points.iloc[0]
+    same = con.execute(
+        """
+        SELECT DISTINCT c.platform, c.restaurant_key
+        FROM stg_restaurant_categories c
+        JOIN stg_restaurant_categories m ON LOWER(c.category_name) = LOWER(m.category_name)
+        WHERE m.platform = $p AND m.restaurant_key = $k
+        """,
+        {"p": me["platform"], "k": me["restaurant_key"]},
+    ).df()
+    matches = points.merge(same, on=["platform", "restaurant_key"])
+    matches = matches[(matches["platform"] != me["platform"]) | (matches["restaurant_key"] != me["restaurant_key"])]
+    assert len(matches) > 10
+
+    out = nearest_competitors(con, me["platform"], me["restaurant_key"], k=10, same_category=True)
+    assert len(out) == 10 and out["distance_km"].is_monotonic_increasing
+    km = _brute(matches["latitude"], matches["longitude"], [me["latitude"]], [me["longitude"]])[0]
+    assert out["distance_km"].to_numpy() == pytest.approx(np.sort(km)[:10], abs=1e-6)
+    con.close()
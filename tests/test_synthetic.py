@@ -0,0 +1,65 @@
+import sqlite3
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from delivery_market_analysis.ingest import ingest_raw
+from delivery_market_analysis.synthetic import CITIES, write_raw
+
+
+def _rows(path: Path, sql: str):
+    con = sqlite3.connect(path)
+    con.text_factory = bytes
+    rows = con.execute(sql).fetchall()
+    con.close()
+    return rows
+
+
+def test_raw_files_have_each_platform_schema_and_are_reproducible(tmp_path: Path) -> None:
+    counts = write_raw(tmp_path / "a", restaurants=300, seed=1, jobs=1)
+    assert set(counts) == {"takeaway", "deliveroo", "ubereats"}
+    assert write_raw(tmp_path / "b", restaurants=300, seed=1, jobs=3) == counts
+    for p in counts:
+        assert (tmp_path / "a" / f"{p}.db").read_bytes() == (tmp_path / "b" / f"{p}.db").read_bytes()
+
+    tables = {r[0].decode() for r in _rows(tmp_path / "a" / "ubereats.db", "SELECT name FROM sqlite_master")}
+    assert {"restaurants", "menu_items", "restaurant_to_categories", "restaurant_hours_to_section_hours"} <= tables
+
+
+def test_distributions_duplicates_and_dirty_text(tmp_path: Path) -> None:
+    write_raw(tmp_path, restaurants=5000, seed=0, jobs=1)
+
+    cities = dict(_rows(tmp_path / "takeaway.db", "SELECT city, COUNT(*) FROM restaurants GROUP BY 1"))
+    assert cities[CITIES[0][0].encode()] > 5 * cities[CITIES[-1][0].encode()]  # Zipf by rank
+    names = _rows(tmp_path / "takeaway.db", "SELECT name, COUNT(*) FROM restaurants GROUP BY 1 ORDER BY 2 DESC")
+    assert names[0] == (b"Pizza Uno", names[0][1]) and names[0][1] > 100  # largest chain
+
+    # the same restaurant (same id) is listed under a different spelling on UberEats
+    base = {int(slug.rsplit(b"-", 1)[1]): n for slug, n in _rows(tmp_path / "takeaway.db", "SELECT primarySlug, name FROM restaurants")}
+    uber = dict(_rows(tmp_path / "ubereats.db", "SELECT id, title FROM restaurants"))
+    shared = [k for k in uber if k in base]
+    renamed = sum(uber[k] != base[k] for k in shared)
+    assert 0.1 * len(shared) < renamed < 0.5 * len(shared)
+
+    longest = _rows(tmp_path / "takeaway.db", "SELECT MAX(LENGTH(CAST(description AS BLOB))) FROM menuItems")[0][0]
+    assert longest > 1000
+    bad = _rows(tmp_path / "takeaway.db", "SELECT description FROM menuItems WHERE typeof(description) = 'text'")
+    assert any(b"\xff" in d for (d,) in bad)
+    spans = _rows(tmp_path / "ubereats.db", "SELECT COUNT(*) FROM restaurant_hours_to_section_hours WHERE end_time < start_time")
+    assert spans[0][0] > 0  # open past midnight
+
+
+def test_generated_files_ingest_and_existing_dumps_are_kept(tmp_path: Path) -> None:
+    write_raw(tmp_path / "raw", restaurants=1000, seed=0)
+    db = tmp_path / "analytics.duckdb"
+    assert ingest_raw(tmp_path / "raw", db) == 13
+    con = duckdb.connect(db.as_posix(), read_only=True)
+    # invalid UTF-8 is decoded with replacement characters, not dropped
+    assert con.execute("SELECT COUNT(*) FROM takeaway.menuItems WHERE description LIKE '%\ufffd%'").fetchone()[0] > 0
+    con.close()
+
+    (tmp_path / "dump").mkdir()
+    sqlite3.connect(tmp_path / "dump" / "takeaway.db").close()
+    with pytest.raises(FileExistsError):
+        write_raw(tmp_path / "dump", restaurants=10, jobs=1)